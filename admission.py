@@ -0,0 +1,209 @@
+import math
+import os
+import time
+from contextlib import contextmanager
+
+import metrics
+from storage import connect_sqlite
+
+# --- ANTREAN & PEMBATAS GEMINI (SE-DEPLOYMENT) ---
+# Semua sesi & proses di mesin yang sama berbagi satu antrean di SQLite:
+#   - token bucket global: GEMINI_RPM request per menit (burst sampai GEMINI_BURST),
+#     tiap modul "membayar" token sebanyak slot AI-nya waktu masuk, dan tiap retry request Gemini
+#     membayar lagi lewat take() (retry 429 justru yang paling perlu ditahan bucket),
+#   - maksimal GEMINI_MAX_ACTIVE modul dibuat bersamaan, dan tiap guru maksimal GEMINI_PER_USER
+#     (batas per guru disimpan di tiketnya, jadi antrean interaktif & batch menghitung "di depan Anda" sama),
+#   - urutan masuk FIFO; tiket milik guru yang sudah mencapai batasnya dilewati (gak menghalangi antrean).
+# Jadi waktu ramai (awal semester), throughput tertahan di batas kuota alih-alih semua kena error 429 bareng.
+#
+# Tiket yang ditinggal (tab ditutup, proses mati) dibuang otomatis: tiket antre lewat heartbeat,
+# tiket aktif lewat batas RUN_TTL.
+
+GEMINI_RPM = float(os.getenv("GEMINI_RPM", "60"))
+GEMINI_BURST = float(os.getenv("GEMINI_BURST", "12"))
+GEMINI_MAX_ACTIVE = int(os.getenv("GEMINI_MAX_ACTIVE", "8"))
+GEMINI_PER_USER = int(os.getenv("GEMINI_PER_USER", "1"))
+DEFAULT_COST = 6  # jumlah slot AI maksimal per modul (lihat sections.py)
+MAX_WAIT = 600  # detik
+POLL = 0.5
+WAIT_STALE = 15  # detik tanpa heartbeat -> tiket antre dianggap ditinggal
+RUN_TTL = 300  # detik; tiket aktif lebih lama dari ini dianggap macet
+DB_NAME = "admission.sqlite3"
+BUCKET = "gemini"
+
+with connect_sqlite(DB_NAME) as _conn:
+    _conn.execute("""
+        CREATE TABLE IF NOT EXISTS tickets (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_email TEXT NOT NULL,
+            cost REAL NOT NULL,
+            enqueued_at REAL NOT NULL,
+            heartbeat REAL NOT NULL,
+            started_at REAL,
+            per_user INTEGER NOT NULL DEFAULT 1
+        )""")
+    if "per_user" not in [row[1] for row in _conn.execute("PRAGMA table_info(tickets)")]:
+        # Tabel dari versi sebelum batas per guru disimpan di tiket
+        _conn.execute("ALTER TABLE tickets ADD COLUMN per_user INTEGER NOT NULL DEFAULT 1")
+    _conn.execute("""
+        CREATE TABLE IF NOT EXISTS buckets (
+            name TEXT PRIMARY KEY,
+            tokens REAL NOT NULL,
+            updated REAL NOT NULL,
+            avg_seconds REAL NOT NULL
+        )""")
+
+
+class AdmissionTimeout(TimeoutError):
+    def __init__(self, waited):
+        self.waited = waited
+        super().__init__(f"Antrean terlalu panjang, sudah menunggu {waited:.0f} detik.")
+
+
+class Limits:
+    def __init__(self, rpm=GEMINI_RPM, burst=GEMINI_BURST, max_active=GEMINI_MAX_ACTIVE, per_user=GEMINI_PER_USER):
+        self.rate = rpm / 60.0  # token per detik
+        self.burst = burst
+        self.max_active = max_active
+        self.per_user = per_user
+
+
+def _bucket(conn, limits, now):
+    row = conn.execute("SELECT tokens, updated, avg_seconds FROM buckets WHERE name = ?", (BUCKET,)).fetchone()
+    if row is None:
+        conn.execute("INSERT INTO buckets (name, tokens, updated, avg_seconds) VALUES (?, ?, ?, ?)",
+                     (BUCKET, limits.burst, now, 30.0))
+        return limits.burst, 30.0
+    tokens = min(limits.burst, row[0] + (now - row[1]) * limits.rate)
+    return tokens, row[2]
+
+
+def _try_admit(ticket_id, user_email, cost, limits):
+    # Satu transaksi BEGIN IMMEDIATE: cuma satu proses yang boleh membaca-lalu-mengubah antrean sekaligus.
+    # Hasil: (diterima?, posisi antrean, perkiraan tunggu dalam detik)
+    now = time.time()
+    with connect_sqlite(DB_NAME) as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("DELETE FROM tickets WHERE started_at IS NULL AND heartbeat < ?", (now - WAIT_STALE,))
+        conn.execute("DELETE FROM tickets WHERE started_at IS NOT NULL AND started_at < ?", (now - RUN_TTL,))
+        conn.execute("UPDATE tickets SET heartbeat = ? WHERE id = ?", (now, ticket_id))
+
+        running = dict(conn.execute(
+            "SELECT user_email, COUNT(*) FROM tickets WHERE started_at IS NOT NULL GROUP BY user_email"
+        ).fetchall())
+        active = sum(running.values())
+        # Tiket di depan yang benar-benar bersaing: tiket guru yang sudah penuh jatahnya (menurut batas
+        # di tiket itu sendiri) gak dihitung
+        ahead = [
+            (cost_ahead, owner) for cost_ahead, owner, cap in conn.execute(
+                "SELECT cost, user_email, per_user FROM tickets WHERE started_at IS NULL AND id < ? ORDER BY id",
+                (ticket_id,),
+            ).fetchall()
+            if running.get(owner, 0) < cap
+        ]
+        tokens, avg_seconds = _bucket(conn, limits, now)
+
+        if not ahead and active < limits.max_active and running.get(user_email, 0) < limits.per_user \
+                and tokens >= min(cost, limits.burst):
+            conn.execute("UPDATE buckets SET tokens = ?, updated = ? WHERE name = ?",
+                         (tokens - min(cost, limits.burst), now, BUCKET))
+            conn.execute("UPDATE tickets SET started_at = ? WHERE id = ?", (now, ticket_id))
+            return True, 0, 0.0
+
+        conn.execute("UPDATE buckets SET tokens = ?, updated = ? WHERE name = ?", (tokens, now, BUCKET))
+        position = len(ahead) + 1
+        # Perkiraan: yang lebih lambat antara kuota token dan slot paralel yang tersedia
+        tokens_needed = sum(c for c, _ in ahead) + cost - tokens
+        by_rate = max(0.0, tokens_needed) / limits.rate if limits.rate else 0.0
+        waves = math.ceil(max(0, position - (limits.max_active - active)) / max(1, limits.max_active))
+        by_slots = waves * avg_seconds
+        return False, position, max(by_rate, by_slots, POLL)
+
+
+def _enqueue(user_email, cost, per_user):
+    now = time.time()
+    with connect_sqlite(DB_NAME) as conn:
+        cur = conn.execute(
+            "INSERT INTO tickets (user_email, cost, enqueued_at, heartbeat, per_user) VALUES (?, ?, ?, ?, ?)",
+            (user_email, cost, now, now, per_user),
+        )
+        return cur.lastrowid
+
+
+def _release(ticket_id):
+    now = time.time()
+    with connect_sqlite(DB_NAME) as conn:
+        row = conn.execute("SELECT started_at FROM tickets WHERE id = ?", (ticket_id,)).fetchone()
+        conn.execute("DELETE FROM tickets WHERE id = ?", (ticket_id,))
+        if row and row[0]:
+            # Rata-rata lama generate (EMA), dipakai buat perkiraan waktu tunggu
+            conn.execute("UPDATE buckets SET avg_seconds = avg_seconds * 0.8 + ? * 0.2 WHERE name = ?",
+                         (now - row[0], BUCKET))
+
+
+@contextmanager
+def admitted(user_email, cost=DEFAULT_COST, on_wait=None, limits=None, max_wait=MAX_WAIT, sleep=time.sleep):
+    # Tunggu giliran, jalankan isi blok, lalu lepas slot. on_wait(posisi, perkiraan_detik) dipanggil
+    # tiap polling selama masih antre (buat update tampilan).
+    limits = limits or Limits()
+    user_email = (user_email or "anonim").strip().lower()
+    ticket_id = _enqueue(user_email, cost, limits.per_user)
+    start = time.monotonic()
+    try:
+        while True:
+            ok, position, eta = _try_admit(ticket_id, user_email, cost, limits)
+            if ok:
+                break
+            waited = time.monotonic() - start
+            if waited > max_wait:
+                metrics.incr("admission_timeout")
+                raise AdmissionTimeout(waited)
+            if on_wait:
+                on_wait(position, eta)
+            sleep(POLL)
+        metrics.observe("admission_wait", time.monotonic() - start)
+        yield
+    finally:
+        _release(ticket_id)
+
+
+def _try_take(cost, limits):
+    # Hasil: detik yang perlu ditunggu sampai token cukup (0 = token sudah diambil)
+    now = time.time()
+    with connect_sqlite(DB_NAME) as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        tokens, _ = _bucket(conn, limits, now)
+        need = min(cost, limits.burst)
+        if tokens >= need:
+            conn.execute("UPDATE buckets SET tokens = ?, updated = ? WHERE name = ?", (tokens - need, now, BUCKET))
+            return 0.0
+        conn.execute("UPDATE buckets SET tokens = ?, updated = ? WHERE name = ?", (tokens, now, BUCKET))
+        return (need - tokens) / limits.rate if limits.rate else POLL
+
+
+def take(cost=1, limits=None, max_wait=MAX_WAIT, sleep=time.sleep):
+    # Ambil token tambahan dari bucket global untuk modul yang sudah masuk (misal retry request Gemini).
+    # Gak ikut antrean tiket (modulnya sudah dapat giliran), tapi tetap menunggu kalau bucket kosong.
+    limits = limits or Limits()
+    start = time.monotonic()
+    while True:
+        wait = _try_take(cost, limits)
+        if not wait:
+            metrics.incr("admission_retry_tokens", cost)
+            return
+        waited = time.monotonic() - start
+        if waited > max_wait:
+            metrics.incr("admission_timeout")
+            raise AdmissionTimeout(waited)
+        sleep(min(max(wait, 0.01), POLL))
+
+
+def queue_status():
+    # Ringkasan buat dashboard admin
+    limits = Limits()
+    now = time.time()
+    with connect_sqlite(DB_NAME) as conn:
+        waiting = conn.execute("SELECT COUNT(*) FROM tickets WHERE started_at IS NULL").fetchone()[0]
+        active = conn.execute("SELECT COUNT(*) FROM tickets WHERE started_at IS NOT NULL").fetchone()[0]
+        tokens, avg_seconds = _bucket(conn, limits, now)
+    return {"antre": waiting, "aktif": active, "token": round(tokens, 2), "rata_rata_generate_s": round(avg_seconds, 1)}
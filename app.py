@@ -1,109 +1,68 @@
 import streamlit as st
-import google.generativeai as genai
-from supabase import create_client, Client
-import os
-from dotenv import load_dotenv
+from supabase import Client
 import time
-from xhtml2pdf import pisa
-from io import BytesIO
+import csv
+import io
 from streamlit_lottie import st_lottie
-import requests
+from lottie_cache import LOTTIE_ROBOT_URL, LOTTIE_SUCCESS_URL, load_lottie
+import clients
+import resilience
+import metrics
+import module_cache
+from stream_render import StreamRenderer
+import pdf_render
+import admission
+import batch
+import history
+import checkpoints
+import session_token
+import token_usage
+from modul_ajar import JENJANG_KELAS, ELEMEN_CP, METODE, opsi_kelas, fase_for_kelas, ppp_for_metode
+import sections
 
 # 1. SETUP & CONFIGURATION
-load_dotenv()
 st.set_page_config(page_title="Modul Cerdas", page_icon="📖", layout="wide")
 
 # Link Donasi
 DONATE_LINK = "https://saweria.co/usernamekamu" 
 
-# Fungsi Load Animasi
-def load_lottieurl(url: str):
-    try:
-        r = requests.get(url)
-        if r.status_code != 200: return None
-        return r.json()
-    except:
-        return None
-
 # Load Aset (Animasi lebih clean/professional)
-lottie_robot = load_lottieurl("https://lottie.host/5a07c584-6f3f-48db-9556-993f3503928e/wF8w8O9ZlW.json") 
-lottie_success = load_lottieurl("https://lottie.host/9c334346-6d60-44a6-98a9-448255959080/c8Z3Y7d5x9.json")
+# Diambil dari cache lokal (disk + salinan offline di assets/ kalau ada), refresh ke CDN jalan di background.
+# Kalau belum ada sama sekali (misal CDN gak terjangkau), halaman tampil tanpa animasi.
+
+# Gak pakai cache_resource: load_lottie sudah dimemo per file (cek mtime aja), jadi animasi hasil
+# refresh background langsung terpakai di rerun berikutnya, bukan tertahan sampai cache Streamlit kedaluwarsa
+lottie_robot = load_lottie("lottie_robot", LOTTIE_ROBOT_URL)
+lottie_success = load_lottie("lottie_success", LOTTIE_SUCCESS_URL)
 
 # --- KONEKSI DATABASE & AI (DIAGNOSA MODE) ---
+# Klien diambil dari registry (clients.py) tiap rerun: registry-nya sudah memo sekali per proses, dan
+# gak dibungkus cache_resource biar klien yang di-reset health_check()/clients.reset() langsung terpakai.
+# Error gak ikut di-memo, jadi setelah secrets dibetulkan, rerun berikutnya langsung mencoba lagi.
+def init_services():
+    # App web butuh semua kunci (termasuk SESSION_SECRET), jadi dicek lengkap di awal
+    config = clients.load_config(st.secrets)
+    supabase: Client = clients.get_supabase(st.secrets)
+    model = clients.get_model(st.secrets)
+
+    # Endpoint /metrics opsional (isi METRICS_PORT di secrets/env), dibuka sekali per proses.
+    # Default cuma di localhost; METRICS_HOST buat membukanya ke jaringan (lihat README)
+    metrics.start_http_server(config.get("METRICS_PORT"), config.get("METRICS_HOST"))
+    return supabase, model
+
+
 try:
-    # 1. Ambil Kunci (Prioritas: Streamlit Secrets > Environment Variable)
-    # Kita pakai .get() biar gak error kalau kuncinya gak ada
-    if st.secrets:
-        # Hapus tanda kutip ganda jika user tidak sengaja memasukkannya di dalam string
-        SUPA_URL = st.secrets.get("SUPABASE_URL", "").replace('"', '').strip()
-        SUPA_KEY = st.secrets.get("SUPABASE_KEY", "").replace('"', '').strip()
-        GEMINI_KEY = st.secrets.get("GEMINI_API_KEY", "").replace('"', '').strip()
-    else:
-        # Fallback ke laptop lokal
-        load_dotenv()
-        SUPA_URL = os.getenv("SUPABASE_URL", "").strip()
-        SUPA_KEY = os.getenv("SUPABASE_KEY", "").strip()
-        GEMINI_KEY = os.getenv("GEMINI_API_KEY", "").strip()
-
-    # 2. Cek Apakah Kunci Kosong? (Ini yang sering bikin gagal)
-    missing_keys = []
-    if not SUPA_URL: missing_keys.append("SUPABASE_URL")
-    if not SUPA_KEY: missing_keys.append("SUPABASE_KEY")
-    if not GEMINI_KEY: missing_keys.append("GEMINI_API_KEY")
-
-    if missing_keys:
-        st.error(f"❌ Gawat! Kunci rahasia berikut belum terbaca: {', '.join(missing_keys)}")
-        st.info("Cek lagi di Settings > Secrets di Streamlit Cloud ya.")
-        st.stop()
-
-    # 3. Tes Koneksi
-    supabase: Client = create_client(SUPA_URL, SUPA_KEY)
-    genai.configure(api_key=GEMINI_KEY)
-    model = genai.GenerativeModel('gemini-2.5-flash')
-    
-    # 4. Tes Panggilan Ringan (Ping)
-    # Kita coba akses dummy biar tau valid atau nggak
-    # (Opsional: Kalau ini error, berarti URL/Key valid tapi akses ditolak)
-    
+    supabase, model = init_services()
+
+except clients.MissingKeysError as e:
+    st.error(f"❌ Gawat! Kunci rahasia berikut belum terbaca: {', '.join(e.keys)}")
+    st.info("Cek lagi di Settings > Secrets di Streamlit Cloud ya.")
+    st.stop()
 except Exception as e:
     st.error("❌ Terjadi Error saat Inisialisasi:")
     st.code(str(e)) # Tampilkan pesan error aslinya biar jelas
     st.stop()
 
-# --- FUNGSI GENERATE PDF ---
-def convert_html_to_pdf(source_html):
-    result_file = BytesIO()
-    # CSS PDF (Tetap Times New Roman Resmi)
-    pdf_style = """
-    <style>
-        @page { size: A4; margin: 2.5cm; }
-        body { font-family: 'Times New Roman', Times, serif; font-size: 12pt; color: #000; line-height: 1.5; }
-        h2 { text-align: center; text-transform: uppercase; margin-bottom: 20px; font-size: 14pt; font-weight: bold; }
-        h3 { font-size: 12pt; font-weight: bold; margin-top: 15px; }
-        p { text-align: justify; margin-bottom: 10px; }
-        table { width: 100%; border-collapse: collapse; margin-bottom: 15px; table-layout: fixed; }
-        th, td { border: 1px solid #000; padding: 6px; vertical-align: top; word-wrap: break-word; font-size: 12pt !important; }
-        th { background-color: #f0f0f0; text-align: center; font-weight: bold; }
-        tr { page-break-inside: avoid; }
-    </style>
-    """
-    full_html = f"<html><body>{pdf_style}{source_html}</body></html>"
-    pisa_status = pisa.CreatePDF(full_html, dest=result_file)
-    if pisa_status.err: return None
-    return result_file.getvalue()
-
-# --- DATABASE LOGIC (CP) ---
-def get_cp_text(fase, elemen):
-    cp_fase_f = {
-        "Menyimak – Berbicara": """Pada akhir Fase F, peserta didik menggunakan bahasa Inggris untuk berkomunikasi dengan guru, teman sebaya dan orang lain dalam berbagai macam situasi dan tujuan. Mereka menggunakan dan merespon pertanyaan terbuka dan menggunakan strategi untuk memulai, mempertahankan dan menyimpulkan percakapan dan diskusi. Mereka memahami dan mengidentifikasi ide utama dan detail relevan dari diskusi atau presentasi mengenai berbagai macam topik. Mereka menggunakan bahasa Inggris untuk menyampaikan opini terhadap isu sosial dan untuk membahas minat, perilaku dan nilai-nilai lintas konteks budaya yang dekat dengan kehidupan pemuda. Mereka memberikan dan mempertahankan pendapatnya, membuat perbandingan dan mengevaluasi perspektifnya. Mereka menggunakan strategi koreksi dan perbaikan diri, dan menggunakan elemen non-verbal seperti bahasa tubuh, kecepatan bicara dan nada suara untuk dapat dipahami dalam sebagian besar konteks.""",
-        "Membaca – Memirsa": """Pada akhir Fase F, peserta didik membaca dan merespon berbagai macam teks seperti narasi, deskripsi, eksposisi, prosedur, argumentasi, dan diskusi secara mandiri. Mereka membaca untuk mempelajari sesuatu dan membaca untuk kesenangan. Mereka mencari, membuat sintesis dan mengevaluasi detil spesifik dan inti dari berbagai macam jenis teks. Teks ini dapat berbentuk cetak atau digital, termasuk di antaranya teks visual, multimodal atau interaktif. Mereka menunjukkan pemahaman terhadap ide pokok, isu-isu atau pengembangan plot dalam berbagai macam teks. Mereka mengidentifikasi tujuan penulis dan melakukan inferensi untuk memahami informasi tersirat dalam teks.""",
-        "Menulis – Mempresentasikan": """Pada akhir Fase F, peserta didik menulis berbagai jenis teks fiksi dan non-fiksi, melalui aktivitas yang dipandu, menunjukkan kesadaran peserta didik terhadap tujuan dan target pembaca. Mereka membuat perencanaan, menulis, mengulas dan menulis ulang berbagai jenis tipe teks dengan menunjukkan strategi koreksi diri, termasuk tanda baca dan huruf besar. Mereka menyampaikan ide menggunakan kosakata dan kata kerja umum dalam tulisannya. Mereka menyajikan informasi menggunakan berbagai mode presentasi untuk menyesuaikan dengan pembaca/pemirsa dan untuk mencapai tujuan yang berbeda-beda, dalam bentuk cetak dan digital."""
-    }
-    if fase == "F" and elemen in cp_fase_f:
-        return cp_fase_f[elemen]
-    else:
-        return "GENERATE_BY_AI"
-
 # 2. UI/UX "CLEAN AESTHETIC" STYLE
 st.markdown("""
 <style>
@@ -199,10 +158,39 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # 3. SESSION STATE
-if 'logged_in' not in st.session_state:
+# Login disimpan sebagai token bertanda tangan di URL (lihat session_token.py) dan dicek ulang tiap rerun
+# cuma dengan HMAC, tanpa Supabase. Sesi jadi gak terikat ke satu proses: replika mana pun bisa melayani.
+def start_session(email):
+    st.query_params[session_token.QUERY_PARAM] = session_token.issue(email, clients.session_secret())
+    st.session_state['logged_in'] = True
+    st.session_state['user_email'] = email
+
+
+def end_session(revoke=False):
+    if revoke and st.session_state.get('user_email'):
+        # Logout beneran: cabut semua token guru ini, bukan cuma hapus dari URL tab ini
+        session_token.revoke(st.session_state['user_email'])
+    st.query_params.pop(session_token.QUERY_PARAM, None)
     st.session_state['logged_in'] = False
-if 'user_email' not in st.session_state:
     st.session_state['user_email'] = ""
+    st.session_state.pop('history_cursors', None)
+
+
+def restore_session():
+    token = st.query_params.get(session_token.QUERY_PARAM)
+    claims = session_token.verify(token, clients.session_secret())
+    if claims is None:
+        if token:
+            st.toast("🔒 Sesi Anda sudah berakhir, silakan masuk lagi.")
+        end_session()
+        return
+    st.session_state['logged_in'] = True
+    st.session_state['user_email'] = claims["e"]
+    if session_token.needs_refresh(claims):
+        start_session(claims["e"])
+
+
+restore_session()
 
 # --- HALAMAN AUTH ---
 def login_page():
@@ -223,17 +211,22 @@ def login_page():
                     submitted = st.form_submit_button("Masuk", use_container_width=True)
                     if submitted:
                         try:
-                            response = supabase.table('users').select("*").eq('email', email).eq('password', password).execute()
+                            with metrics.timer("supabase_auth", op="login"):
+                                response = resilience.call(
+                                    "Supabase", supabase.table('users').select("*").eq('email', email).eq('password', password).execute,
+                                    timeout=clients.SUPABASE_TIMEOUT,
+                                )
                             if len(response.data) > 0:
-                                st.session_state['logged_in'] = True
-                                st.session_state['user_email'] = email
+                                start_session(email)
                                 st.success("Login Berhasil!")
                                 time.sleep(0.5)
                                 st.rerun()
                             else:
                                 st.error("Email/Password salah.")
+                        except resilience.CircuitOpenError as e:
+                            st.warning(resilience.friendly_message(e))
                         except Exception as e:
-                                st.error(str(e))
+                            st.error(resilience.friendly_message(e))
             
             with tab_signup:
                 with st.form("signup_form"):
@@ -249,28 +242,270 @@ def login_page():
                             st.warning("Isi semua data dulu bosQ")
                         else:
                             try:
-                                check = supabase.table('users').select("*").eq('email', new_email).execute()
+                                with metrics.timer("supabase_auth", op="signup_check"):
+                                    check = resilience.call(
+                                        "Supabase", supabase.table('users').select("*").eq('email', new_email).execute,
+                                        timeout=clients.SUPABASE_TIMEOUT,
+                                    )
                                 if len(check.data) > 0:
                                     st.error("Email sudah dipakai.")
                                 else:
-                                    supabase.table('users').insert({"email": new_email, "password": new_pass}).execute()
+                                    # INSERT gak di-retry: kalau request pertama sebenarnya masuk, retry bikin akun dobel
+                                    with metrics.timer("supabase_auth", op="signup_insert"):
+                                        resilience.call(
+                                            "Supabase", supabase.table('users').insert({"email": new_email, "password": new_pass}).execute,
+                                            timeout=clients.SUPABASE_TIMEOUT, retries=0,
+                                        )
                                     st.success("Akun dibuat! Silakan login.")
+                            except resilience.CircuitOpenError as e:
+                                st.warning(resilience.friendly_message(e))
                             except Exception as e:
-                                st.error(str(e))
+                                st.error(resilience.friendly_message(e))
+
+# --- TOMBOL DOWNLOAD ---
+PDF_POLL_INTERVAL = 0.5  # detik; seberapa sering progres konversi PDF dicek
+
+
+def show_download(final_html, topik, pdf_bytes=None, on_pdf=None):
+    st.markdown("### 📥 Download File")
+    job = None
+    if not pdf_bytes:
+        # Konversi sudah jalan di worker pool sejak modul selesai (submit_pdf mengembalikan job yang sama)
+        job = pdf_render.submit_pdf(final_html)
+
+        def save_pdf(done):
+            # Simpan ke cache/riwayat begitu PDF jadi, walau tombolnya gak pernah diklik
+            if on_pdf and done.exception() is None and done.result():
+                on_pdf(done.result())
+
+        job.add_done_callback(save_pdf)
+
+        def pdf_progress():
+            # Fragment kecil yang dicek ulang tiap PDF_POLL_INTERVAL, bukan loop sleep di script utama
+            if not job.done():
+                st.progress(pdf_render.estimate_progress(final_html), text="⏳ Menyiapkan PDF...")
+            elif job.exception() is not None:
+                st.warning("Gagal membuat PDF. Klik unduh untuk mencoba lagi.")
+            else:
+                st.caption("✅ PDF siap diunduh.")
+
+        st.fragment(pdf_progress, run_every=None if job.done() else PDF_POLL_INTERVAL)()
+
+    def build_pdf():
+        # Jalan waktu tombol diklik, di thread terpisah dari rerun: cuma menunggu job yang sudah berjalan
+        # (atau mengulang konversi kalau job tadi gagal)
+        pdf = pdf_render.get_pdf(final_html)
+        if not pdf:
+            raise RuntimeError("Gagal membuat PDF.")
+        if on_pdf and job is not None and job.exception() is not None:
+            on_pdf(pdf)  # hasil konversi ulang; job pertama gagal jadi save_pdf tadi gak menyimpan apa-apa
+        return pdf
+
+    st.download_button(
+        label="📄 Unduh PDF (A4 - Resmi)",
+        data=pdf_bytes or build_pdf,
+        file_name=f"Modul_{topik.replace(' ', '_')}.pdf",
+        mime="application/pdf",
+        type="primary",
+        on_click="ignore"
+    )
+
+# --- RIWAYAT MODUL ---
+def save_history(spec, html, pdf=None):
+    # Disimpan di background (lihat history.py): tombol unduh gak nunggu Supabase.
+    # Gagal simpan riwayat gak boleh bikin modul yang sudah jadi ikut gagal, cukup dikabari di rerun berikutnya.
+    track_history(history.save_module_later(supabase, st.session_state['user_email'], spec, html, pdf))
+
+
+def track_history(future):
+    if future is not None:
+        st.session_state.setdefault('history_pending', []).append(future)
+
+
+def report_history():
+    pending = st.session_state.get('history_pending', [])
+    for future in [f for f in pending if f.done()]:
+        pending.remove(future)
+        if future.exception() is not None:
+            st.toast(f"⚠️ Modul belum tersimpan ke riwayat: {resilience.friendly_message(future.exception())}")
+
+
+def on_pdf_ready(module_key):
+    user_email = st.session_state['user_email']
+
+    def handler(pdf):
+        module_cache.get_cache().put_pdf(module_key, pdf)
+        # Riwayat tetap bisa render ulang PDF dari HTML-nya nanti kalau yang ini gagal tersimpan
+        history.attach_pdf_later(supabase, user_email, module_key, pdf)
+    return handler
+
+
+@st.fragment
+def history_page():
+    # Fragment: pindah halaman riwayat cuma menjalankan ulang bagian ini
+    st.markdown("# 🗂️ Riwayat Modul")
+    st.markdown("<p style='font-size: 18px; color: #475569;'>Modul yang pernah Anda buat. Unduh ulang tanpa perlu membuat dari awal.</p>", unsafe_allow_html=True)
+
+    # Cursor tiap halaman yang sudah dibuka, biar tombol "Sebelumnya" gak perlu query ulang dari awal
+    cursors = st.session_state.setdefault('history_cursors', [None])
+    user_email = st.session_state['user_email']
+    try:
+        rows, next_cursor = history.list_modules(supabase, user_email, cursor=cursors[-1])
+    except Exception as e:
+        st.error(resilience.friendly_message(e))
+        return
+
+    if not rows:
+        st.info("Belum ada modul tersimpan. Yuk buat modul pertama Anda!")
+    for row in rows:
+        with st.container():
+            c1, c2 = st.columns([3, 1])
+            with c1:
+                st.markdown(f"**{row['topik']}**")
+                st.caption(f"{row['jenjang']} · Kelas {row['kelas']} · {row['metode']} · {row['created_at'][:10]}")
+            with c2:
+                # PDF baru diambil waktu tombol diklik (cache lokal dulu, lalu Supabase)
+                st.download_button(
+                    label="📄 Unduh PDF",
+                    data=lambda row=row: history.fetch_pdf(supabase, user_email, row) or b"",
+                    file_name=f"Modul_{row['topik'].replace(' ', '_')}.pdf",
+                    mime="application/pdf",
+                    key=f"history_pdf_{row['id']}",
+                    on_click="ignore"
+                )
+
+    c1, c2, c3 = st.columns([1, 2, 1])
+    with c1:
+        if len(cursors) > 1 and st.button("⬅️ Sebelumnya", use_container_width=True):
+            cursors.pop()
+            st.rerun(scope="fragment")
+    with c2:
+        st.caption(f"<div style='text-align:center;'>Halaman {len(cursors)}</div>", unsafe_allow_html=True)
+    with c3:
+        if next_cursor is not None and st.button("Berikutnya ➡️", use_container_width=True):
+            cursors.append(next_cursor)
+            st.rerun(scope="fragment")
+
+# --- HALAMAN BATCH ---
+def batch_page():
+    st.markdown("# Batch Modul Ajar")
+    st.markdown("<p style='font-size: 18px; color: #475569;'>Buat modul satu semester sekaligus: upload CSV atau isi tabel, hasilnya satu file ZIP berisi PDF.</p>", unsafe_allow_html=True)
+
+    with st.container():
+        st.markdown("### 📝 Data Default")
+        c1, c2 = st.columns(2)
+        with c1:
+            penyusun = st.text_input("Nama Penyusun", placeholder="Nama Lengkap dengan Gelar", key="batch_penyusun")
+            instansi = st.text_input("Instansi / Sekolah", placeholder="Nama Sekolah", key="batch_instansi")
+        with c2:
+            semester = st.selectbox("Semester", ["Ganjil", "Genap"], key="batch_semester")
+            alokasi = st.text_input("Alokasi Waktu", "2 x 45 Menit", key="batch_alokasi")
+        defaults = {"penyusun": penyusun, "instansi": instansi, "semester": semester, "alokasi": alokasi}
+
+    with st.container():
+        st.markdown("### 📋 Daftar Modul")
+        st.caption(f"Kolom CSV: {', '.join(batch.CSV_COLUMNS)}. Kolom yang kosong diisi dari Data Default.")
+        uploaded = st.file_uploader("Upload CSV", type="csv")
+        rows = [{"jenjang": "SMA/MA", "kelas": 10, "topik": "", "metode": METODE[0], "elemen": ELEMEN_CP[0]}]
+        if uploaded is not None:
+            rows = list(csv.DictReader(io.StringIO(uploaded.getvalue().decode("utf-8-sig"))))
+        rows = st.data_editor(
+            rows,
+            num_rows="dynamic",
+            use_container_width=True,
+            key=f"batch_rows_{uploaded.file_id if uploaded else 'manual'}",
+            column_config={
+                "jenjang": st.column_config.SelectboxColumn("Jenjang", options=list(JENJANG_KELAS)),
+                "kelas": st.column_config.NumberColumn("Kelas", min_value=1, max_value=12, step=1),
+                "topik": st.column_config.TextColumn("Topik"),
+                "metode": st.column_config.SelectboxColumn("Metode", options=METODE),
+                "elemen": st.column_config.SelectboxColumn("Elemen CP", options=ELEMEN_CP),
+            },
+        )
+
+    specs, errors = batch.rows_to_specs(rows, defaults)
+    for no, message in errors:
+        st.warning(f"Baris {no} dilewati: {message}")
+
+    if st.button(f"✨ Buat {len(specs)} Modul (ZIP)", type="primary", use_container_width=True, disabled=not specs):
+        status = [{"topik": spec["topik"], "kelas": spec["kelas"], "status": "antre", "keterangan": ""} for spec in specs]
+        progress = st.progress(0.0, text="Memproses...")
+        table = st.empty()
+
+        def on_progress(index, state, detail=""):
+            status[index]["status"] = state
+            status[index]["keterangan"] = detail
+            finished = sum(row["status"] in ("selesai", "gagal") for row in status)
+            progress.progress(finished / len(status), text=f"{finished}/{len(status)} modul selesai")
+            table.dataframe(status, use_container_width=True, hide_index=True)
+
+        zip_bytes = batch.run_batch(specs, model, on_progress=on_progress, user_email=st.session_state['user_email'])
+        st.success("Selesai! Semua modul sudah dibungkus jadi satu ZIP.")
+        st.download_button(
+            label="🗂️ Unduh ZIP",
+            data=zip_bytes,
+            file_name="Modul_Batch.zip",
+            mime="application/zip",
+            type="primary",
+            on_click="ignore"
+        )
+
+# --- HALAMAN METRICS (ADMIN) ---
+def metrics_page():
+    st.markdown("# 📊 Metrics")
+    st.caption("Latensi per tahap di proses ini (p50/p95 dari 1000 sampel terakhir per tahap).")
+    data = metrics.summary()
+    if data["stages"]:
+        st.dataframe(
+            [{k: (round(v, 3) if isinstance(v, float) else v) for k, v in row.items()} for row in data["stages"]],
+            use_container_width=True, hide_index=True,
+        )
+    else:
+        st.info("Belum ada data. Coba buat satu modul dulu.")
+
+    c1, c2 = st.columns(2)
+    with c1:
+        st.markdown("### Kejadian")
+        st.json(data["counters"])
+    with c2:
+        st.markdown("### Layanan")
+        st.json({
+            "circuit_breaker": {name: resilience.get_breaker(name).state for name in ("Supabase", "Gemini")},
+            "antrean_gemini": admission.queue_status(),
+            "token_gemini_7_hari": token_usage.summary(),
+            "health": {name: {"ok": ok, "pesan": msg} for name, (ok, msg) in clients.health_check().items()},
+        })
+    with st.expander("Format Prometheus"):
+        st.code(metrics.prometheus_text(), language="text")
 
 # --- MAIN APP ---
 def main_app():
+    report_history()
     # SIDEBAR CLEAN
     with st.sidebar:
         st.markdown("### Modul Cerdas")
         st.markdown(f"<p style='font-size:14px; color:#64748b;'>Signed in as:<br><b>{st.session_state['user_email']}</b></p>", unsafe_allow_html=True)
         st.markdown("---")
         if st.button("Log Out", use_container_width=True):
-            st.session_state['logged_in'] = False
+            end_session(revoke=True)
             st.rerun()
+        modes = ["Satu Modul", "Batch (CSV)", "🗂️ Riwayat"]
+        if st.session_state['user_email'].strip().lower() in clients.admin_emails():
+            modes.append("📊 Metrics")
+        mode = st.radio("Mode", modes, label_visibility="collapsed")
         st.markdown("<br>", unsafe_allow_html=True)
         st.markdown(f'<a href="{DONATE_LINK}" target="_blank" style="display:block;text-align:center;background:#10b981;color:white;padding:10px;border-radius:8px;text-decoration:none;font-size:14px;font-weight:600;">☕ Dukung Developer</a>', unsafe_allow_html=True)
 
+    if mode == "Batch (CSV)":
+        batch_page()
+        return
+    if mode == "🗂️ Riwayat":
+        history_page()
+        return
+    if mode == "📊 Metrics":
+        metrics_page()
+        return
+
     # HERO SECTION
     col1, col2 = st.columns([2, 1])
     with col1:
@@ -282,211 +517,153 @@ def main_app():
 
     st.markdown("<br>", unsafe_allow_html=True)
 
-    # INPUT SECTION
+    # Form dipecah jadi fragment: ganti jenjang cuma menjalankan ulang "Informasi Umum"
+    # (opsi kelas & fase), bukan seluruh app.py. Nilai tiap input dibaca lewat session_state.
+    informasi_umum()
+    detail_pembelajaran()
+    st.markdown("<br>", unsafe_allow_html=True)
+    generate_section()
+
+
+# --- FRAGMENT FORM ---
+FORM_FIELDS = ("penyusun", "instansi", "jenjang", "kelas", "topik", "semester", "alokasi", "elemen_pilih", "metode")
+
+
+@st.fragment
+def informasi_umum():
     with st.container():
         st.markdown("### 📝 Informasi Umum")
         c1, c2 = st.columns(2)
         with c1:
-            penyusun = st.text_input("Nama Penyusun", placeholder="Nama Lengkap dengan Gelar")
-            instansi = st.text_input("Instansi / Sekolah", placeholder="Nama Sekolah")
+            st.text_input("Nama Penyusun", placeholder="Nama Lengkap dengan Gelar", key="penyusun")
+            st.text_input("Instansi / Sekolah", placeholder="Nama Sekolah", key="instansi")
         with c2:
-            jenjang = st.selectbox("Jenjang Sekolah", ["SD/MI", "SMP/MTS", "SMA/MA"])
-            if jenjang == "SD/MI": opsi_kelas = [1, 2, 3, 4, 5, 6]
-            elif jenjang == "SMP/MTS": opsi_kelas = [7, 8, 9]
-            else: opsi_kelas = [10, 11, 12]
-            kelas = st.selectbox("Kelas", opsi_kelas)
-            fase = ""
-            if kelas in [1, 2]: fase = "A"
-            elif kelas in [3, 4]: fase = "B"
-            elif kelas in [5, 6]: fase = "C"
-            elif kelas in [7, 8, 9]: fase = "D"
-            elif kelas == 10: fase = "E"
-            elif kelas in [11, 12]: fase = "F"
+            jenjang = st.selectbox("Jenjang Sekolah", list(JENJANG_KELAS), key="jenjang")
+            kelas = st.selectbox("Kelas", opsi_kelas(jenjang), key="kelas")
+            fase = fase_for_kelas(kelas)
             st.caption(f"Fase Terdeteksi: **Fase {fase}**")
 
+
+@st.fragment
+def detail_pembelajaran():
     with st.container():
         st.markdown("### 🎯 Detail Pembelajaran")
         c3, c4 = st.columns(2)
         with c3:
-            topik = st.text_input("Topik / Materi", placeholder="Contoh: Narrative Text")
-            semester = st.selectbox("Semester", ["Ganjil", "Genap"])
-            alokasi = st.text_input("Alokasi Waktu", "2 x 45 Menit")
+            st.text_input("Topik / Materi", placeholder="Contoh: Narrative Text", key="topik")
+            st.selectbox("Semester", ["Ganjil", "Genap"], key="semester")
+            st.text_input("Alokasi Waktu", "2 x 45 Menit", key="alokasi")
         with c4:
-            elemen_pilih = st.selectbox("Elemen CP", ["Menyimak – Berbicara", "Membaca – Memirsa", "Menulis – Mempresentasikan"])
-            metode = st.selectbox("Metode Pembelajaran", ["Jigsaw", "Think-Pair-Share (TPS)", "Number Heads Together (NHT)", "Role Play", "Gallery Walk", "Two Stay Two Stray (TSTS)", "Talking Chips"])
-            ppp_map = {
-                "Jigsaw": "Gotong Royong & Mandiri",
-                "Think-Pair-Share (TPS)": "Bernalar Kritis & Kreatif",
-                "Number Heads Together (NHT)": "Gotong Royong & Bernalar Kritis",
-                "Role Play": "Kreatif & Kebinekaan Global",
-                "Gallery Walk": "Gotong Royong & Bernalar Kritis",
-                "Two Stay Two Stray (TSTS)": "Gotong Royong & Komunikasi Efektif",
-                "Talking Chips": "Gotong Royong & Menghargai Orang Lain"
-            }
-            ppp_value = ppp_map.get(metode, "Mandiri & Kreatif")
+            st.selectbox("Elemen CP", ELEMEN_CP, key="elemen_pilih")
+            metode = st.selectbox("Metode Pembelajaran", METODE, key="metode")
+            ppp_value = ppp_for_metode(metode)
             st.info(f"**Profil Pelajar Pancasila:** {ppp_value}")
 
-    st.markdown("<br>", unsafe_allow_html=True)
+
+@st.fragment
+def generate_section():
+    force_regen = st.checkbox("🔄 Buat ulang dari awal (abaikan hasil tersimpan)", value=False)
     generate_btn = st.button("✨ Buat Modul Ajar (PDF)", type="primary", use_container_width=True)
+    topik = st.session_state.get("topik", "")
+    penyusun = st.session_state.get("penyusun", "")
 
     if generate_btn:
         if not topik or not penyusun:
             st.toast("⚠️ Mohon lengkapi Nama & Topik.")
         else:
-            cp_content = get_cp_text(fase, elemen_pilih)
-            if cp_content == "GENERATE_BY_AI":
-                prompt_cp = f"Buatkan CP yang sesuai untuk Fase {fase}, Elemen {elemen_pilih}."
-            else:
-                prompt_cp = f"Gunakan TEKS CP INI (JANGAN UBAH): {cp_content}"
+            spec = {field: st.session_state[field] for field in FORM_FIELDS}
+            spec["fase"] = fase_for_kelas(spec["kelas"])
+            spec["ppp_value"] = ppp_for_metode(spec["metode"])
+
+            # CEK CACHE DULU: modul dengan input yang sama cukup diputar ulang, gak perlu panggil Gemini
+            module_key = module_cache.make_key(spec)
+            cache = module_cache.get_cache()
+            if force_regen:
+                checkpoints.clear(module_key)
+            cached = None if force_regen else cache.get(module_key)
+            metrics.incr("module_cache_hit" if cached else "module_cache_miss")
+            if cached:
+                cached_html, cached_pdf = cached
+                st.markdown(cached_html, unsafe_allow_html=True)
+                st.success("Selesai! Modul ini sudah pernah dibuat, langsung diambil dari arsip.")
+                save_history(spec, cached_html, cached_pdf)
+                show_download(cached_html, topik, cached_pdf, on_pdf=on_pdf_ready(module_key))
+                return
 
             result_container = st.container()
+            queue_box = result_container.empty()
 
-            # PROMPT
-            prompt = f"""
-            Bertindaklah sebagai Guru Inggris Profesional. Buat Modul Ajar Lengkap.
-            **DATA:**
-            Penyusun: {penyusun} | Sekolah: {instansi} | Jenjang: {jenjang} | Kelas: {kelas} | Fase: {fase}
-            Topik: {topik} | Metode: {metode} | Profil Pancasila: {ppp_value} | Elemen: {elemen_pilih}
-
-            **INSTRUKSI FORMATTING (PDF FRIENDLY):**
-            1. JANGAN GUNAKAN MARKDOWN (Bintang/Pagar). Gunakan HTML.
-            2. Gunakan tag HTML `<i>` miring, `<b>` tebal.
-            3. Gunakan tag <table>, <tr>, <th>, <td> untuk SEMUA tabel.
-            4. Gunakan <ul> dan <li> untuk poin-poin.
-            5. Gunakan <h2> dan <h3> untuk judul.
-            
-            **STRUKTUR ISI MODUL:**
-            <h2>MODUL AJAR: {topik.upper()}</h2>
-            <hr>
-            <h3>I. INFORMASI UMUM</h3>
-            <p><strong>A. IDENTITAS MODUL</strong></p>
-            <table>
-                <tr><th width="30%">Informasi</th><th>Keterangan</th></tr>
-                <tr><td>Penyusun</td><td>{penyusun}</td></tr>
-                <tr><td>Instansi</td><td>{instansi}</td></tr>
-                <tr><td>Jenjang / Kelas</td><td>{jenjang} / {kelas} (Fase {fase})</td></tr>
-                <tr><td>Alokasi Waktu</td><td>{alokasi}</td></tr>
-                <tr><td>Mata Pelajaran</td><td>Bahasa Inggris</td></tr>
-                <tr><td>Elemen</td><td>{elemen_pilih}</td></tr>
-            </table>
-
-            <p><strong>B. KOMPETENSI AWAL</strong></p>
-            <p>(1 Paragraf singkat)</p>
-
-            <p><strong>C. PROFIL PELAJAR PANCASILA</strong></p>
-            <p>{ppp_value}</p>
-
-            <p><strong>D. SARANA DAN PRASARANA</strong></p>
-            <ul><li>Laptop/Smartphone</li><li>Jaringan Internet</li><li>Materi {topik}</li></ul>
-
-            <p><strong>E. MODEL PEMBELAJARAN</strong></p>
-            <p>Tatap Muka dengan metode <strong>{metode}</strong>.</p>
-
-            <h3>II. KOMPONEN INTI</h3>
-            <p><strong>A. TUJUAN PEMBELAJARAN</strong></p>
-            <p>1. <strong>Capaian Pembelajaran (CP):</strong> {prompt_cp}</p>
-            <p>2. <strong>Tujuan Pembelajaran (TP):</strong> (Poin ABCD)</p>
-
-            <p><strong>B. PEMAHAMAN BERMAKNA</strong></p>
-            <p>(Manfaat mempelajari topik ini)</p>
-
-            <p><strong>C. KEGIATAN PEMBELAJARAN</strong></p>
-            <table>
-                <tr><th width="15%">Tahap</th><th width="70%">Deskripsi Kegiatan</th><th width="15%">Waktu</th></tr>
-                <tr>
-                    <td><strong>Pendahuluan</strong></td>
-                    <td><ul><li>Salam & Doa</li><li>Apersepsi: Guru menampilkan gambar <i>(misal: "{topik}")</i></li><li>Pertanyaan Pemantik</li></ul></td>
-                    <td>10'</td>
-                </tr>
-                <tr>
-                    <td><strong>Inti</strong></td>
-                    <td>(Rincikan langkah {metode} disini. Gunakan tag <i> untuk bahasa inggris. Gunakan <ul><li> untuk poin.)</td>
-                    <td>70'</td>
-                </tr>
-                <tr>
-                    <td><strong>Penutup</strong></td>
-                    <td><ul><li>Refleksi</li><li>Kesimpulan</li><li>Doa</li></ul></td>
-                    <td>10'</td>
-                </tr>
-            </table>
-
-            <h3>III. LAMPIRAN</h3>
-            <p><strong>A. ASESMEN / PENILAIAN</strong></p>
-            
-            <p><strong>1. Penilaian Sikap</strong></p>
-            <table>
-                <tr><th width="20%">Aspek</th><th width="20%">Skor 4 (Sangat Baik)</th><th width="20%">Skor 3 (Baik)</th><th width="20%">Skor 2 (Cukup)</th><th width="20%">Skor 1 (Kurang)</th></tr>
-                <tr>
-                    <td>{ppp_value.split('&')[0]}</td>
-                    <td>Sangat aktif...</td>
-                    <td>Aktif...</td>
-                    <td>Cukup aktif...</td>
-                    <td>Kurang aktif...</td>
-                </tr>
-            </table>
-
-            <p><strong>2. Penilaian Keterampilan</strong></p>
-            <table>
-                <tr><th width="30%">Aspek</th><th width="70%">Indikator (Skor 4-1)</th></tr>
-                <tr>
-                    <td>Konten</td>
-                    <td>(Deskripsi indikator penilaian)</td>
-                </tr>
-            </table>
-
-            <p><strong>B. LEMBAR KERJA PESERTA DIDIK (LKPD)</strong></p>
-            <p><strong>Activity 1: {topik} Exploration</strong></p>
-            <table>
-                <tr><th width="10%">No</th><th width="50%">Question / Instruction</th><th width="40%">Answer Space</th></tr>
-                <tr><td>1</td><td>(Buatkan pertanyaan pemahaman terkait {topik})</td><td>...</td></tr>
-                <tr><td>2</td><td>(Buatkan pertanyaan analisis)</td><td>...</td></tr>
-            </table>
-
-            <p><strong>C. GLOSARIUM</strong></p>
-            <ul><li>(Istilah 1)</li><li>(Istilah 2)</li></ul>
-
-            <p><strong>D. DAFTAR PUSTAKA</strong></p>
-            <ul>
-                <li>Kementerian Pendidikan dan Kebudayaan. (2025). <em>Buku Guru Bahasa Inggris Fase {fase}</em>. Jakarta: Kemendikbud.</li>
-                <li>Sumber internet relevan tentang {topik}.</li>
-            </ul>
-            """
+            def show_cp_wait(waited):
+                queue_box.info(f"⏳ Capaian Pembelajaran Fase {spec['fase']} sedang dibuat untuk guru lain, "
+                               f"tinggal dipakai bareng... ({waited:.0f} detik)")
 
+            parts = []  # diisi di dalam antrean; abort() dengan daftar kosong gak melepas apa-apa
+            usage = {}  # diisi stream_sections per slot, termasuk slot yang gagal/dibatalkan
             try:
-                # EFEK MENGETIK
-                with st.spinner("🤖 AI sedang menyusun modul..."):
-                    response = model.generate_content(prompt, stream=True)
-                
-                output_placeholder = result_container.empty()
-                full_text = ""
-                
-                for chunk in response:
-                    full_text += chunk.text
-                    clean_text = full_text.replace("```html", "").replace("```", "")
-                    output_placeholder.markdown(clean_text + "▌", unsafe_allow_html=True)
-                
-                final_html = full_text.replace("```html", "").replace("```", "")
-                output_placeholder.markdown(final_html, unsafe_allow_html=True)
+                # ANTREAN: kuota Gemini dibagi se-deployment (lihat admission.py), posisi & perkiraan tunggu tampil live
+                def show_queue(position, eta):
+                    queue_box.info(f"⏳ Server sedang ramai. Anda di antrean ke-{position}, perkiraan tunggu ±{eta:.0f} detik.")
+
+                with admission.admitted(st.session_state['user_email'], sections.ai_slot_count(spec), on_wait=show_queue):
+                    queue_box.empty()
+                    # PROMPT: bagian tetap dirender lokal, bagian kreatif dikirim ke Gemini paralel (lihat sections.py).
+                    # Klaim/tunggu CP baru di sini, setelah dapat giliran: yang memegang klaim gak ikut antre sambil
+                    # menahan guru lain yang butuh CP yang sama.
+                    parts = sections.plan_sections(spec, on_cp_wait=show_cp_wait)
+                    queue_box.empty()
+                    generation_start = time.perf_counter()
+                    # Tiap bagian punya tempat sendiri, jadi urutan modul tetap walau slot AI selesai acak
+                    slots = [result_container.container() for _ in parts]
+                    renderers = {}
+                    for i, part in enumerate(parts):
+                        if part[0] == "fixed":
+                            slots[i].markdown(part[1], unsafe_allow_html=True)
+                        else:
+                            # Update tampilan dibatasi waktu/byte & pagar ``` dibuang per chunk (lihat stream_render.py)
+                            renderers[i] = StreamRenderer(slots[i], frame=part[3])
+
+                    # EFEK MENGETIK
+                    texts = {}
+                    with st.spinner("🤖 AI sedang menyusun modul..."):
+                        # Checkpoint per bagian: kalau putus di tengah, klik berikutnya melanjutkan (lihat checkpoints.py)
+                        # Tiap retry request Gemini bayar token lagi ke bucket bersama (lihat admission.take)
+                        for i, text in sections.stream_sections(model, parts, usage=usage, checkpoint_key=module_key,
+                                                                on_retry=admission.take):
+                            if text is None:
+                                texts[i] = renderers[i].finish()
+                            else:
+                                renderers[i].write(text)
+                final_html = sections.complete(spec, parts, texts)
+                # Mulai konversi PDF di background secepatnya, sambil balon & pesan sukses tampil
+                pdf_render.submit_pdf(final_html)
+                metrics.observe("generation_total", time.perf_counter() - generation_start)
+                cache.put(module_key, final_html)
+                checkpoints.clear(module_key)
+                save_history(spec, final_html)
                 
                 st.balloons()
                 st.success("Selesai! Modul Anda siap.")
 
-                # TOMBOL DOWNLOAD
-                st.markdown("### 📥 Download File")
-                pdf_bytes = convert_html_to_pdf(final_html)
-                if pdf_bytes:
-                    st.download_button(
-                        label="📄 Unduh PDF (A4 - Resmi)",
-                        data=pdf_bytes,
-                        file_name=f"Modul_{topik.replace(' ', '_')}.pdf",
-                        mime="application/pdf",
-                        type="primary"
-                    )
-                else:
-                    st.error("Gagal membuat PDF.")
+                show_download(final_html, topik, on_pdf=on_pdf_ready(module_key))
                 
+            except admission.AdmissionTimeout as e:
+                sections.abort(spec, parts)
+                st.warning(f"⏳ {e} Silakan coba lagi beberapa saat lagi.")
+            except resilience.CircuitOpenError as e:
+                sections.abort(spec, parts)
+                st.warning(resilience.friendly_message(e))
             except Exception as e:
-                st.error(f"Error AI: {e}")
+                sections.abort(spec, parts)
+                st.error(f"Error AI: {resilience.friendly_message(e)}")
+                st.info("Bagian yang sudah selesai tersimpan. Klik tombol buat modul lagi untuk melanjutkan dari situ.")
+                clients.health_check(force=True)
+            except BaseException:
+                # Rerun/stop Streamlit di tengah generate: lepas klaim CP, checkpoint tetap tersimpan
+                sections.abort(spec, parts)
+                raise
+            finally:
+                # Token tetap dicatat walau generate gagal, timeout, atau dibatalkan di tengah
+                token_usage.record(st.session_state['user_email'], module_key, usage)
 
 if st.session_state['logged_in']:
     main_app()
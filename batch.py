@@ -0,0 +1,225 @@
+import argparse
+import csv
+import io
+import re
+import sys
+import threading
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+import admission
+import module_cache
+import pdf_render
+import sections
+import token_usage
+from modul_ajar import ELEMEN_CP, JENJANG_KELAS, METODE, make_spec
+
+# --- MODE BATCH ---
+# CSV / daftar modul masuk, ZIP berisi PDF keluar. Dipakai dari halaman batch di app.py
+# maupun dari command line:  python batch.py semester_ganjil.csv -o modul.zip
+
+CSV_COLUMNS = ("penyusun", "instansi", "jenjang", "kelas", "topik", "metode", "elemen", "alokasi", "semester")
+DEFAULT_WORKERS = 3
+DEFAULT_RPM = 60  # batas request Gemini per menit (satu modul = satu request per bagian AI, sekitar 5-6)
+
+
+class RateLimiter:
+    # Token bucket sederhana: maksimal `rpm` panggilan per menit, boleh burst sampai `burst`
+    def __init__(self, rpm, burst=1):
+        self.interval = 60.0 / rpm if rpm else 0.0
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.interval:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) / self.interval)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_for = (1 - self.tokens) * self.interval
+            time.sleep(wait_for)
+
+
+def rows_to_specs(rows, defaults=None):
+    # Kolom yang kosong diisi dari `defaults`. Hasil: (specs, errors)
+    defaults = defaults or {}
+    specs, errors = [], []
+    for no, row in enumerate(rows, start=1):
+        row = {k: str(v).strip() for k, v in row.items() if k and v is not None and str(v).strip()}
+        if not row.get("topik"):
+            # Baris tanpa topik dianggap baris kosong (sering muncul dari tabel editor)
+            continue
+        data = {col: row.get(col) or str(defaults.get(col, "")).strip() for col in CSV_COLUMNS}
+        if not data["penyusun"]:
+            errors.append((no, "Nama penyusun kosong"))
+            continue
+        if data["jenjang"] not in JENJANG_KELAS:
+            errors.append((no, f"Jenjang tidak dikenal: {data['jenjang']}"))
+            continue
+        try:
+            kelas = int(float(data["kelas"]))
+        except ValueError:
+            errors.append((no, f"Kelas tidak valid: {data['kelas']}"))
+            continue
+        if kelas not in JENJANG_KELAS[data["jenjang"]]:
+            errors.append((no, f"Kelas {kelas} tidak ada di jenjang {data['jenjang']}"))
+            continue
+        if data["metode"] not in METODE:
+            errors.append((no, f"Metode tidak dikenal: {data['metode']}"))
+            continue
+        if data["elemen"] not in ELEMEN_CP:
+            errors.append((no, f"Elemen CP tidak dikenal: {data['elemen']}"))
+            continue
+        specs.append(make_spec(
+            penyusun=data["penyusun"], instansi=data["instansi"], jenjang=data["jenjang"], kelas=kelas,
+            topik=data["topik"], metode=data["metode"], elemen_pilih=data["elemen"],
+            alokasi=data["alokasi"] or "2 x 45 Menit", semester=data["semester"] or "Ganjil",
+        ))
+    return specs, errors
+
+
+def read_specs_csv(file, defaults=None):
+    if isinstance(file, bytes):
+        file = file.decode("utf-8-sig")
+    if isinstance(file, str):
+        file = io.StringIO(file)
+    return rows_to_specs(csv.DictReader(file), defaults)
+
+
+def module_filename(index, spec, ext="pdf"):
+    topik = re.sub(r"[^\w\-]+", "_", spec["topik"]).strip("_") or "Modul"
+    return f"{index + 1:02d}_Modul_{topik}_Kelas{spec['kelas']}.{ext}"
+
+
+def run_batch(specs, model, workers=DEFAULT_WORKERS, rpm=DEFAULT_RPM, on_progress=None, use_cache=True,
+              user_email="batch"):
+    # Panggilan Gemini jalan paralel (maks `workers`, dibatasi `rpm` dan antrean se-deployment), PDF dikonversi di worker pool
+    # pdf_render. on_progress(index, status, detail) selalu dipanggil dari thread pemanggil.
+    report = on_progress or (lambda index, status, detail="": None)
+    limiter = RateLimiter(rpm)
+    batch_limits = admission.Limits(per_user=max(1, workers))
+    cache = module_cache.get_cache() if use_cache else None
+    results = {}  # index -> (status, nama file / pesan error)
+    zip_buffer = io.BytesIO()
+
+    def generate(spec):
+        key = module_cache.make_key(spec)
+        if cache is not None:
+            hit = cache.get(key)
+            if hit:
+                return hit[0], hit[1]
+        # Tiap baris ikut antrean bersama sesi lain, dengan jatah paralel sebanyak `workers`
+        usage = {}
+        try:
+            with admission.admitted(user_email, sections.ai_slot_count(spec), limits=batch_limits):
+                # Rate limiter dipakai per request Gemini (tiap bagian AI & retry-nya), bukan per modul;
+                # retry juga bayar token lagi ke bucket bersama
+                html = sections.generate_html(model, spec, usage=usage, checkpoint_key=key,
+                                              before_request=limiter.acquire,
+                                              on_retry=lambda: admission.take(limits=batch_limits))
+        finally:
+            # Baris yang gagal di tengah tetap sudah makan token Gemini
+            token_usage.record(user_email, key, usage)
+        if cache is not None:
+            cache.put(key, html)
+        return html, None
+
+    with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zf, \
+            ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="batch") as pool:
+        # future -> [(index, tahap, html)]; satu future PDF bisa dipakai beberapa baris kalau HTML-nya sama
+        pending = {}
+        for index, spec in enumerate(specs):
+            pending[pool.submit(generate, spec)] = [(index, "ai", None)]
+            report(index, "antre", "")
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future, index, stage, html in [(f, *entry) for f in done for entry in pending.pop(f)]:
+                spec = specs[index]
+                try:
+                    if stage == "ai":
+                        html, pdf = future.result()
+                        if pdf is not None:
+                            finished = Future()
+                            finished.set_result(pdf)
+                        else:
+                            finished = pdf_render.submit_pdf(html)
+                        pending.setdefault(finished, []).append((index, "pdf", html))
+                        report(index, "pdf", "Menyusun PDF")
+                        continue
+
+                    pdf = future.result()
+                    if pdf:
+                        name = module_filename(index, spec)
+                        zf.writestr(name, pdf)
+                        if cache is not None:
+                            cache.put_pdf(module_cache.make_key(spec), pdf)
+                    else:
+                        # PDF gagal, setidaknya HTML-nya tetap ikut di ZIP
+                        name = module_filename(index, spec, "html")
+                        zf.writestr(name, html)
+                    results[index] = ("selesai", name)
+                    report(index, "selesai", name)
+                except Exception as e:
+                    results[index] = ("gagal", str(e))
+                    report(index, "gagal", str(e))
+
+        summary = io.StringIO()
+        writer = csv.writer(summary)
+        writer.writerow(["no", "topik", "kelas", "metode", "status", "keterangan"])
+        for index, spec in enumerate(specs):
+            status, detail = results.get(index, ("gagal", ""))
+            writer.writerow([index + 1, spec["topik"], spec["kelas"], spec["metode"], status, detail])
+        zf.writestr("laporan.csv", summary.getvalue())
+
+    return zip_buffer.getvalue()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Buat banyak Modul Ajar sekaligus dari file CSV.")
+    parser.add_argument("csv_file", help=f"File CSV dengan kolom: {', '.join(CSV_COLUMNS)}")
+    parser.add_argument("-o", "--output", default="modul_batch.zip", help="File ZIP hasil (default: modul_batch.zip)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Jumlah panggilan Gemini paralel")
+    parser.add_argument("--rpm", type=float, default=DEFAULT_RPM, help="Batas request Gemini per menit (0 = tanpa batas)")
+    parser.add_argument("--penyusun", default="", help="Nama penyusun default untuk baris yang kosong")
+    parser.add_argument("--instansi", default="", help="Instansi default untuk baris yang kosong")
+    parser.add_argument("--no-cache", action="store_true", help="Selalu generate ulang, abaikan cache modul")
+    args = parser.parse_args(argv)
+
+    import clients
+
+    with open(args.csv_file, newline="", encoding="utf-8-sig") as f:
+        specs, errors = read_specs_csv(f, {"penyusun": args.penyusun, "instansi": args.instansi})
+    for no, message in errors:
+        print(f"[baris {no}] dilewati: {message}", file=sys.stderr)
+    if not specs:
+        print("Tidak ada baris yang bisa diproses.", file=sys.stderr)
+        return 1
+
+    def on_progress(index, status, detail=""):
+        print(f"[{index + 1}/{len(specs)}] {specs[index]['topik']}: {status} {detail}".rstrip())
+
+    # CLI cuma memanggil Gemini, jadi cukup GEMINI_API_KEY (Supabase & SESSION_SECRET gak dipakai di sini)
+    try:
+        model = clients.get_model()
+    except clients.MissingKeysError as e:
+        print(f"Kunci rahasia belum terbaca: {', '.join(e.keys)}. Isi di environment atau file .env.", file=sys.stderr)
+        return 2
+    zip_bytes = run_batch(specs, model, workers=args.workers, rpm=args.rpm,
+                          on_progress=on_progress, use_cache=not args.no_cache)
+    with open(args.output, "wb") as f:
+        f.write(zip_bytes)
+    print(f"Selesai: {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,241 @@
+import itertools
+import threading
+import time
+from datetime import datetime, timezone
+
+# --- PENGGANTI GEMINI & SUPABASE UNTUK BENCHMARK ---
+# Dipakai supaya jalur panas app bisa diukur tanpa kunci API/jaringan.
+# Latensi & ukuran chunk bisa diatur, jadi bisa meniru Gemini yang cepat maupun yang lagi lambat.
+
+SECTION_BLOCK = (
+    "<p><strong>{no}. Kegiatan {no}</strong></p>\n"
+    "<p>Guru membuka pelajaran dengan salam, mengecek kehadiran, lalu mengajak peserta didik "
+    "mengamati contoh teks dan mendiskusikan tujuan komunikatifnya bersama teman sebangku.</p>\n"
+    "<table>\n<tr><th>Langkah</th><th>Aktivitas Guru</th><th>Aktivitas Peserta Didik</th><th>Waktu</th></tr>\n"
+    + "".join(
+        f"<tr><td>{i}</td><td>Guru memberi contoh dan memandu diskusi kelas tahap {i}.</td>"
+        f"<td>Peserta didik bekerja berkelompok dan mempresentasikan hasilnya.</td><td>10 menit</td></tr>\n"
+        for i in range(1, 3)
+    )
+    + "</table>\n"
+    "<ul><li>Menyimak penjelasan guru.</li><li>Mencatat kosakata baru.</li><li>Menjawab pertanyaan pemantik.</li></ul>\n"
+)
+BLOCKS_PER_PAGE = 1.5  # kira-kira, untuk PDF_STYLE di pdf_backends.py (A4, Times 12pt)
+
+
+def sample_section_html(blocks, start=1):
+    return "".join(SECTION_BLOCK.format(no=no) for no in range(start, start + blocks))
+
+
+def sample_module_html(pages):
+    # Modul tiruan sepanjang ±`pages` halaman A4, strukturnya mirip keluaran sections.assemble()
+    body = sample_section_html(max(1, round(pages * BLOCKS_PER_PAGE) - 1))
+    return (
+        "<h2>MODUL AJAR: BENCHMARK</h2>\n<hr>\n<h3>I. INFORMASI UMUM</h3>\n"
+        "<table><tr><td>Penyusun</td><td>Guru Benchmark</td></tr><tr><td>Kelas</td><td>10</td></tr></table>\n"
+        f"<h3>II. KOMPONEN INTI</h3>\n{body}"
+        "<h3>III. LAMPIRAN</h3>\n<p><strong>DAFTAR PUSTAKA</strong></p>\n<p>Kemendikbudristek. (2022).</p>\n"
+    )
+
+
+CHARS_PER_TOKEN = 4  # perkiraan kasar tokenizer Gemini, cukup buat menguji pencatatan token
+
+
+def estimate_tokens(text):
+    return max(1, len(text) // CHARS_PER_TOKEN) if text else 0
+
+
+class FakeUsageMetadata:
+    def __init__(self, prompt_token_count, candidates_token_count, cached_content_token_count=0):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+        self.cached_content_token_count = cached_content_token_count
+        self.total_token_count = prompt_token_count + candidates_token_count
+
+
+class FakeChunk:
+    def __init__(self, text, usage_metadata=None):
+        self.text = text
+        self.usage_metadata = usage_metadata
+
+
+class FakeResponse(list):
+    # Mirip GenerateContentResponse: bisa di-iterasi per chunk, .text = gabungan semuanya
+    @property
+    def text(self):
+        return "".join(chunk.text for chunk in self)
+
+    @property
+    def usage_metadata(self):
+        return self[-1].usage_metadata if self else None
+
+
+class FakeGenerativeModel:
+    # Pengganti genai.GenerativeModel. Tiap panggilan menghasilkan `blocks` blok HTML berpagar ```html,
+    # dipotong per `chunk_size` karakter, dengan jeda `first_chunk_latency` sebelum chunk pertama
+    # dan `chunk_latency` antar chunk berikutnya. Chunk terakhir membawa usage_metadata seperti Gemini asli
+    # (token prompt = system_instruction + prompt, token jawaban = isi yang di-stream).
+    # `fail_after` = putuskan stream dengan ConnectionError setelah sekian chunk, buat meniru koneksi putus.
+    def __init__(self, blocks=2, chunk_size=64, first_chunk_latency=0.0, chunk_latency=0.0,
+                 fenced=True, sleep=time.sleep, system_instruction=None, fail_after=None):
+        self.blocks = blocks
+        self.chunk_size = chunk_size
+        self.first_chunk_latency = first_chunk_latency
+        self.chunk_latency = chunk_latency
+        self.fenced = fenced
+        self.sleep = sleep
+        self.system_instruction = system_instruction
+        self.fail_after = fail_after
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def body(self):
+        html = sample_section_html(self.blocks)
+        return f"```html\n{html}\n```" if self.fenced else html
+
+    def _stream(self, body, usage_metadata):
+        for no, start in enumerate(range(0, len(body), self.chunk_size)):
+            if self.fail_after is not None and no >= self.fail_after:
+                raise ConnectionError("stream tiruan diputus")
+            delay = self.first_chunk_latency if start == 0 else self.chunk_latency
+            if delay:
+                self.sleep(delay)
+            last = start + self.chunk_size >= len(body)
+            yield FakeChunk(body[start:start + self.chunk_size], usage_metadata if last else None)
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        with self._lock:
+            self.calls += 1
+        body = self.body()
+        usage_metadata = FakeUsageMetadata(
+            estimate_tokens(self.system_instruction) + estimate_tokens(prompt), estimate_tokens(body))
+        chunks = self._stream(body, usage_metadata)
+        return chunks if stream else FakeResponse(chunks)
+
+
+class FakeQueryResponse:
+    def __init__(self, data):
+        self.data = data
+
+
+class FakeQuery:
+    # Subset query builder postgrest yang dipakai app: select/insert/upsert/update/delete + filter dasar
+    def __init__(self, db, table):
+        self.db = db
+        self.table = table
+        self.op = "select"
+        self.columns = None
+        self.payload = None
+        self.options = {}
+        self.filters = []
+        self.ordering = []
+        self.row_limit = None
+
+    def select(self, *columns, **options):
+        self.op, self.options = "select", options
+        names = ",".join(columns) or "*"
+        self.columns = None if names.strip() == "*" else [c.strip() for c in names.split(",")]
+        return self
+
+    def insert(self, json, **options):
+        self.op, self.payload, self.options = "insert", json, options
+        return self
+
+    def upsert(self, json, **options):
+        self.op, self.payload, self.options = "upsert", json, options
+        return self
+
+    def update(self, json, **options):
+        self.op, self.payload, self.options = "update", json, options
+        return self
+
+    def delete(self, **options):
+        self.op, self.options = "delete", options
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def lt(self, column, value):
+        self.filters.append(lambda row: row.get(column) is not None and row[column] < value)
+        return self
+
+    def gt(self, column, value):
+        self.filters.append(lambda row: row.get(column) is not None and row[column] > value)
+        return self
+
+    def order(self, column, desc=False):
+        self.ordering.append((column, desc))
+        return self
+
+    def limit(self, size):
+        self.row_limit = size
+        return self
+
+    def _matches(self, row):
+        return all(f(row) for f in self.filters)
+
+    def _write(self, rows):
+        rows = rows if isinstance(rows, list) else [rows]
+        conflict = [c.strip() for c in self.options.get("on_conflict", "").split(",") if c.strip()]
+        written = []
+        for payload in rows:
+            existing = None
+            if self.op == "upsert" and conflict:
+                existing = next((row for row in self.db.rows(self.table)
+                                 if all(row.get(c) == payload.get(c) for c in conflict)), None)
+            if existing is not None:
+                if not self.options.get("ignore_duplicates"):
+                    existing.update(payload)
+                    written.append(dict(existing))
+                continue
+            row = {"id": next(self.db.ids), "created_at": datetime.now(timezone.utc).isoformat(), **payload}
+            self.db.rows(self.table).append(row)
+            written.append(dict(row))
+        return written
+
+    def execute(self):
+        if self.db.latency:
+            self.db.sleep(self.db.latency)
+        with self.db.lock:
+            self.db.calls += 1
+            table = self.db.rows(self.table)
+            if self.op == "select":
+                rows = [row for row in table if self._matches(row)]
+                for column, desc in reversed(self.ordering):
+                    rows.sort(key=lambda row: row.get(column), reverse=desc)
+                if self.row_limit is not None:
+                    rows = rows[:self.row_limit]
+                data = [dict(row) if self.columns is None else {c: row.get(c) for c in self.columns} for row in rows]
+            elif self.op in ("insert", "upsert"):
+                data = self._write(self.payload)
+            elif self.op == "update":
+                data = []
+                for row in table:
+                    if self._matches(row):
+                        row.update(self.payload)
+                        data.append(dict(row))
+            else:
+                data = [dict(row) for row in table if self._matches(row)]
+                table[:] = [row for row in table if not self._matches(row)]
+        if str(self.options.get("returning", "")).endswith("minimal"):
+            data = []
+        return FakeQueryResponse(data)
+
+
+class FakeSupabase:
+    # Pengganti supabase.Client, semua tabel disimpan di memori. `latency` = jeda per query (detik).
+    def __init__(self, tables=None, latency=0.0, sleep=time.sleep):
+        self.tables = {name: [dict(row) for row in rows] for name, rows in (tables or {}).items()}
+        self.latency = latency
+        self.sleep = sleep
+        self.calls = 0
+        self.ids = itertools.count(1)
+        self.lock = threading.RLock()
+
+    def rows(self, table):
+        return self.tables.setdefault(table, [])
+
+    def table(self, name):
+        return FakeQuery(self, name)
@@ -0,0 +1,340 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+# --- LOAD TEST SESI BERSAMAAN ---
+# N guru tiruan menjalankan alur asli app.py secara bersamaan di SATU proses (seperti satu instance
+# `streamlit run`): login lewat login_page, isi form, buat modul, lalu unduh PDF. Gemini & Supabase
+# diganti versi tiruan (benchmarks/fakes.py) yang dipasang langsung ke registry clients.py, jadi yang
+# diukur murni kapasitas app: antrean, thread streaming, worker PDF, cache & state bersama.
+#
+#   python -m benchmarks.loadtest                        # 1, 2, 4, 8 sesi bersamaan
+#   python -m benchmarks.loadtest --sessions 4 16 32 --first-chunk 1.5
+#   python -m benchmarks.loadtest --quota                # pakai batas GEMINI_RPM/BURST asli
+#
+# Tiap sesi memakai topik berbeda (gak kena cache modul). Yang dilaporkan per tingkat konkurensi:
+#   - throughput: modul selesai (sampai PDF) per menit,
+#   - TTFC: klik "Buat Modul" -> chunk Gemini pertama sampai ke app (termasuk waktu antre), p50/p95,
+#   - time-to-PDF: klik "Buat Modul" -> PDF dari tombol unduh selesai dibuat, p50/p95 (PDF baru dikonversi
+#     waktu tombol unduh diklik; klik itu ditiru dengan memanggil data tombol seperti server Streamlit),
+#   - memori: kenaikan RSS proses dibagi jumlah sesi yang masih hidup.
+# Catatan: sesi dijalankan dengan streamlit.testing AppTest (tanpa server websocket), jadi ongkos
+# serialisasi ke browser gak ikut terukur.
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_PATH = os.path.join(os.path.dirname(BENCH_DIR), "app.py")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+SESSIONS = (1, 2, 4, 8)
+PASSWORD = "rahasia"
+SESSION_TIMEOUT = 600  # detik per langkah AppTest
+PDF_CACHE_WAIT = 5  # detik; batas tunggu PDF tersimpan ke cache modul setelah unduhan selesai
+_deferred = {}  # file_id tombol unduh -> callable data-nya (dicatat lewat download_hook)
+_deferred_lock = threading.Lock()
+FAKE_KEYS = {"SUPABASE_URL": "https://loadtest.supabase.co", "SUPABASE_KEY": "loadtest", "GEMINI_API_KEY": "loadtest",
+             "SESSION_SECRET": "loadtest"}
+
+
+def rss_mb():
+    # RSS proses saat ini (Linux); di OS lain jatuh ke puncak RSS
+    try:
+        with open("/proc/self/status", "r", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, round(q * (len(ordered) - 1)))]
+
+
+def install_fakes(args):
+    # Harus jalan sebelum app.py pertama kali di-import: klien tiruan masuk registry, env kuota diset
+    if not args.quota:
+        os.environ["GEMINI_RPM"] = os.environ["GEMINI_BURST"] = "1000000"
+    os.environ.setdefault("MODUL_CERDAS_CACHE_DIR", tempfile.mkdtemp(prefix="modul_cerdas_load_"))
+    # Worker PDF (spawn) ikut menjalankan app.py sebagai __mp_main__ dan membaca kunci dari env
+    for key, value in FAKE_KEYS.items():
+        os.environ[key] = value
+
+    import clients
+    from benchmarks.fakes import FakeGenerativeModel, FakeSupabase
+    from modul_ajar import SYSTEM_INSTRUCTION
+
+    class TimedModel(FakeGenerativeModel):
+        # Catat kapan chunk pertama tiap sesi keluar; sesi dikenali dari topiknya yang unik
+        def __init__(self, **kwargs):
+            super().__init__(**kwargs)
+            self.first_chunk = {}
+
+        def generate_content(self, prompt, stream=False, **kwargs):
+            response = super().generate_content(prompt, stream=stream, **kwargs)
+            topik = next((line.split("Topik:")[1].split("|")[0].strip()
+                          for line in prompt.splitlines() if "Topik:" in line), "")
+            if not stream:
+                return response
+
+            def timed():
+                for chunk in response:
+                    with self._lock:
+                        self.first_chunk.setdefault(topik, time.perf_counter())
+                    yield chunk
+
+            return timed()
+
+    model = TimedModel(blocks=args.blocks, chunk_size=args.chunk_size, first_chunk_latency=args.first_chunk,
+                       chunk_latency=args.chunk_latency, system_instruction=SYSTEM_INSTRUCTION)
+    supabase = FakeSupabase(latency=args.supabase_latency)
+    clients._config = {**{k: "" for k in clients.REQUIRED_KEYS + clients.OPTIONAL_KEYS}, **FAKE_KEYS}
+    clients._supabase = supabase
+    clients._model = model
+    return model, supabase
+
+
+@contextmanager
+def download_hook():
+    # AppTest gak punya browser yang bisa mengklik tombol unduh dengan data callable; catat callable-nya
+    # waktu didaftarkan, lalu jalankan sendiri persis seperti MediaFileManager.execute_deferred.
+    # AppTest juga mengosongkan Runtime._instance tiap run selesai, padahal sesi lain (thread lain) masih
+    # jalan; runtime terakhir dipakai sebagai cadangan biar tombol sesi itu tetap terdaftar.
+    # Patch ke kelas Streamlit dikembalikan lagi waktu keluar, biar main() aman dipanggil dari proses lain.
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.media_file_manager import MediaFileManager
+
+    add_deferred = MediaFileManager.add_deferred
+    last = {}
+
+    def recording(self, data_callable, *args, **kwargs):
+        file_id = add_deferred(self, data_callable, *args, **kwargs)
+        with _deferred_lock:
+            _deferred[file_id] = data_callable
+        return file_id
+
+    def instance(cls):
+        current = cls._instance
+        if current is not None:
+            last["runtime"] = current
+            return current
+        if "runtime" in last:
+            return last["runtime"]
+        raise RuntimeError("Runtime hasn't been created!")
+
+    original = {"instance": Runtime.__dict__["instance"], "exists": Runtime.__dict__["exists"]}
+    MediaFileManager.add_deferred = recording
+    Runtime.instance = classmethod(instance)
+    Runtime.exists = classmethod(lambda cls: cls._instance is not None or "runtime" in last)
+    try:
+        yield
+    finally:
+        MediaFileManager.add_deferred = add_deferred
+        Runtime.instance = original["instance"]
+        Runtime.exists = original["exists"]
+        with _deferred_lock:
+            _deferred.clear()
+
+
+def download(at, label):
+    proto = next(el.proto for el in at.get("download_button") if label in getattr(el.proto, "label", ""))
+    if not proto.deferred_file_id:
+        raise RuntimeError("tombol unduh gak memakai data callable")
+    with _deferred_lock:
+        data_callable = _deferred.pop(proto.deferred_file_id)
+    return data_callable()
+
+
+def new_app():
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(APP_PATH, default_timeout=SESSION_TIMEOUT)
+    for key, value in FAKE_KEYS.items():
+        at.secrets[key] = value
+    return at
+
+
+def button(at, label):
+    return next(b for b in at.button if label in b.label)
+
+
+def run_session(no, tag, model, start_gate, out):
+    import module_cache
+    from modul_ajar import fase_for_kelas, ppp_for_metode
+
+    email = f"guru{tag}_{no}@loadtest.id"
+    topik = f"Loadtest {tag}-{no}"
+    result = {"sesi": no, "ok": False}
+    try:
+        at = new_app()
+        start_gate.wait()
+        start = time.perf_counter()
+        # 1. Login lewat form asli login_page
+        at.run()
+        at.text_input[0].input(email)
+        at.text_input[1].input(PASSWORD)
+        button(at, "Masuk").click().run()
+        if not at.session_state["logged_in"]:
+            raise RuntimeError("login gagal")
+        result["login_s"] = time.perf_counter() - start
+
+        # 2. Isi form
+        at.text_input(key="penyusun").input(f"Guru {no}")
+        at.text_input(key="instansi").input("SMA Loadtest")
+        at.selectbox(key="jenjang").set_value("SMA/MA").run()
+        at.selectbox(key="kelas").set_value(11)
+        at.text_input(key="topik").input(topik)
+
+        # 3. Generate; run() kembali setelah modul tampil & tombol unduh muncul
+        click = time.perf_counter()
+        button(at, "Buat Modul").click().run()
+        if at.exception or at.error:
+            raise RuntimeError("; ".join(str(e.value) for e in list(at.exception) + list(at.error)))
+        labels = [getattr(el.proto, "label", "") for el in at.get("download_button")]
+        if not any("PDF" in label for label in labels):
+            raise RuntimeError("tombol unduh PDF gak muncul")
+        result["modul_s"] = time.perf_counter() - click
+
+        # 4. Unduh: konversi PDF sudah mulai di background begitu modul jadi, klik cuma menunggu job itu.
+        #    App menyimpan PDF-nya ke cache modul dari callback job (bisa sesaat setelah unduhan selesai).
+        downloaded = download(at, "PDF")
+        done = time.perf_counter()
+        if not downloaded or not downloaded.startswith(b"%PDF"):
+            raise RuntimeError("PDF unduhan kosong")
+        spec = {field: at.session_state[field] for field in
+                ("penyusun", "instansi", "jenjang", "kelas", "topik", "semester", "alokasi", "elemen_pilih", "metode")}
+        spec["fase"] = fase_for_kelas(spec["kelas"])
+        spec["ppp_value"] = ppp_for_metode(spec["metode"])
+        deadline = time.time() + PDF_CACHE_WAIT
+        while True:
+            cached = module_cache.get_cache().get(module_cache.make_key(spec))
+            pdf = cached[1] if cached else None
+            if pdf or time.time() > deadline:
+                break
+            time.sleep(0.05)
+        if not pdf or not pdf.startswith(b"%PDF"):
+            raise RuntimeError("PDF kosong")
+
+        first = model.first_chunk.get(topik)
+        result.update(ok=True, ttfc_s=(first - click) if first else None, pdf_s=done - click,
+                      total_s=time.perf_counter() - start, pdf_kb=round(len(pdf) / 1024, 1))
+        result["app"] = at  # ditahan sampai memori tingkat ini diukur
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    out[no] = result
+
+
+def run_level(level, model, supabase, tag):
+    # Satu tingkat konkurensi: `level` sesi mulai bersamaan, tunggu semua selesai.
+    # `tag` bikin email & topik unik per putaran, jadi gak ada yang kena cache modul putaran sebelumnya.
+    supabase.rows("users").extend({"email": f"guru{tag}_{no}@loadtest.id", "password": PASSWORD}
+                                  for no in range(level))
+    out = {}
+    gate = threading.Barrier(level + 1)
+    threads = [threading.Thread(target=run_session, args=(no, tag, model, gate, out), name=f"sesi-{no}")
+               for no in range(level)]
+    for thread in threads:
+        thread.start()
+    rss_before = rss_mb()
+    gate.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+    rss_after = rss_mb()
+
+    sessions = [out[no] for no in sorted(out)]
+    ok = [s for s in sessions if s["ok"]]
+    ttfc = [s["ttfc_s"] for s in ok if s.get("ttfc_s") is not None]
+    to_pdf = [s["pdf_s"] for s in ok]
+    summary = {
+        "sesi": level,
+        "berhasil": len(ok),
+        "gagal": [s["error"] for s in sessions if not s["ok"]],
+        "wall_s": wall,
+        "modul_per_menit": len(ok) / wall * 60 if wall else None,
+        "ttfc_p50_s": percentile(ttfc, 0.5),
+        "ttfc_p95_s": percentile(ttfc, 0.95),
+        "pdf_p50_s": percentile(to_pdf, 0.5),
+        "pdf_p95_s": percentile(to_pdf, 0.95),
+        "login_p95_s": percentile([s["login_s"] for s in ok], 0.95),
+        "memori_per_sesi_mb": max(0.0, rss_after - rss_before) / level,
+        "rss_mb": rss_after,
+    }
+    for s in sessions:
+        s.pop("app", None)
+    return summary
+
+
+def _fmt(value, scale=1.0, digits=2):
+    return "-" if value is None else f"{value * scale:.{digits}f}"
+
+
+def run_levels(args, model, supabase):
+    # Pemanasan: import app.py, klien tiruan dari registry clients.py, worker PDF, font; gak ikut diukur
+    run_level(1, model, supabase, "pemanasan")
+
+    print(f"{'sesi':>5} {'ok':>4} {'modul/mnt':>10} {'ttfc p50':>9} {'ttfc p95':>9} "
+          f"{'pdf p50':>9} {'pdf p95':>9} {'MB/sesi':>8}")
+    levels = []
+    for round_no, level in enumerate(args.sessions):
+        summary = run_level(level, model, supabase, f"r{round_no}")
+        levels.append(summary)
+        print(f"{level:>5} {summary['berhasil']:>4} {_fmt(summary['modul_per_menit'], digits=1):>10} "
+              f"{_fmt(summary['ttfc_p50_s']):>8}s {_fmt(summary['ttfc_p95_s']):>8}s "
+              f"{_fmt(summary['pdf_p50_s']):>8}s {_fmt(summary['pdf_p95_s']):>8}s "
+              f"{_fmt(summary['memori_per_sesi_mb'], digits=1):>8}", flush=True)
+        for error in summary["gagal"][:3]:
+            print(f"      gagal: {error}")
+    return levels
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test sesi bersamaan Modul Cerdas (Gemini & Supabase tiruan).")
+    parser.add_argument("--sessions", type=int, nargs="+", default=list(SESSIONS), help="Tingkat konkurensi")
+    parser.add_argument("--first-chunk", type=float, default=0.8, help="Jeda Gemini tiruan sebelum chunk pertama (detik)")
+    parser.add_argument("--chunk-latency", type=float, default=0.02, help="Jeda antar chunk (detik)")
+    parser.add_argument("--chunk-size", type=int, default=64)
+    parser.add_argument("--blocks", type=int, default=2, help="Blok HTML per slot AI (panjang modul)")
+    parser.add_argument("--supabase-latency", type=float, default=0.02, help="Jeda per query Supabase (detik)")
+    parser.add_argument("--quota", action="store_true", help="Pakai batas kuota Gemini dari env (default: tanpa batas)")
+    args = parser.parse_args(argv)
+
+    model, supabase = install_fakes(args)
+    import streamlit.logger
+    from streamlit import config
+
+    # Tiap AppTest.run meng-compile app.py lagi; "magic" Streamlit (gak dipakai app.py) memakai ast.parse,
+    # yang kalau jalan paralel dari banyak thread kadang bikin CPython 3.11 error (SystemError AST)
+    magic = config.get_option("runner.magicEnabled")
+    config.set_option("runner.magicEnabled", False)
+    streamlit.logger.get_logger("streamlit").setLevel("ERROR")
+    try:
+        with download_hook():
+            levels = run_levels(args, model, supabase)
+    finally:
+        config.set_option("runner.magicEnabled", magic)
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, "loadtest.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "args": vars(args), "levels": levels},
+                  f, indent=2, sort_keys=True)
+        f.write("\n")
+    print(f"\nHasil lengkap: {path}")
+    return 1 if any(summary["gagal"] for summary in levels) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
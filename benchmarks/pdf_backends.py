@@ -0,0 +1,72 @@
+import argparse
+import os
+import re
+import statistics
+import sys
+import time
+import tracemalloc
+
+# --- PERBANDINGAN BACKEND PDF ---
+# Render modul tiruan 5-50 halaman dengan tiap backend di pdf_backends.py, lalu bandingkan
+# waktu (median), puncak memori Python, jumlah halaman & ukuran PDF-nya.
+#
+#   python -m benchmarks.pdf_backends
+#   python -m benchmarks.pdf_backends --pages 10 50 --repeat 5
+#
+# Memori diukur di putaran terpisah (tracemalloc memperlambat render), jadi angka waktunya tetap bersih.
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import pdf_backends  # noqa: E402
+from benchmarks.fakes import sample_module_html  # noqa: E402
+
+PDF_PAGES = (5, 10, 25, 50)
+DEFAULT_REPEAT = 3
+
+
+def page_count(pdf):
+    return len(re.findall(rb"/Type\s*/Page\b", pdf or b""))
+
+
+def compare_backend(backend, html, repeat):
+    backend.render(html)  # pemanasan: import modul, font, cache gaya
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        backend.render(html)
+        runs.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        pdf = backend.render(html)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "median_s": statistics.median(runs),
+        "peak_mb": peak / 2 ** 20,
+        "pdf_pages": page_count(pdf),
+        "pdf_kb": len(pdf or b"") / 1024,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bandingkan backend PDF Modul Cerdas.")
+    parser.add_argument("--backends", nargs="+", default=list(pdf_backends.BACKENDS))
+    parser.add_argument("--pages", type=int, nargs="+", default=list(PDF_PAGES))
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    args = parser.parse_args(argv)
+
+    print(f"{'backend':<10} {'target':>6} {'median':>10} {'memori':>10} {'halaman':>8} {'ukuran':>9}")
+    for pages in args.pages:
+        html = sample_module_html(pages)
+        for name in args.backends:
+            result = compare_backend(pdf_backends.get_backend(name), html, args.repeat)
+            print(f"{name:<10} {pages:>5}p {result['median_s'] * 1000:>8.0f}ms {result['peak_mb']:>8.1f}MB "
+                  f"{result['pdf_pages']:>8} {result['pdf_kb']:>7.0f}KB", flush=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,384 @@
+import argparse
+import gc
+import itertools
+import json
+import os
+import platform
+import re
+import statistics
+import sys
+import tempfile
+import time
+
+# --- BENCHMARK JALUR PANAS (OFFLINE) ---
+# Mengukur bagian app yang paling sering jalan tanpa kunci API: render streaming, buang pagar ```,
+# konversi PDF (5-50 halaman), lookup CP & penyusunan prompt, serta riwayat modul di Supabase tiruan.
+#
+#   python -m benchmarks.run                   # jalankan semua, bandingkan dengan baseline.json
+#   python -m benchmarks.run --only pdf        # cuma kasus yang namanya mengandung "pdf"
+#   python -m benchmarks.run --save-baseline   # jadikan hasil ini patokan baru
+#
+# Hasil ditulis ke benchmarks/results/ (latest.json + history.jsonl).
+#
+# Angka absolut beda-beda antar mesin & antar run (CPU lain, turbo/throttling VM, proses lain), jadi gate
+# regresi gak membandingkan milidetik mentah. Tiap putaran kasus diapit kerja "calibration" (CPU Python murni
+# yang gak tergantung kode app), lalu dihitung rasionya terhadap calibration terdekat:
+#   rel = median(waktu putaran / waktu calibration tepat sebelum/sesudahnya)
+# Karena diukur berdampingan, mesin yang lagi lambat memperlambat keduanya dan rasionya tetap. Yang
+# dibandingkan dengan baseline adalah `rel`, jadi baseline.json bisa dipakai di mesin lain. Kasus yang
+# waktunya didominasi jeda tiruan (stream_sections) gak ikut kecepatan CPU, jadi tetap dibandingkan dalam
+# detik (median). Kalau rel suatu kasus naik melebihi toleransi, perintah keluar dengan kode 1.
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+# Cache/SQLite benchmark dipisah dari punya app, dan harus diset sebelum modul app di-import
+os.environ.setdefault("MODUL_CERDAS_CACHE_DIR", tempfile.mkdtemp(prefix="modul_cerdas_bench_"))
+
+import cp_catalog  # noqa: E402
+import history  # noqa: E402
+import pdf_render  # noqa: E402
+import sections  # noqa: E402
+from benchmarks.fakes import FakeGenerativeModel, FakeSupabase, sample_module_html  # noqa: E402
+from modul_ajar import ELEMEN_CP, METODE, SYSTEM_INSTRUCTION, make_spec  # noqa: E402
+from stream_render import FenceStripper, StreamRenderer  # noqa: E402
+
+BASELINE_PATH = os.path.join(BENCH_DIR, "baseline.json")
+CALIBRATION = "calibration"
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+PDF_PAGES = (5, 10, 25, 50)
+DEFAULT_REPEAT = 9
+TOLERANCE = 0.25  # rel >25% di atas baseline = regresi
+MIN_DELTA = 0.002  # detik; selisih sekecil ini dianggap noise
+CHUNK_SIZE = 64
+
+
+class NullContainer:
+    # Pengganti st.container() untuk StreamRenderer: cuma menghitung apa yang dikirim ke browser
+    def __init__(self):
+        self.pushes = 0
+        self.bytes_sent = 0
+
+    def empty(self):
+        return self
+
+    def markdown(self, text, unsafe_allow_html=False):
+        self.pushes += 1
+        self.bytes_sent += len(text)
+
+
+def chunked(text, size=CHUNK_SIZE):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+class Runs(list):
+    # Waktu tiap putaran (detik) + rasio tiap putaran terhadap calibration di sebelahnya
+    ratios = ()
+
+
+def _calibration_seconds():
+    start = time.perf_counter()
+    calibration_work(_calibration_text())
+    return time.perf_counter() - start
+
+
+def measure(fn, repeat, warmup=1, calibrate=True):
+    # Seperti timeit: GC dimatikan selama pengukuran, biar sampah dari kasus sebelumnya (heap xhtml2pdf
+    # yang besar) gak ikut tertagih ke putaran berikutnya secara acak
+    for _ in range(warmup):
+        fn()
+    runs = Runs()
+    ratios = []
+    gc.collect()
+    gc.disable()
+    try:
+        previous = _calibration_seconds() if calibrate else None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            runs.append(time.perf_counter() - start)
+            if calibrate:
+                current = _calibration_seconds()
+                ratios.append(runs[-1] / min(previous, current))
+                previous = current
+    finally:
+        gc.enable()
+    runs.ratios = ratios
+    return runs
+
+
+def summarize(runs, **extra):
+    ordered = sorted(runs)
+    ratios = getattr(runs, "ratios", ())
+    return {
+        "median_s": statistics.median(ordered),
+        "p95_s": ordered[min(len(ordered) - 1, round(0.95 * (len(ordered) - 1)))],
+        "min_s": ordered[0],
+        "runs": len(ordered),
+        # Tanpa calibration (kasus wall-clock), rel = median detik apa adanya
+        "rel": statistics.median(ratios) if ratios else statistics.median(ordered),
+        **extra,
+    }
+
+
+def calibration_work(text):
+    # Patokan kecepatan mesin: regex, JSON & sort di Python murni, mirip campuran kerja jalur panas app
+    total = 0
+    for _ in range(4):
+        total += sum(1 for _ in re.finditer(r"<([a-z0-9]+)[^>]*>", text))
+        data = json.loads(json.dumps({"i": list(range(3000)), "t": text}))
+        total += sorted(data["i"], key=lambda v: -v)[0]
+    return total
+
+
+_calibration_texts = []
+
+
+def _calibration_text():
+    if not _calibration_texts:
+        _calibration_texts.append(sample_module_html(5))
+    return _calibration_texts[0]
+
+
+def case_calibration(repeat):
+    # Cuma dicatat buat info (kecepatan mesin saat run), gak ikut gate
+    text = _calibration_text()
+    return summarize(measure(lambda: calibration_work(text), repeat, calibrate=False))
+
+
+def bench_spec():
+    # Fase F + elemen yang ada di katalog, jadi plan_sections gak perlu klaim/generate CP
+    return make_spec("Guru Benchmark", "SMA Benchmark", "SMA/MA", 11, "Narrative Text", METODE[0], ELEMEN_CP[0])
+
+
+def case_fence_strip(repeat):
+    chunks = chunked(f"```html\n{sample_module_html(50)}\n```")
+
+    def run():
+        stripper = FenceStripper()
+        for chunk in chunks:
+            stripper.feed(chunk)
+        stripper.flush()
+
+    return summarize(measure(run, repeat), chunks=len(chunks))
+
+
+def case_stream_render(repeat):
+    chunks = chunked(f"```html\n{sample_module_html(50)}\n```")
+    container = NullContainer()
+
+    def run():
+        container.pushes = container.bytes_sent = 0
+        renderer = StreamRenderer(container)
+        for chunk in chunks:
+            renderer.write(chunk)
+        renderer.finish()
+
+    runs = measure(run, repeat)
+    return summarize(runs, chunks=len(chunks), pushes=container.pushes, bytes_sent=container.bytes_sent)
+
+
+def case_stream_sections(repeat):
+    # Semua slot AI paralel dengan Gemini tiruan yang punya jeda; yang diukur overhead antrean/thread
+    model = FakeGenerativeModel(blocks=2, chunk_size=CHUNK_SIZE, first_chunk_latency=0.05, chunk_latency=0.001,
+                                system_instruction=SYSTEM_INSTRUCTION)
+    parts = sections.plan_sections(bench_spec())
+    first_chunk = []
+    usage = {}
+
+    def run():
+        usage.clear()
+        start = time.perf_counter()
+        seen_first = False
+        for _, text in sections.stream_sections(model, parts, usage=usage):
+            if text is not None and not seen_first:
+                first_chunk.append(time.perf_counter() - start)
+                seen_first = True
+
+    # Didominasi jeda Gemini tiruan (sleep), bukan CPU: dibandingkan dalam detik, tanpa calibration
+    runs = measure(run, repeat, calibrate=False)
+    # Token per modul (perkiraan dari model tiruan), buat memantau ukuran prompt antar perubahan
+    return summarize(runs, ttfc_median_s=statistics.median(first_chunk[-repeat:]),
+                     prompt_tokens=sum(c["prompt"] for c in usage.values()),
+                     completion_tokens=sum(c["completion"] for c in usage.values()))
+
+
+def case_cp_lookup(repeat):
+    keys = list(cp_catalog.CATALOG)
+
+    def run():
+        for _ in range(1000):
+            for fase, elemen in keys:
+                cp_catalog.get_cp_text(fase, elemen)
+
+    return summarize(measure(run, repeat), lookups=1000 * len(keys))
+
+
+def case_prompt_assembly(repeat):
+    spec = bench_spec()
+
+    def run():
+        for _ in range(100):
+            sections.plan_sections(spec)
+
+    return summarize(measure(run, repeat), plans=100)
+
+
+def case_pdf_convert(pages, repeat):
+    html = sample_module_html(pages)
+    pdf = []
+
+    def run():
+        pdf.append(pdf_render.convert_html_to_pdf(html))
+
+    runs = measure(run, repeat)
+    page_count = len(re.findall(rb"/Type\s*/Page\b", pdf[-1] or b""))
+    return summarize(runs, html_kb=round(len(html) / 1024, 1), pdf_pages=page_count)
+
+
+def case_history_roundtrip(repeat):
+    spec = bench_spec()
+    html = sample_module_html(10)
+    pdf = b"%PDF-1.4 benchmark" * 2000
+
+    runs = itertools.count()
+
+    def run():
+        # Akun & PDF baru tiap putaran: Supabase tiruannya juga baru, jadi catatan "sudah tersimpan"
+        # dari putaran sebelumnya gak boleh bikin simpanannya dilewati
+        supabase = FakeSupabase()
+        no_run = next(runs)
+        email = f"guru{no_run}@benchmark.id"
+        for no in range(20):
+            history.save_module(supabase, email, {**spec, "topik": f"Topik {no}"}, html, pdf + str(no_run).encode())
+        cursor, rows = None, []
+        while True:
+            page, cursor = history.list_modules(supabase, email, cursor=cursor)
+            rows += page
+            if cursor is None:
+                break
+        history.load_html(supabase, email, rows[0]["id"])
+        history.load_pdf(supabase, rows[0]["pdf_hash"])
+
+    return summarize(measure(run, repeat), compressed_ratio=round(len(html) / len(history.compress_html(html)), 1))
+
+
+def case_history_resave(repeat):
+    # Modul dari cache yang dibuka ulang: riwayatnya sudah tersimpan, jadi gak ada yang dikirim lagi
+    spec = bench_spec()
+    html = sample_module_html(10)
+    pdf = b"%PDF-1.4 benchmark" * 2000
+    supabase = FakeSupabase()
+    specs = [{**spec, "topik": f"Topik {no}"} for no in range(20)]
+    for item in specs:
+        history.save_module(supabase, "guru@benchmark.id", item, html, pdf)
+
+    def run():
+        for item in specs:
+            if history.save_module_later(supabase, "guru@benchmark.id", item, html, pdf) is not None:
+                raise RuntimeError("riwayat yang sama tersimpan ulang")
+
+    return summarize(measure(run, repeat), saves=len(specs))
+
+
+def cases(pdf_pages):
+    yield "fence_strip", case_fence_strip
+    yield "stream_render", case_stream_render
+    yield "stream_sections", case_stream_sections
+    yield "cp_lookup", case_cp_lookup
+    yield "prompt_assembly", case_prompt_assembly
+    for pages in pdf_pages:
+        yield f"pdf_convert_{pages}p", lambda repeat, pages=pages: case_pdf_convert(pages, repeat)
+    yield "history_roundtrip", case_history_roundtrip
+    yield "history_resave", case_history_resave
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    # Hasil: daftar (nama, rel sekarang, rel baseline, rasio, regresi?)
+    rows = []
+    for name, result in results.items():
+        if name == CALIBRATION:
+            continue
+        base = baseline.get(name)
+        if not base or not base.get("rel"):
+            rows.append((name, result["rel"], None, None, False))
+            continue
+        ratio = result["rel"] / base["rel"]
+        # Selisih absolut sekecil MIN_DELTA tetap dianggap noise (kasus yang cuma beberapa milidetik)
+        regressed = ratio > 1 + tolerance and result["median_s"] * (1 - 1 / ratio) > MIN_DELTA
+        rows.append((name, result["rel"], base["rel"], ratio, regressed))
+    return rows
+
+
+def _load_json(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_json(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark offline jalur panas Modul Cerdas.")
+    parser.add_argument("--only", help="Jalankan kasus yang namanya mengandung teks ini saja")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--pdf-pages", type=int, nargs="+", default=list(PDF_PAGES))
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("--save-baseline", action="store_true", help="Simpan hasil ini sebagai baseline baru")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name, case in cases(args.pdf_pages):
+        if args.only and args.only not in name:
+            continue
+        results[name] = case(args.repeat)
+        print(f"{name:<22} median {results[name]['median_s'] * 1000:9.2f} ms  "
+              f"min {results[name]['min_s'] * 1000:9.2f} ms  rel {results[name]['rel']:.3f}", flush=True)
+    results[CALIBRATION] = case_calibration(args.repeat)
+
+    record = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "machine": platform.platform(),
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    _write_json(os.path.join(RESULTS_DIR, "latest.json"), record)
+    with open(os.path.join(RESULTS_DIR, "history.jsonl"), "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, sort_keys=True) + "\n")
+
+    if args.save_baseline:
+        baseline = _load_json(args.baseline) or {"results": {}}
+        baseline["meta"] = record["meta"]
+        baseline["results"].update(results)
+        _write_json(args.baseline, baseline)
+        print(f"Baseline disimpan ke {args.baseline}")
+        return 0
+
+    baseline = _load_json(args.baseline)
+    if baseline is None:
+        print("Belum ada baseline; jalankan dengan --save-baseline dulu.")
+        return 0
+    regressions = 0
+    print(f"\nDibanding baseline ({baseline['meta'].get('timestamp', '?')}, relatif ke calibration, "
+          f"toleransi {args.tolerance:.0%}):")
+    for name, now, base, ratio, regressed in compare(results, baseline["results"], args.tolerance):
+        if base is None:
+            print(f"  {name:<22} baru (belum ada di baseline)")
+            continue
+        flag = "REGRESI" if regressed else "ok"
+        print(f"  {name:<22} rel {now:9.3f} vs {base:9.3f}  x{ratio:.2f}  {flag}")
+        regressions += regressed
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+import time
+
+import metrics
+from storage import connect_sqlite
+from stream_render import FenceStripper, completed_cut
+
+# --- CHECKPOINT STREAMING PER BAGIAN ---
+# Output tiap slot AI disimpan ke state bersama setiap kali satu bagian selesai (batas <h3>/<p><strong>,
+# sama dengan yang dipakai StreamRenderer), dikunci (module_key, slot). Kalau stream putus di tengah
+# (error Gemini, browser ditutup, replika restart), percobaan berikutnya untuk modul yang sama:
+#   - slot yang sudah lengkap langsung dipakai ulang tanpa panggil Gemini,
+#   - slot yang baru sebagian cuma minta Gemini melanjutkan dari bagian utuh terakhir.
+# Checkpoint dihapus setelah modulnya selesai & tersimpan di cache.
+
+DB_NAME = "checkpoints.sqlite3"
+CHECKPOINT_TTL = 24 * 60 * 60  # detik; checkpoint modul yang gak pernah dilanjutkan dibuang
+
+with connect_sqlite(DB_NAME) as _conn:
+    _conn.execute("""
+        CREATE TABLE IF NOT EXISTS checkpoints (
+            module_key TEXT NOT NULL,
+            slot TEXT NOT NULL,
+            text TEXT NOT NULL,
+            complete INTEGER NOT NULL,
+            updated REAL NOT NULL,
+            PRIMARY KEY (module_key, slot)
+        )""")
+
+
+def load(module_key):
+    # Hasil: nama slot -> (teks HTML yang sudah utuh, slot sudah lengkap?)
+    with connect_sqlite(DB_NAME) as conn:
+        rows = conn.execute(
+            "SELECT slot, text, complete FROM checkpoints WHERE module_key = ? AND updated >= ?",
+            (module_key, time.time() - CHECKPOINT_TTL),
+        ).fetchall()
+    return {slot: (text, bool(complete)) for slot, text, complete in rows}
+
+
+def save(module_key, slot, text, complete=False):
+    # Checkpoint yang sudah lengkap gak ditimpa (misal oleh stream lama yang masih jalan di background)
+    with connect_sqlite(DB_NAME) as conn:
+        conn.execute(
+            "INSERT INTO checkpoints (module_key, slot, text, complete, updated) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(module_key, slot) DO UPDATE SET text = excluded.text, complete = excluded.complete, "
+            "updated = excluded.updated WHERE checkpoints.complete = 0",
+            (module_key, slot, text, int(complete), time.time()),
+        )
+
+
+def clear(module_key):
+    with connect_sqlite(DB_NAME) as conn:
+        conn.execute("DELETE FROM checkpoints WHERE module_key = ?", (module_key,))
+        conn.execute("DELETE FROM checkpoints WHERE updated < ?", (time.time() - CHECKPOINT_TTL,))
+
+
+class SlotCheckpoint:
+    # Dipasang di samping stream satu slot: terima chunk mentah dari Gemini, simpan tiap ada bagian baru yang utuh.
+    # `done` = teks yang sudah tersimpan dari percobaan sebelumnya (stream ini melanjutkannya).
+    def __init__(self, module_key, slot, done=""):
+        self.module_key = module_key
+        self.slot = slot
+        self._stripper = FenceStripper()
+        self._text = done
+        self._saved = len(done)
+
+    def feed(self, chunk_text):
+        self._text += self._stripper.feed(chunk_text)
+        cut = completed_cut(self._text, self._saved + 1)
+        if cut > self._saved and not self._text[:cut].strip():
+            self._saved = cut  # baru whitespace pembuka (misal "\n" sebelum <h3> pertama), gak usah disimpan
+        elif cut > self._saved:
+            save(self.module_key, self.slot, self._text[:cut])
+            self._saved = cut
+            metrics.incr("checkpoint_saved")
+
+    def finish(self):
+        self._text += self._stripper.flush()
+        save(self.module_key, self.slot, self._text, complete=True)
+        return self._text
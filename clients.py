@@ -0,0 +1,154 @@
+import os
+import threading
+import time
+
+import google.generativeai as genai
+from dotenv import load_dotenv
+from supabase import ClientOptions, create_client, Client
+
+import metrics
+import session_token
+from modul_ajar import SYSTEM_INSTRUCTION
+
+# --- REGISTRY KLIEN (SUPABASE & GEMINI) ---
+# Klien dibuat sekali per proses lalu dipakai bareng semua sesi.
+# Supabase (httpx) dan Gemini (gRPC) sama-sama menyimpan pool koneksi di dalam objek kliennya,
+# jadi selama objeknya dipakai ulang, koneksi juga ikut dipakai ulang.
+
+GEMINI_MODEL_NAME = "gemini-2.5-flash"
+SUPABASE_TIMEOUT = 10  # detik per query
+GEMINI_TIMEOUT = 120  # detik per request (termasuk streaming sampai selesai)
+HEALTH_CHECK_INTERVAL = 60  # detik
+# SESSION_SECRET wajib & harus rahasia: siapa pun yang tahu nilainya bisa membuat token login untuk email apa saja
+REQUIRED_KEYS = ("SUPABASE_URL", "SUPABASE_KEY", "GEMINI_API_KEY", "SESSION_SECRET")
+OPTIONAL_KEYS = ("ADMIN_EMAILS", "METRICS_PORT", "METRICS_HOST")  # ADMIN_EMAILS dipisah koma
+# Kunci yang benar-benar dibutuhkan tiap klien, biar pemakai yang cuma butuh satu klien (misal CLI batch
+# yang cuma pakai Gemini) gak dipaksa mengisi semua REQUIRED_KEYS. App web tetap mengecek semuanya.
+CLIENT_KEYS = {
+    "supabase": ("SUPABASE_URL", "SUPABASE_KEY"),
+    "gemini": ("GEMINI_API_KEY",),
+    "session": ("SESSION_SECRET",),
+}
+
+_lock = threading.RLock()
+_config = None
+_supabase = None
+_model = None
+_health = {}  # nama klien -> (waktu cek, status ok, pesan)
+
+
+class MissingKeysError(Exception):
+    def __init__(self, keys):
+        self.keys = list(keys)
+        super().__init__(f"Kunci rahasia belum terbaca: {', '.join(self.keys)}")
+
+
+def _read_config(secrets):
+    # Prioritas: Streamlit Secrets > Environment Variable (.env di laptop lokal)
+    if secrets:
+        # Hapus tanda kutip ganda jika user tidak sengaja memasukkannya di dalam string
+        return {k: str(secrets.get(k, "")).replace('"', '').strip() for k in REQUIRED_KEYS + OPTIONAL_KEYS}
+    load_dotenv()
+    return {k: os.getenv(k, "").strip() for k in REQUIRED_KEYS + OPTIONAL_KEYS}
+
+
+def load_config(secrets=None, required=REQUIRED_KEYS):
+    # `required` = kunci yang wajib ada untuk pemanggil ini. Config baru dimemo kalau semua REQUIRED_KEYS
+    # sudah lengkap; selama belum, tiap panggilan membaca ulang (secrets yang dibetulkan langsung terpakai).
+    global _config
+    if _config is not None:
+        return _config
+    with _lock:
+        if _config is not None:
+            return _config
+        config = _read_config(secrets)
+        missing_keys = [k for k in required if not config[k]]
+        if missing_keys:
+            raise MissingKeysError(missing_keys)
+        if all(config[k] for k in REQUIRED_KEYS):
+            _config = config
+        return config
+
+
+def get_supabase(secrets=None) -> Client:
+    global _supabase
+    if _supabase is not None:
+        return _supabase
+    with _lock:
+        if _supabase is None:
+            config = load_config(secrets, CLIENT_KEYS["supabase"])
+            with metrics.timer("client_init", client="supabase"):
+                _supabase = create_client(config["SUPABASE_URL"], config["SUPABASE_KEY"],
+                                          options=ClientOptions(postgrest_client_timeout=SUPABASE_TIMEOUT))
+        return _supabase
+
+
+def get_model(secrets=None):
+    global _model
+    if _model is not None:
+        return _model
+    with _lock:
+        if _model is None:
+            config = load_config(secrets, CLIENT_KEYS["gemini"])
+            with metrics.timer("client_init", client="gemini"):
+                genai.configure(api_key=config["GEMINI_API_KEY"])
+                # Aturan format yang sama untuk semua request dipasang sekali di model, bukan dikirim ulang di tiap prompt
+                _model = genai.GenerativeModel(GEMINI_MODEL_NAME, system_instruction=SYSTEM_INSTRUCTION)
+        return _model
+
+
+def admin_emails():
+    return {e.strip().lower() for e in (_config or {}).get("ADMIN_EMAILS", "").split(",") if e.strip()}
+
+
+def session_secret():
+    # Kunci token sesi harus sama di semua replika; ganti SESSION_SECRET = semua sesi ter-logout
+    return session_token.derive_secret(load_config(required=CLIENT_KEYS["session"])["SESSION_SECRET"])
+
+
+def reset(name=None):
+    # Buang klien yang rusak, nanti dibuat ulang saat dipanggil lagi
+    global _supabase, _model, _config
+    with _lock:
+        if name in (None, "supabase"):
+            _supabase = None
+        if name in (None, "gemini"):
+            _model = None
+        if name is None:
+            _config = None
+            _health.clear()
+        else:
+            _health.pop(name, None)
+
+
+def _ping_supabase():
+    get_supabase().table('users').select("email").limit(1).execute()
+
+
+def _ping_gemini():
+    get_model()
+    genai.get_model(f"models/{GEMINI_MODEL_NAME}")
+
+
+_PINGS = {"supabase": _ping_supabase, "gemini": _ping_gemini}
+
+
+def health_check(force=False):
+    # Hasil cek disimpan sebentar biar gak nge-ping backend tiap rerun.
+    # Klien yang gagal di-ping langsung di-reset supaya panggilan berikutnya bikin koneksi baru.
+    now = time.time()
+    result = {}
+    for name, ping in _PINGS.items():
+        cached = _health.get(name)
+        if cached and not force and now - cached[0] < HEALTH_CHECK_INTERVAL:
+            result[name] = cached[1:]
+            continue
+        try:
+            ping()
+            status = (True, "OK")
+        except Exception as e:
+            reset(name)
+            status = (False, str(e))
+        _health[name] = (now,) + status
+        result[name] = status
+    return result
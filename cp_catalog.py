@@ -0,0 +1,194 @@
+import json
+import os
+import re
+import threading
+import time
+
+import metrics
+from storage import BASE_DIR, connect_sqlite
+
+# --- KATALOG CAPAIAN PEMBELAJARAN (CP) ---
+# CP resmi dibaca sekali dari data/cp_bahasa_inggris.json saat modul ini di-import,
+# lalu dicari pakai (fase, elemen). CP yang belum ada di katalog dibuatkan Gemini SEKALI,
+# disimpan di SQLite, dan dipakai ulang oleh semua sesi/proses berikutnya.
+#
+# Supaya gak dobel generate waktu dua guru minta CP yang sama bersamaan, yang pertama
+# "mengklaim" pasangan (fase, elemen) dulu. Yang lain menunggu hasilnya selama klaim itu masih hidup.
+# Selama dipegang, klaim diperbarui tiap HEARTBEAT detik oleh thread kecil di proses pemegangnya
+# (termasuk selama antre di admission.py yang bisa lebih lama dari CLAIM_TTL). Klaim yang berhenti
+# diperbarui (prosesnya mati) basi setelah CLAIM_TTL dan boleh diambil alih.
+
+CATALOG_PATH = os.path.join(BASE_DIR, "data", "cp_bahasa_inggris.json")
+DB_NAME = "cp.sqlite3"
+CLAIM_TTL = 30  # detik; klaim yang gak diperbarui selama ini dianggap gagal & boleh diambil alih
+HEARTBEAT = 10  # detik; jeda pembaruan klaim oleh pemegangnya
+HOLD_MAX = 20 * 60  # detik; batas atas memegang klaim (antre + generate), jaga-jaga sesi yang hilang
+WAIT_MAX = HOLD_MAX  # detik; batas atas menunggu klaim sesi lain
+WAIT_POLL = 0.5
+
+
+def _load_catalog():
+    with open(CATALOG_PATH, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return {(fase, elemen): text for fase, per_elemen in data["cp"].items() for elemen, text in per_elemen.items()}
+
+
+CATALOG = _load_catalog()
+
+with connect_sqlite(DB_NAME) as _conn:
+    _conn.execute("""
+        CREATE TABLE IF NOT EXISTS cp_generated (
+            fase TEXT NOT NULL,
+            elemen TEXT NOT NULL,
+            text TEXT,
+            claimed_at REAL NOT NULL,
+            PRIMARY KEY (fase, elemen)
+        )""")
+
+_generated = {}  # memo (fase, elemen) -> text untuk CP hasil AI yang sudah tersimpan
+_heartbeats = {}  # (fase, elemen) -> threading.Event penghenti heartbeat klaim yang dipegang proses ini
+_heartbeats_lock = threading.Lock()
+
+
+def get_cp_text(fase, elemen):
+    # CP resmi dulu, lalu CP hasil AI yang sudah tersimpan. None kalau belum ada sama sekali.
+    key = (fase, elemen)
+    if key in CATALOG:
+        return CATALOG[key]
+    if key in _generated:
+        return _generated[key]
+    with connect_sqlite(DB_NAME) as conn:
+        row = conn.execute(
+            "SELECT text FROM cp_generated WHERE fase = ? AND elemen = ? AND text IS NOT NULL", key
+        ).fetchone()
+    if row:
+        _generated[key] = row[0]
+        return row[0]
+    return None
+
+
+def _renew(key, stop, owner):
+    # Heartbeat berhenti sendiri kalau thread pemegang klaim sudah mati tanpa save/release (misal thread
+    # worker yang crash), biar klaimnya kedaluwarsa dan bisa diambil alih pemanggil lain. Thread script
+    # Streamlit tetap hidup antar rerun, jadi di app klaim dilepas lewat sections.abort() (termasuk saat
+    # rerun/stop), dan klaimnya baru diambil setelah dapat giliran antrean.
+    deadline = time.time() + HOLD_MAX
+    while not stop.wait(HEARTBEAT) and time.time() < deadline and owner.is_alive():
+        with connect_sqlite(DB_NAME) as conn:
+            cur = conn.execute(
+                "UPDATE cp_generated SET claimed_at = ? WHERE fase = ? AND elemen = ? AND text IS NULL",
+                (time.time(), *key),
+            )
+        if not cur.rowcount:
+            break  # CP sudah jadi / klaim dilepas
+    with _heartbeats_lock:
+        if _heartbeats.get(key) is stop:
+            del _heartbeats[key]
+
+
+def _hold(key):
+    stop = threading.Event()
+    with _heartbeats_lock:
+        previous = _heartbeats.get(key)
+        _heartbeats[key] = stop
+    if previous:
+        previous.set()
+    owner = threading.current_thread()
+    threading.Thread(target=_renew, args=(key, stop, owner), daemon=True, name="cp-claim").start()
+
+
+def _drop(key):
+    with _heartbeats_lock:
+        stop = _heartbeats.pop(key, None)
+    if stop:
+        stop.set()
+
+
+def claim(fase, elemen):
+    # True kalau pemanggil ini yang bertugas membuat CP-nya (klaimnya langsung dijaga heartbeat)
+    now = time.time()
+    with connect_sqlite(DB_NAME) as conn:
+        cur = conn.execute(
+            "INSERT OR IGNORE INTO cp_generated (fase, elemen, text, claimed_at) VALUES (?, ?, NULL, ?)",
+            (fase, elemen, now),
+        )
+        if not cur.rowcount:
+            cur = conn.execute(
+                "UPDATE cp_generated SET claimed_at = ? WHERE fase = ? AND elemen = ? AND text IS NULL "
+                "AND claimed_at < ?",
+                (now, fase, elemen, now - CLAIM_TTL),
+            )
+        claimed = cur.rowcount > 0
+    if claimed:
+        _hold((fase, elemen))
+    return claimed
+
+
+def _claim_alive(fase, elemen):
+    with connect_sqlite(DB_NAME) as conn:
+        row = conn.execute(
+            "SELECT claimed_at FROM cp_generated WHERE fase = ? AND elemen = ? AND text IS NULL", (fase, elemen)
+        ).fetchone()
+    return row is not None and row[0] >= time.time() - CLAIM_TTL
+
+
+def wait_for(fase, elemen, timeout=WAIT_MAX, on_wait=None):
+    # Tunggu CP dari sesi yang memegang klaim. Berhenti (None) kalau klaimnya dilepas/basi atau kelamaan.
+    # on_wait(detik menunggu) dipanggil tiap polling, biar UI bisa menampilkan statusnya.
+    start = time.time()
+    while time.time() - start < timeout:
+        text = get_cp_text(fase, elemen)
+        if text:
+            return text
+        if not _claim_alive(fase, elemen):
+            return get_cp_text(fase, elemen)
+        if on_wait:
+            on_wait(time.time() - start)
+        time.sleep(WAIT_POLL)
+    return None
+
+
+def resolve(fase, elemen, on_wait=None):
+    # Hasil: (teks CP atau None, perlu_generate). Kalau perlu_generate True, pemanggil wajib
+    # membuat CP lalu memanggil save_generated() (atau release() kalau gagal).
+    text = get_cp_text(fase, elemen)
+    if text:
+        return text, False
+    if claim(fase, elemen):
+        return None, True
+    with metrics.timer("cp_wait"):
+        text = wait_for(fase, elemen, on_wait=on_wait)
+    if text:
+        return text, False
+    # Yang mengklaim gagal/hilang: ambil alih kalau bisa, kalau tidak tetap generate sendiri
+    claim(fase, elemen)
+    return None, True
+
+
+def clean_generated(html):
+    # Ambil teks CP saja dari HTML hasil Gemini (buang tag & label "Capaian Pembelajaran (CP):")
+    text = re.sub(r"<[^>]+>", " ", html)
+    text = re.sub(r"^\s*(\d+\.\s*)?Capaian Pembelajaran\s*(\(CP\))?\s*:?", "", text.strip(), flags=re.I)
+    return " ".join(text.split())
+
+
+def save_generated(fase, elemen, html):
+    _drop((fase, elemen))
+    text = clean_generated(html)
+    if not text:
+        release(fase, elemen)
+        return None
+    with connect_sqlite(DB_NAME) as conn:
+        conn.execute(
+            "INSERT INTO cp_generated (fase, elemen, text, claimed_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(fase, elemen) DO UPDATE SET text = excluded.text WHERE cp_generated.text IS NULL",
+            (fase, elemen, text, time.time()),
+        )
+    _generated.pop((fase, elemen), None)
+    return get_cp_text(fase, elemen)
+
+
+def release(fase, elemen):
+    _drop((fase, elemen))
+    with connect_sqlite(DB_NAME) as conn:
+        conn.execute("DELETE FROM cp_generated WHERE fase = ? AND elemen = ? AND text IS NULL", (fase, elemen))
@@ -0,0 +1,303 @@
+import atexit
+import base64
+import hashlib
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import clients
+import metrics
+import module_cache
+import pdf_render
+import resilience
+from storage import connect_sqlite
+
+# --- RIWAYAT MODUL PER GURU (SUPABASE) ---
+# Tiap modul yang selesai dibuat disimpan per user_email, jadi guru yang pindah halaman/reload
+# tinggal unduh ulang tanpa panggil Gemini & render PDF lagi.
+#   - HTML dikompres zlib (teks HTML modul biasanya menyusut ~5-8x), disimpan base64.
+#   - PDF disimpan SEKALI di tabel terpisah, dikunci hash SHA-256 isinya; riwayat cuma menyimpan hash-nya.
+#   - Daftar riwayat hanya mengambil kolom metadata dan dipaginasi pakai cursor (id terakhir),
+#     bukan offset, jadi halaman ke-N tetap murah.
+#
+# Skema tabel (jalankan sekali di SQL editor Supabase):
+#
+#   create table module_pdfs (
+#       hash text primary key,
+#       pdf text not null,                -- base64
+#       size integer not null,
+#       created_at timestamptz not null default now()
+#   );
+#   create table module_history (
+#       id bigint generated always as identity primary key,
+#       user_email text not null,
+#       module_key text not null,
+#       topik text not null,
+#       jenjang text,
+#       kelas text,
+#       metode text,
+#       html_z text not null,             -- base64(zlib(html))
+#       pdf_hash text references module_pdfs(hash),
+#       created_at timestamptz not null default now(),
+#       unique (user_email, module_key)
+#   );
+#   create index module_history_user_id on module_history (user_email, id desc);
+#
+# Penyimpanan dari halaman buat modul jalan di background (save_module_later / attach_pdf_later), jadi
+# balon & tombol unduh gak nunggu Supabase. Apa yang sudah pernah tersimpan dicatat di state bersama
+# (hash HTML & PDF per baris, hash PDF yang sudah ada di module_pdfs), jadi modul dari cache yang dibuka
+# ulang gak mengirim ulang HTML/PDF base64-nya ke Supabase. Catatan itu dibaca/ditulis lewat memo proses;
+# penulisannya ke SQLite dikumpulkan lalu di-flush sekali jalan dari thread background (SYNC_FLUSH_DELAY),
+# jadi gak menambah waktu di jalur simpan. Kalau catatan sempat hilang (proses mati sebelum flush),
+# akibatnya cuma satu kali kirim ulang yang sebenarnya gak perlu.
+
+HISTORY_TABLE = "module_history"
+PDF_TABLE = "module_pdfs"
+LIST_COLUMNS = "id, module_key, topik, jenjang, kelas, metode, pdf_hash, created_at"
+PAGE_SIZE = 10
+COMPRESS_LEVEL = 9
+DB_NAME = "history_sync.sqlite3"
+PERSIST_WORKERS = 2
+SYNC_FLUSH_DELAY = 1.0  # detik; catatan "sudah tersimpan" ditulis ke SQLite per kelompok
+SYNC_MEMO_MAX = 10000  # baris catatan yang disimpan di memori proses
+
+with connect_sqlite(DB_NAME) as _conn:
+    _conn.execute("""
+        CREATE TABLE IF NOT EXISTS synced_modules (
+            user_email TEXT NOT NULL,
+            module_key TEXT NOT NULL,
+            html_hash TEXT,
+            pdf_hash TEXT,
+            updated REAL NOT NULL,
+            PRIMARY KEY (user_email, module_key)
+        )""")
+    _conn.execute("CREATE TABLE IF NOT EXISTS synced_pdfs (hash TEXT PRIMARY KEY)")
+
+_pool = ThreadPoolExecutor(max_workers=PERSIST_WORKERS, thread_name_prefix="riwayat")
+_synced_pdfs = set()  # memo hash PDF yang sudah pasti ada di module_pdfs
+_synced_rows = {}  # memo (user_email, module_key) -> (hash HTML, hash PDF) yang sudah tersimpan
+_pending = {}  # catatan yang belum di-flush ke SQLite, kunci sama dengan _synced_rows
+_sync_lock = threading.Lock()
+_flush_timer = None
+
+
+def compress_html(html):
+    return base64.b64encode(zlib.compress(html.encode("utf-8"), COMPRESS_LEVEL)).decode("ascii")
+
+
+def decompress_html(data):
+    return zlib.decompress(base64.b64decode(data)).decode("utf-8")
+
+
+def pdf_hash(pdf):
+    return hashlib.sha256(pdf).hexdigest()
+
+
+def html_hash(html):
+    return hashlib.sha256(html.encode("utf-8")).hexdigest()
+
+
+def _remember(key, digests):
+    if len(_synced_rows) >= SYNC_MEMO_MAX and key not in _synced_rows:
+        _synced_rows.clear()
+    _synced_rows[key] = digests
+
+
+def _flush_synced():
+    global _flush_timer
+    with _sync_lock:
+        rows = list(_pending.items())
+        _pending.clear()
+        _flush_timer = None
+    if not rows:
+        return
+    now = time.time()
+    with connect_sqlite(DB_NAME) as conn:
+        conn.executemany(
+            "INSERT INTO synced_modules (user_email, module_key, html_hash, pdf_hash, updated) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(user_email, module_key) DO UPDATE SET "
+            "html_hash = COALESCE(excluded.html_hash, synced_modules.html_hash), "
+            "pdf_hash = COALESCE(excluded.pdf_hash, synced_modules.pdf_hash), updated = excluded.updated",
+            [(user_email, module_key, html_digest, pdf_digest, now)
+             for (user_email, module_key), (html_digest, pdf_digest) in rows],
+        )
+        conn.executemany("INSERT OR IGNORE INTO synced_pdfs (hash) VALUES (?)",
+                         [(pdf_digest,) for _, (_, pdf_digest) in rows if pdf_digest])
+
+
+atexit.register(_flush_synced)
+
+
+def _mark_synced(user_email, module_key, html_digest=None, pdf_digest=None):
+    # Memo langsung diperbarui; penulisan ke SQLite ditunda dan digabung (lihat _flush_synced)
+    global _flush_timer
+    key = (user_email, module_key)
+    with _sync_lock:
+        known = _synced_rows.get(key, (None, None))
+        digests = (html_digest or known[0], pdf_digest or known[1])
+        _remember(key, digests)
+        pending = _pending.get(key, (None, None))
+        _pending[key] = (html_digest or pending[0], pdf_digest or pending[1])
+        if pdf_digest:
+            _synced_pdfs.add(pdf_digest)
+        if _flush_timer is None:
+            _flush_timer = threading.Timer(SYNC_FLUSH_DELAY, _flush_synced)
+            _flush_timer.daemon = True
+            _flush_timer.start()
+
+
+def _synced_digests(user_email, module_key):
+    key = (user_email, module_key)
+    with _sync_lock:
+        if key in _synced_rows:
+            return _synced_rows[key]
+    with connect_sqlite(DB_NAME) as conn:
+        row = conn.execute("SELECT html_hash, pdf_hash FROM synced_modules WHERE user_email = ? AND module_key = ?",
+                           key).fetchone()
+    if row is None:
+        return None
+    with _sync_lock:
+        # Catatan yang lebih baru mungkin masuk selagi SQLite dibaca
+        return _synced_rows.setdefault(key, tuple(row))
+
+
+def is_synced(user_email, module_key, html=None, pdf=None):
+    # True kalau baris riwayat ini (dengan HTML/PDF yang sama) sudah pernah tersimpan ke Supabase
+    digests = _synced_digests(user_email, module_key)
+    if digests is None:
+        return False
+    if html is not None and digests[0] != html_hash(html):
+        return False
+    return pdf is None or digests[1] == pdf_hash(pdf)
+
+
+def _pdf_synced(digest):
+    if digest in _synced_pdfs:
+        return True
+    with connect_sqlite(DB_NAME) as conn:
+        found = conn.execute("SELECT 1 FROM synced_pdfs WHERE hash = ?", (digest,)).fetchone() is not None
+    if found:
+        _synced_pdfs.add(digest)
+    return found
+
+
+def _execute(query, op, retries=resilience.DEFAULT_RETRIES):
+    with metrics.timer("history", op=op):
+        return resilience.call("Supabase", query.execute, timeout=clients.SUPABASE_TIMEOUT, retries=retries)
+
+
+def save_pdf(supabase, pdf):
+    # Upsert "abaikan kalau sudah ada": PDF yang sama (hash sama) cukup tersimpan sekali
+    digest = pdf_hash(pdf)
+    if _pdf_synced(digest):
+        metrics.incr("history_pdf_skipped")
+        return digest
+    _execute(
+        supabase.table(PDF_TABLE).upsert(
+            {"hash": digest, "pdf": base64.b64encode(pdf).decode("ascii"), "size": len(pdf)},
+            on_conflict="hash", ignore_duplicates=True, returning="minimal",
+        ),
+        op="save_pdf",
+    )
+    return digest  # dicatat tersimpan oleh pemanggil (_mark_synced), sekalian dengan barisnya
+
+
+def save_module(supabase, user_email, spec, html, pdf=None):
+    # Kunci unik (user_email, module_key) bikin penyimpanan idempoten: aman di-retry, dan
+    # modul yang dibuat ulang dengan input sama cuma memperbarui baris lamanya.
+    row = {
+        "user_email": user_email,
+        "module_key": module_cache.make_key(spec),
+        "topik": spec["topik"],
+        "jenjang": spec.get("jenjang", ""),
+        "kelas": str(spec.get("kelas", "")),
+        "metode": spec.get("metode", ""),
+        "html_z": compress_html(html),
+    }
+    if pdf:
+        row["pdf_hash"] = save_pdf(supabase, pdf)
+    _execute(
+        supabase.table(HISTORY_TABLE).upsert(row, on_conflict="user_email,module_key", returning="minimal"),
+        op="save",
+    )
+    _mark_synced(user_email, row["module_key"], html_hash(html), row.get("pdf_hash"))
+    return row["module_key"]
+
+
+def attach_pdf(supabase, user_email, module_key, pdf):
+    # PDF biasanya jadi belakangan (setelah HTML tersimpan)
+    digest = save_pdf(supabase, pdf)
+    _execute(
+        supabase.table(HISTORY_TABLE).update({"pdf_hash": digest}, returning="minimal")
+        .eq("user_email", user_email).eq("module_key", module_key),
+        op="attach_pdf",
+    )
+    _mark_synced(user_email, module_key, pdf_digest=digest)
+    return digest
+
+
+def save_module_later(supabase, user_email, spec, html, pdf=None):
+    # Hasil: Future dari save_module di background, atau None kalau baris yang sama sudah tersimpan
+    if is_synced(user_email, module_cache.make_key(spec), html, pdf):
+        metrics.incr("history_save_skipped")
+        return None
+    return _pool.submit(save_module, supabase, user_email, spec, html, pdf)
+
+
+def attach_pdf_later(supabase, user_email, module_key, pdf):
+    if is_synced(user_email, module_key, pdf=pdf):
+        metrics.incr("history_save_skipped")
+        return None
+    return _pool.submit(attach_pdf, supabase, user_email, module_key, pdf)
+
+
+def list_modules(supabase, user_email, cursor=None, limit=PAGE_SIZE):
+    # Hasil: (baris metadata, cursor halaman berikutnya atau None).
+    # Ambil limit+1 baris buat tahu masih ada halaman berikutnya tanpa query count terpisah.
+    query = (supabase.table(HISTORY_TABLE).select(LIST_COLUMNS)
+             .eq("user_email", user_email).order("id", desc=True).limit(limit + 1))
+    if cursor is not None:
+        query = query.lt("id", cursor)
+    rows = _execute(query, op="list").data
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, rows[-1]["id"]
+    return rows, None
+
+
+def load_html(supabase, user_email, module_id):
+    response = _execute(
+        supabase.table(HISTORY_TABLE).select("module_key, html_z")
+        .eq("user_email", user_email).eq("id", module_id).limit(1),
+        op="load_html",
+    )
+    if not response.data:
+        return None
+    row = response.data[0]
+    return row["module_key"], decompress_html(row["html_z"])
+
+
+def load_pdf(supabase, digest):
+    response = _execute(supabase.table(PDF_TABLE).select("pdf").eq("hash", digest).limit(1), op="load_pdf")
+    if not response.data:
+        return None
+    return base64.b64decode(response.data[0]["pdf"])
+
+
+def fetch_pdf(supabase, user_email, row):
+    # Unduh ulang dari riwayat, dari yang paling murah: cache lokal -> PDF tersimpan -> render ulang dari HTML
+    cached = module_cache.get_cache().get(row["module_key"])
+    if cached and cached[1]:
+        return cached[1]
+    if row.get("pdf_hash"):
+        pdf = load_pdf(supabase, row["pdf_hash"])
+        if pdf:
+            return pdf
+    loaded = load_html(supabase, user_email, row["id"])
+    if loaded is None:
+        return None
+    pdf = pdf_render.get_pdf(loaded[1])
+    if pdf:
+        attach_pdf(supabase, user_email, row["module_key"], pdf)
+    return pdf
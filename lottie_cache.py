@@ -0,0 +1,141 @@
+import json
+import os
+import sys
+import threading
+import time
+
+import requests
+
+from storage import BASE_DIR, CACHE_DIR
+
+# --- CACHE ANIMASI LOTTIE ---
+# Urutan baca: memori proses -> cache disk -> salinan offline di folder assets/ (kalau ada).
+# Jaringan cuma disentuh dari thread background, jadi rerun gak pernah nunggu CDN. Selama belum ada
+# satu pun sumber (CDN belum sempat diunduh & gak ada salinan offline), load_lottie() mengembalikan None
+# dan app tampil tanpa animasi.
+#
+# Salinan offline di assets/ cuma boleh berisi file asli dari CDN. Isi/perbarui dengan (butuh akses ke lottie.host):
+#   python lottie_cache.py
+
+ASSET_DIR = os.path.join(BASE_DIR, "assets")
+LOTTIE_CACHE_DIR = os.path.join(CACHE_DIR, "lottie")
+
+LOTTIE_ROBOT_URL = "https://lottie.host/5a07c584-6f3f-48db-9556-993f3503928e/wF8w8O9ZlW.json"
+LOTTIE_SUCCESS_URL = "https://lottie.host/9c334346-6d60-44a6-98a9-448255959080/c8Z3Y7d5x9.json"
+ANIMATIONS = {"lottie_robot": LOTTIE_ROBOT_URL, "lottie_success": LOTTIE_SUCCESS_URL}
+
+LOTTIE_TTL = 24 * 60 * 60  # detik, 1 hari
+FETCH_TIMEOUT = 5  # detik
+RETRY_AFTER = 5 * 60  # detik; load_lottie dipanggil tiap rerun, jadi CDN yang gagal gak dicoba terus-terusan
+
+_session = requests.Session()
+_lock = threading.Lock()
+_memo = {}  # name -> (mtime file sumber, data json)
+_refreshing = set()
+_last_attempt = {}  # name -> waktu terakhir mencoba refresh
+
+
+def _cache_path(name):
+    return os.path.join(LOTTIE_CACHE_DIR, f"{name}.json")
+
+
+def _bundled_path(name):
+    return os.path.join(ASSET_DIR, f"{name}.json")
+
+
+def _read_json(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+def _write_json(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Tulis ke file sementara dulu lalu replace, biar pembaca lain gak dapat file setengah jadi
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def _fetch(url):
+    r = _session.get(url, timeout=FETCH_TIMEOUT)
+    r.raise_for_status()
+    data = r.json()
+    if not isinstance(data, dict) or "layers" not in data:
+        raise ValueError(f"{url} bukan animasi Lottie")
+    return data
+
+
+def _fetch_and_store(name, url):
+    try:
+        _write_json(_cache_path(name), _fetch(url))
+    except Exception:
+        pass
+    finally:
+        with _lock:
+            _refreshing.discard(name)
+
+
+def _refresh_in_background(name, url):
+    with _lock:
+        if name in _refreshing or time.time() - _last_attempt.get(name, 0) < RETRY_AFTER:
+            return
+        _refreshing.add(name)
+        _last_attempt[name] = time.time()
+    threading.Thread(target=_fetch_and_store, args=(name, url), daemon=True).start()
+
+
+def load_lottie(name: str, url: str, ttl: int = LOTTIE_TTL):
+    cache_path = _cache_path(name)
+    cache_mtime = _mtime(cache_path)
+
+    # Cache disk gak ada / sudah basi -> refresh di background, tetap pakai yang ada sekarang
+    if cache_mtime is None or time.time() - cache_mtime > ttl:
+        _refresh_in_background(name, url)
+
+    source_path, source_mtime = cache_path, cache_mtime
+    if source_mtime is None:
+        source_path, source_mtime = _bundled_path(name), _mtime(_bundled_path(name))
+    if source_mtime is None:
+        return None
+
+    memo = _memo.get(name)
+    if memo and memo[0] == (source_path, source_mtime):
+        return memo[1]
+
+    data = _read_json(source_path)
+    if data is None and source_path == cache_path:
+        # File cache rusak, jatuh ke salinan offline
+        source_path = _bundled_path(name)
+        source_mtime = _mtime(source_path)
+        data = _read_json(source_path)
+    if data is not None:
+        _memo[name] = ((source_path, source_mtime), data)
+    return data
+
+
+def update_assets():
+    # Unduh ulang salinan offline di assets/ dari CDN (sekali jalan, bukan dari app)
+    failed = 0
+    for name, url in ANIMATIONS.items():
+        try:
+            _write_json(_bundled_path(name), _fetch(url))
+            print(f"{name}: diperbarui dari {url}")
+        except Exception as e:
+            failed += 1
+            print(f"{name}: gagal diunduh ({e})", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(update_assets())
@@ -0,0 +1,163 @@
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --- METRIK LATENSI PER TAHAP ---
+# timer("nama_tahap") dipasang di sekitar tiap tahap (init klien, susun prompt, time-to-first-chunk,
+# streaming, buang pagar, konversi PDF, auth Supabase). Data disimpan per proses:
+#   - histogram kumulatif ala Prometheus (buat /metrics),
+#   - sampel terakhir (buat hitung p50/p95 di dashboard admin).
+# Kalau METRICS_LOG_JSON=1, tiap observasi juga ditulis sebagai satu baris JSON ke log.
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+SAMPLE_SIZE = 1000
+PREFIX = "modul_cerdas"
+LOG_JSON = os.getenv("METRICS_LOG_JSON", "") == "1"
+# Endpoint /metrics cuma didengarkan di localhost; isi METRICS_HOST (misal 0.0.0.0) kalau scraper
+# Prometheus ada di mesin lain. Isinya (nama tahap, jumlah token, dst.) gak perlu dibuka ke internet.
+DEFAULT_HOST = "127.0.0.1"
+
+logger = logging.getLogger("modul_cerdas.metrics")
+
+_lock = threading.Lock()
+_hist = {}  # (stage, label terurut) -> {"buckets": [...], "sum": float, "count": int}
+_samples = defaultdict(lambda: deque(maxlen=SAMPLE_SIZE))
+_counters = defaultdict(int)
+_server = None
+
+
+def observe(stage, seconds, **labels):
+    # Label (op, slot, client, ...) jadi label Prometheus: satu seri histogram per kombinasi nilai.
+    # Sampel buat p50/p95 di dashboard tetap digabung per tahap.
+    key = (stage, tuple(sorted((name, str(value)) for name, value in labels.items())))
+    with _lock:
+        hist = _hist.get(key)
+        if hist is None:
+            hist = _hist[key] = {"buckets": [0] * len(BUCKETS), "sum": 0.0, "count": 0}
+        i = bisect.bisect_left(BUCKETS, seconds)
+        if i < len(BUCKETS):
+            hist["buckets"][i] += 1
+        hist["sum"] += seconds
+        hist["count"] += 1
+        _samples[stage].append(seconds)
+    if LOG_JSON:
+        logger.info(json.dumps({"ts": time.time(), "stage": stage, "seconds": round(seconds, 6), **labels}))
+
+
+def incr(event, amount=1):
+    with _lock:
+        _counters[event] += amount
+
+
+@contextmanager
+def timer(stage, **labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - start, **labels)
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * q
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def summary():
+    # Ringkasan per tahap untuk dashboard: count, rata-rata, p50, p95, max (dari sampel terakhir)
+    with _lock:
+        totals = defaultdict(lambda: [0, 0.0])
+        for (stage, _), hist in _hist.items():
+            totals[stage][0] += hist["count"]
+            totals[stage][1] += hist["sum"]
+        stages = {stage: (count, total, sorted(_samples[stage])) for stage, (count, total) in totals.items()}
+        counters = dict(_counters)
+    rows = []
+    for stage, (count, total, values) in sorted(stages.items()):
+        rows.append({
+            "stage": stage,
+            "count": count,
+            "mean_s": total / count if count else None,
+            "p50_s": _percentile(values, 0.50),
+            "p95_s": _percentile(values, 0.95),
+            "max_s": values[-1] if values else None,
+        })
+    return {"stages": rows, "counters": counters}
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(stage, labels):
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in (("stage", stage),) + labels)
+
+
+def prometheus_text():
+    lines = [
+        f"# HELP {PREFIX}_stage_seconds Durasi tiap tahap pembuatan modul.",
+        f"# TYPE {PREFIX}_stage_seconds histogram",
+    ]
+    with _lock:
+        hists = {key: (list(h["buckets"]), h["sum"], h["count"]) for key, h in _hist.items()}
+        counters = dict(_counters)
+    for (stage, labels), (buckets, total, count) in sorted(hists.items()):
+        series = _label_text(stage, labels)
+        cumulative = 0
+        for bound, n in zip(BUCKETS, buckets):
+            cumulative += n
+            lines.append(f'{PREFIX}_stage_seconds_bucket{{{series},le="{bound:g}"}} {cumulative}')
+        lines.append(f'{PREFIX}_stage_seconds_bucket{{{series},le="+Inf"}} {count}')
+        lines.append(f'{PREFIX}_stage_seconds_sum{{{series}}} {total:.6f}')
+        lines.append(f'{PREFIX}_stage_seconds_count{{{series}}} {count}')
+    lines.append(f"# HELP {PREFIX}_events_total Jumlah kejadian (cache hit/miss, error, dsb).")
+    lines.append(f"# TYPE {PREFIX}_events_total counter")
+    for event, value in sorted(counters.items()):
+        lines.append(f'{PREFIX}_events_total{{event="{_escape(event)}"}} {value}')
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.startswith("/metrics.json"):
+            body, content_type = json.dumps(summary()).encode(), "application/json"
+        elif self.path.startswith("/metrics"):
+            body, content_type = prometheus_text().encode(), "text/plain; version=0.0.4"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port, host=None):
+    # Endpoint /metrics (format Prometheus) & /metrics.json, sekali per proses
+    global _server
+    with _lock:
+        if _server is not None or not port:
+            return _server
+        host = host or DEFAULT_HOST
+        try:
+            _server = ThreadingHTTPServer((host, int(port)), _MetricsHandler)
+        except OSError as e:
+            # Port dipakai proses lain (misal replika kedua di mesin yang sama): cukup lewati
+            logger.warning("Endpoint metrics gagal dibuka di %s:%s: %s", host, port, e)
+            return None
+    threading.Thread(target=_server.serve_forever, daemon=True, name="metrics-http").start()
+    return _server
@@ -0,0 +1,69 @@
+# --- DATA MODUL AJAR ---
+# Bagian ini sengaja gak import streamlit, biar bisa dipakai juga dari mode batch/CLI.
+
+JENJANG_KELAS = {
+    "SD/MI": [1, 2, 3, 4, 5, 6],
+    "SMP/MTS": [7, 8, 9],
+    "SMA/MA": [10, 11, 12],
+}
+
+ELEMEN_CP = ["Menyimak – Berbicara", "Membaca – Memirsa", "Menulis – Mempresentasikan"]
+
+PPP_MAP = {
+    "Jigsaw": "Gotong Royong & Mandiri",
+    "Think-Pair-Share (TPS)": "Bernalar Kritis & Kreatif",
+    "Number Heads Together (NHT)": "Gotong Royong & Bernalar Kritis",
+    "Role Play": "Kreatif & Kebinekaan Global",
+    "Gallery Walk": "Gotong Royong & Bernalar Kritis",
+    "Two Stay Two Stray (TSTS)": "Gotong Royong & Komunikasi Efektif",
+    "Talking Chips": "Gotong Royong & Menghargai Orang Lain"
+}
+METODE = list(PPP_MAP)
+
+SPEC_FIELDS = ("penyusun", "instansi", "jenjang", "kelas", "fase", "topik", "semester",
+               "alokasi", "elemen_pilih", "metode", "ppp_value")
+
+
+def opsi_kelas(jenjang):
+    return JENJANG_KELAS.get(jenjang, JENJANG_KELAS["SMA/MA"])
+
+
+def fase_for_kelas(kelas):
+    fase = ""
+    if kelas in [1, 2]: fase = "A"
+    elif kelas in [3, 4]: fase = "B"
+    elif kelas in [5, 6]: fase = "C"
+    elif kelas in [7, 8, 9]: fase = "D"
+    elif kelas == 10: fase = "E"
+    elif kelas in [11, 12]: fase = "F"
+    return fase
+
+
+def ppp_for_metode(metode):
+    return PPP_MAP.get(metode, "Mandiri & Kreatif")
+
+
+def make_spec(penyusun, instansi, jenjang, kelas, topik, metode, elemen_pilih,
+              alokasi="2 x 45 Menit", semester="Ganjil"):
+    # Satu "spec" = semua input satu modul. Fase & Profil Pancasila diturunkan dari kelas & metode.
+    kelas = int(kelas)
+    return {
+        "penyusun": penyusun, "instansi": instansi, "jenjang": jenjang, "kelas": kelas,
+        "fase": fase_for_kelas(kelas), "topik": topik, "semester": semester, "alokasi": alokasi,
+        "elemen_pilih": elemen_pilih, "metode": metode, "ppp_value": ppp_for_metode(metode),
+    }
+
+
+# Instruksi tetap untuk Gemini. Dipasang sekali sebagai system_instruction model (lihat clients.get_model),
+# jadi tiap request cuma membawa data modul + bagian yang harus ditulis (lihat sections._section_prompt).
+SYSTEM_INSTRUCTION = """
+Bertindaklah sebagai Guru Inggris Profesional. Anda sedang mengisi SATU BAGIAN dari sebuah Modul Ajar (bagian lain sudah ditulis).
+Setiap permintaan berisi DATA modul dan BAGIAN YANG HARUS DITULIS.
+
+**INSTRUKSI FORMATTING (PDF FRIENDLY):**
+1. JANGAN GUNAKAN MARKDOWN (Bintang/Pagar). Gunakan HTML.
+2. Gunakan tag HTML `<i>` miring, `<b>` tebal.
+3. Gunakan tag <table>, <tr>, <th>, <td> untuk SEMUA tabel.
+4. Gunakan <ul> dan <li> untuk poin-poin.
+5. Tulis HANYA isi bagian yang diminta. Jangan tulis judul modul, judul bagian lain, kata pengantar, atau penutup.
+"""
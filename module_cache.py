@@ -0,0 +1,152 @@
+import hashlib
+import json
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from storage import connect_sqlite
+
+# --- CACHE MODUL (CONTENT-ADDRESSED) ---
+# Kunci = hash dari input prompt yang sudah dinormalisasi. Dua tingkat:
+#   1. LRU di memori proses (paling cepat, hilang kalau proses restart)
+#   2. SQLite di disk (tahan restart, dibatasi ukuran total & umur)
+
+# Naikkan angka ini kalau template prompt berubah, biar hasil lama gak ikut terpakai
+PROMPT_VERSION = 5
+
+KEY_FIELDS = ("penyusun", "instansi", "jenjang", "kelas", "fase", "topik",
+              "metode", "elemen_pilih", "alokasi", "ppp_value")
+
+MEMORY_MAX_ITEMS = 64
+DISK_MAX_BYTES = 200 * 1024 * 1024  # 200 MB
+DISK_MAX_AGE = 30 * 24 * 60 * 60  # 30 hari
+DB_NAME = "modules.sqlite3"
+
+
+def _normalize(value):
+    text = unicodedata.normalize("NFC", str(value))
+    return " ".join(text.split())
+
+
+def make_key(inputs: dict) -> str:
+    data = {field: _normalize(inputs.get(field, "")) for field in KEY_FIELDS}
+    data["_v"] = PROMPT_VERSION
+    raw = json.dumps(data, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ModuleCache:
+    def __init__(self, db_name=DB_NAME, memory_items=MEMORY_MAX_ITEMS,
+                 max_bytes=DISK_MAX_BYTES, max_age=DISK_MAX_AGE):
+        self.db_name = db_name
+        self.memory_items = memory_items
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._memory = OrderedDict()  # key -> (html, pdf, created_at)
+        self._lock = threading.Lock()
+        with connect_sqlite(self.db_name) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS modules (
+                    key TEXT PRIMARY KEY,
+                    html TEXT NOT NULL,
+                    pdf BLOB,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS modules_last_access ON modules(last_access)")
+
+    def _remember(self, key, html, pdf, created_at):
+        with self._lock:
+            self._memory[key] = (html, pdf, created_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            hit = self._memory.get(key)
+            if hit is not None:
+                # Umur dihitung dari created_at yang sama dengan di SQLite: proses yang hidup lama
+                # gak boleh terus menyajikan modul yang di disk sudah kedaluwarsa
+                if now - hit[2] <= self.max_age:
+                    self._memory.move_to_end(key)
+                    return hit[0], hit[1]
+                del self._memory[key]
+
+        with connect_sqlite(self.db_name) as conn:
+            row = conn.execute(
+                "SELECT html, pdf, created_at FROM modules WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if now - row[2] > self.max_age:
+                conn.execute("DELETE FROM modules WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE modules SET last_access = ? WHERE key = ?", (now, key))
+
+        html, pdf = row[0], (bytes(row[1]) if row[1] is not None else None)
+        self._remember(key, html, pdf, row[2])
+        return html, pdf
+
+    def put(self, key, html, pdf=None):
+        now = time.time()
+        size = len(html.encode("utf-8")) + (len(pdf) if pdf else 0)
+        with connect_sqlite(self.db_name) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO modules (key, html, pdf, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, html, pdf, size, now, now),
+            )
+        self._remember(key, html, pdf, now)
+        self.evict()
+
+    def put_pdf(self, key, pdf):
+        # PDF sering jadi belakangan (setelah HTML), jadi disimpan terpisah
+        with connect_sqlite(self.db_name) as conn:
+            conn.execute(
+                "UPDATE modules SET pdf = ?, size = length(CAST(html AS BLOB)) + ? WHERE key = ?",
+                (pdf, len(pdf), key),
+            )
+        with self._lock:
+            hit = self._memory.get(key)
+            if hit is not None:
+                self._memory[key] = (hit[0], pdf, hit[2])
+
+    def invalidate(self, key):
+        with self._lock:
+            self._memory.pop(key, None)
+        with connect_sqlite(self.db_name) as conn:
+            conn.execute("DELETE FROM modules WHERE key = ?", (key,))
+
+    def evict(self):
+        with connect_sqlite(self.db_name) as conn:
+            conn.execute("DELETE FROM modules WHERE created_at < ?", (time.time() - self.max_age,))
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM modules").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            # Buang yang paling lama gak diakses sampai total ukuran di bawah batas
+            for key, size in conn.execute(
+                "SELECT key, size FROM modules ORDER BY last_access ASC"
+            ).fetchall():
+                conn.execute("DELETE FROM modules WHERE key = ?", (key,))
+                with self._lock:
+                    self._memory.pop(key, None)
+                total -= size
+                if total <= self.max_bytes:
+                    break
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> ModuleCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ModuleCache()
+    return _cache
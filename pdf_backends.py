@@ -0,0 +1,387 @@
+import re
+import threading
+from html import escape
+from html.parser import HTMLParser
+from io import BytesIO
+
+# --- BACKEND PDF ---
+# Dua cara mengubah HTML modul jadi PDF A4 resmi (Times 12pt, margin 2,5 cm):
+#   - "xhtml2pdf": jalur lama. Fleksibel untuk HTML apa saja, tapi tiap elemen dicocokkan ke seluruh
+#     CSS (termasuk CSS bawaan xhtml2pdf), jadi lambat di modul yang penuh tabel. CSS-nya di-parse
+#     sekali per proses; yang tersisa per dokumen tinggal parsing HTML & pencocokan gaya.
+#   - "reportlab": HTML (subset yang dipakai modul: h2/h3, p, b/i/u, ul/ol, table, hr) langsung
+#     dipetakan ke flowable reportlab dengan gaya yang dibuat sekali per proses, tanpa mesin CSS.
+#     Kalau ketemu tata letak yang gak muat (misal satu baris tabel lebih tinggi dari satu halaman)
+#     atau error lain, otomatis jatuh ke xhtml2pdf.
+# Pilih lewat env PDF_BACKEND; bandingkan kecepatan & memori dengan: python -m benchmarks.pdf_backends
+
+PDF_STYLE = """
+    <style>
+        @page { size: A4; margin: 2.5cm; }
+        body { font-family: 'Times New Roman', Times, serif; font-size: 12pt; color: #000; line-height: 1.5; }
+        h2 { text-align: center; text-transform: uppercase; margin-bottom: 20px; font-size: 14pt; font-weight: bold; }
+        h3 { font-size: 12pt; font-weight: bold; margin-top: 15px; }
+        p { text-align: justify; margin-bottom: 10px; }
+        table { width: 100%; border-collapse: collapse; margin-bottom: 15px; table-layout: fixed; }
+        th, td { border: 1px solid #000; padding: 6px; vertical-align: top; word-wrap: break-word; font-size: 12pt !important; }
+        th { background-color: #f0f0f0; text-align: center; font-weight: bold; }
+        tr { page-break-inside: avoid; }
+    </style>
+    """
+
+
+class Xhtml2PdfBackend:
+    name = "xhtml2pdf"
+
+    def __init__(self):
+        from xhtml2pdf.context import pisaContext
+        from xhtml2pdf.default import DEFAULT_CSS
+        from xhtml2pdf.w3c import css
+
+        # CSS bawaan xhtml2pdf + CSS modul di-parse SEKALI per proses jadi ruleset siap pakai. pisa.CreatePDF
+        # selalu mem-parse ulang default_css di tiap dokumen, jadi dokumen dibangun lewat pisaStory dengan
+        # context yang langsung memakai ruleset ini. Cuma @page yang tetap ikut dokumen: parsing-nya
+        # sekaligus mengatur ukuran kertas & frame di context dokumen itu sendiri.
+        page_rule = re.compile(r"@page\s*\{[^}]*\}")
+        style = re.sub(r"</?style>", "", PDF_STYLE)
+        self.page_css = "".join(page_rule.findall(style))
+        parsed = pisaContext(None)
+        parsed.addDefaultCSS(DEFAULT_CSS + page_rule.sub("", style))
+        parsed.parseCSS()
+        default_rules = parsed.cssDefault
+
+        class CachedCssContext(pisaContext):
+            def parseCSS(self):
+                self.cssDefaultText = ""
+                super().parseCSS()
+                self.cssDefault = default_rules
+                self.cssCascade = css.CSSCascadeStrategy(userAgent=default_rules, user=self.css)
+                self.cssCascade.parser = self.cssParser
+
+        self.context_class = CachedCssContext
+
+    def render(self, source_html):
+        from reportlab.platypus.frames import Frame
+        from xhtml2pdf.document import pisaStory
+        from xhtml2pdf.files import cleanFiles
+        from xhtml2pdf.util import getBox
+        from xhtml2pdf.xhtml2pdf_reportlab import PmlBaseDoc, PmlPageTemplate
+
+        # Sama dengan inti pisa.CreatePDF (tanpa watermark/tanda tangan yang gak dipakai modul)
+        context = self.context_class(None)
+        try:
+            # default_css " " = jangan tempel DEFAULT_CSS lagi (sudah ada di ruleset cache)
+            pisaStory(f"<html><head><style>{self.page_css}</style></head><body>{source_html}</body></html>",
+                      default_css=" ", context=context)
+            if context.err:
+                return None
+            result_file = BytesIO()
+            doc = PmlBaseDoc(result_file, pagesize=context.pageSize, showBoundary=0, allowSplitting=1)
+            body = context.templateList.pop("body", None)
+            if body is None:
+                x, y, w, h = getBox("1cm 1cm -1cm -1cm", context.pageSize)
+                body = PmlPageTemplate(id="body", frames=[Frame(x, y, w, h, id="body", leftPadding=0, rightPadding=0,
+                                                               bottomPadding=0, topPadding=0)],
+                                       pagesize=context.pageSize)
+            doc.addPageTemplates([body] + list(context.templateList.values()))
+            if context.multiBuild:
+                doc.multiBuild(context.story)
+            else:
+                doc.build(context.story)
+        finally:
+            cleanFiles()
+        if context.err:
+            return None
+        return result_file.getvalue()
+
+
+# --- HTML -> POHON ELEMEN (buat backend reportlab) ---
+VOID_TAGS = {"br", "hr", "img", "meta", "input", "col", "wbr"}
+INLINE_MARKUP = {"b": "b", "strong": "b", "i": "i", "em": "i", "u": "u", "sub": "sub", "sup": "super",
+                 "s": "strike", "strike": "strike", "del": "strike"}
+BLOCK_TAGS = {"p", "div", "h1", "h2", "h3", "h4", "h5", "h6", "ul", "ol", "li", "table", "hr", "blockquote",
+              "section", "article", "thead", "tbody", "tfoot", "tr", "td", "th"}
+
+
+class _Node:
+    __slots__ = ("tag", "attrs", "children")
+
+    def __init__(self, tag, attrs=None):
+        self.tag = tag
+        self.attrs = dict(attrs or ())
+        self.children = []
+
+
+class _TreeBuilder(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = _Node("root")
+        self.stack = [self.root]
+
+    def handle_starttag(self, tag, attrs):
+        node = _Node(tag, attrs)
+        # <p> gak boleh berisi blok lain; sama seperti browser, <p> yang masih terbuka ditutup dulu
+        if tag in BLOCK_TAGS and self.stack[-1].tag == "p" and tag not in ("td", "th", "tr"):
+            self.stack.pop()
+        if tag in ("li", "tr", "td", "th"):
+            self._close_sibling(tag)
+        self.stack[-1].children.append(node)
+        if tag not in VOID_TAGS:
+            self.stack.append(node)
+
+    def handle_startendtag(self, tag, attrs):
+        self.stack[-1].children.append(_Node(tag, attrs))
+
+    def _close_sibling(self, tag):
+        # <li>/<tr>/<td> tanpa tag penutup: tutup saudara sebelumnya yang masih terbuka
+        stops = {"li": ("ul", "ol"), "tr": ("table", "thead", "tbody", "tfoot"), "td": ("tr",), "th": ("tr",)}[tag]
+        for i in range(len(self.stack) - 1, 0, -1):
+            open_tag = self.stack[i].tag
+            if open_tag in stops:
+                return
+            if open_tag == tag or (tag in ("td", "th") and open_tag in ("td", "th")):
+                del self.stack[i:]
+                return
+
+    def handle_endtag(self, tag):
+        for i in range(len(self.stack) - 1, 0, -1):
+            if self.stack[i].tag == tag:
+                del self.stack[i:]
+                return
+
+    def handle_data(self, data):
+        self.stack[-1].children.append(data)
+
+
+def parse_html(source_html):
+    builder = _TreeBuilder()
+    builder.feed(source_html)
+    builder.close()
+    return builder.root
+
+
+class ReportlabBackend:
+    name = "reportlab"
+    PAGE_MARGIN_CM = 2.5
+
+    def __init__(self):
+        # Gaya paragraf & tabel dibuat sekali per proses (font Times bawaan PDF, gak perlu registrasi font)
+        from reportlab.lib import colors
+        from reportlab.lib.enums import TA_CENTER, TA_JUSTIFY, TA_LEFT
+        from reportlab.lib.pagesizes import A4
+        from reportlab.lib.styles import ParagraphStyle
+        from reportlab.lib.units import cm
+
+        self.page_size = A4
+        self.margin = self.PAGE_MARGIN_CM * cm
+        self.frame_width = A4[0] - 2 * self.margin
+        # Jarak-jarak di bawah dikalibrasi ke hasil xhtml2pdf + PDF_STYLE (posisi baris di halaman A4)
+        body = ParagraphStyle("body", fontName="Times-Roman", fontSize=12, leading=18, textColor=colors.black,
+                              alignment=TA_JUSTIFY, spaceBefore=14, spaceAfter=8.5)
+        self.styles = {
+            "body": body,
+            "h2": ParagraphStyle("h2", parent=body, fontName="Times-Bold", fontSize=14, leading=21,
+                                 alignment=TA_CENTER, spaceBefore=0, spaceAfter=15),
+            "h3": ParagraphStyle("h3", parent=body, fontName="Times-Bold", alignment=TA_LEFT,
+                                 spaceBefore=12, spaceAfter=13),
+            # Kata panjang di sel sempit dibiarkan utuh (masuk ke padding) seperti xhtml2pdf, bukan dipotong
+            "td": ParagraphStyle("td", parent=body, alignment=TA_LEFT, spaceBefore=0, spaceAfter=0, splitLongWords=0),
+            "th": ParagraphStyle("th", parent=body, fontName="Times-Bold", alignment=TA_CENTER, spaceBefore=0,
+                                 spaceAfter=0, splitLongWords=0),
+            "li": ParagraphStyle("li", parent=body, alignment=TA_LEFT, spaceBefore=0, spaceAfter=2),
+        }
+        self.cell_padding = 9
+        self.table_style = [
+            ("GRID", (0, 0), (-1, -1), 0.75, colors.black),
+            ("VALIGN", (0, 0), (-1, -1), "TOP"),
+            ("LEFTPADDING", (0, 0), (-1, -1), self.cell_padding),
+            ("RIGHTPADDING", (0, 0), (-1, -1), self.cell_padding),
+            ("TOPPADDING", (0, 0), (-1, -1), self.cell_padding),
+            ("BOTTOMPADDING", (0, 0), (-1, -1), self.cell_padding),
+        ]
+        self.header_fill = colors.HexColor("#f0f0f0")
+
+    # -- inline --
+    def _inline(self, node, upper=False):
+        out = []
+        for child in node.children:
+            if isinstance(child, str):
+                text = escape(child, quote=False)
+                out.append(text.upper() if upper else text)
+            elif child.tag == "br":
+                out.append("<br/>")
+            elif child.tag in INLINE_MARKUP:
+                tag = INLINE_MARKUP[child.tag]
+                out.append(f"<{tag}>{self._inline(child, upper)}</{tag}>")
+            else:
+                out.append(self._inline(child, upper))
+        return "".join(out)
+
+    def _paragraph(self, markup, style):
+        from reportlab.platypus import Paragraph
+
+        if not markup.strip() or not re.sub(r"<[^>]+>", "", markup).strip():
+            return None
+        return Paragraph(markup.strip(), style)
+
+    # -- blok --
+    def _blocks(self, node, style):
+        flowables = []
+        run = []
+
+        def flush():
+            para = self._paragraph("".join(run), style)
+            if para is not None:
+                flowables.append(para)
+            run.clear()
+
+        for child in node.children:
+            if isinstance(child, str):
+                run.append(escape(child, quote=False))
+            elif child.tag not in BLOCK_TAGS:
+                holder = _Node("span")
+                holder.children = [child]
+                run.append(self._inline(holder))
+            else:
+                flush()
+                flowables.extend(self._block(child, style))
+        flush()
+        return flowables
+
+    def _block(self, node, style):
+        from reportlab.platypus import HRFlowable, Paragraph
+
+        tag = node.tag
+        if tag in ("h1", "h2"):
+            return [Paragraph(self._inline(node, upper=True).strip() or " ", self.styles["h2"])]
+        if tag in ("h3", "h4", "h5", "h6"):
+            return [Paragraph(self._inline(node).strip() or " ", self.styles["h3"])]
+        if tag in ("ul", "ol"):
+            return [self._list(node)]
+        if tag == "table":
+            return self._table(node)
+        if tag == "hr":
+            return [HRFlowable(width="100%", thickness=0.75, color="black", spaceBefore=4, spaceAfter=15)]
+        return self._blocks(node, style)
+
+    def _list(self, node):
+        from reportlab.platypus import ListFlowable, ListItem
+
+        items = []
+        for child in node.children:
+            if isinstance(child, str) or child.tag != "li":
+                continue
+            content = self._blocks(child, self.styles["li"])
+            if content:
+                items.append(ListItem(content))
+        bullet = "1" if node.tag == "ol" else "bullet"
+        return ListFlowable(items, bulletType=bullet, start=None if bullet == "1" else "•",
+                            bulletFontName="Times-Roman", bulletFontSize=12, leftIndent=18, spaceAfter=7.5)
+
+    def _rows(self, node):
+        for child in node.children:
+            if isinstance(child, str):
+                continue
+            if child.tag == "tr":
+                yield child
+            elif child.tag in ("thead", "tbody", "tfoot"):
+                yield from self._rows(child)
+
+    @staticmethod
+    def _colspan(cell):
+        # colspan yang gak valid ("2x", "", "-1") dianggap 1, sama seperti browser
+        try:
+            return max(1, int(cell.attrs.get("colspan") or 1))
+        except ValueError:
+            return 1
+
+    def _col_widths(self, first_row, columns):
+        # Lebar kolom dari atribut width="30%" (atau style width) di baris pertama, sisanya dibagi rata
+        widths = [None] * columns
+        col = 0
+        for cell in first_row:
+            span = self._colspan(cell)
+            raw = cell.attrs.get("width") or ""
+            match = re.search(r"width\s*:\s*([\d.]+)%", cell.attrs.get("style") or "")
+            raw = raw or (match.group(1) + "%" if match else "")
+            if raw.endswith("%") and span == 1 and col < columns:
+                try:
+                    widths[col] = float(raw[:-1]) / 100 * self.frame_width
+                except ValueError:
+                    pass
+            col += span
+        used = sum(w for w in widths if w)
+        free = [i for i, w in enumerate(widths) if not w]
+        if used > self.frame_width or (free and used >= self.frame_width):
+            return [self.frame_width / columns] * columns
+        for i in free:
+            widths[i] = (self.frame_width - used) / len(free)
+        scale = self.frame_width / sum(widths)
+        return [w * scale for w in widths]
+
+    def _table(self, node):
+        from reportlab.platypus import Table
+
+        rows = [[c for c in row.children if not isinstance(c, str) and c.tag in ("td", "th")]
+                for row in self._rows(node)]
+        rows = [row for row in rows if row]
+        if not rows:
+            return []
+        columns = max(sum(self._colspan(c) for c in row) for row in rows)
+        style = list(self.table_style)
+        data = []
+        for r, row in enumerate(rows):
+            cells, c = [], 0
+            for cell in row:
+                span = self._colspan(cell)
+                cells.append(self._blocks(cell, self.styles[cell.tag]) or "")
+                if cell.tag == "th":
+                    style.append(("BACKGROUND", (c, r), (c + span - 1, r), self.header_fill))
+                if span > 1:
+                    style.append(("SPAN", (c, r), (c + span - 1, r)))
+                    cells.extend([""] * (span - 1))
+                c += span
+            cells.extend([""] * (columns - len(cells)))
+            data.append(cells)
+        header_rows = 1 if all(cell.tag == "th" for cell in rows[0]) else 0
+        return [Table(data, colWidths=self._col_widths(rows[0], columns), style=style,
+                      repeatRows=header_rows, spaceAfter=12, hAlign="LEFT")]
+
+    def flowables(self, source_html):
+        return self._blocks(parse_html(source_html), self.styles["body"])
+
+    def render(self, source_html):
+        from reportlab.platypus import BaseDocTemplate, Frame, PageTemplate
+
+        result_file = BytesIO()
+        doc = BaseDocTemplate(result_file, pagesize=self.page_size, leftMargin=self.margin,
+                              rightMargin=self.margin, topMargin=self.margin, bottomMargin=self.margin)
+        # Frame tanpa padding tambahan, biar batas teks pas di margin 2,5 cm seperti @page di PDF_STYLE
+        frame = Frame(self.margin, self.margin, self.frame_width, self.page_size[1] - 2 * self.margin,
+                      leftPadding=0, rightPadding=0, topPadding=0, bottomPadding=0)
+        doc.addPageTemplates([PageTemplate(frames=[frame])])
+        try:
+            doc.build(self.flowables(source_html))
+        except Exception:
+            # LayoutError (tata letak gak muat) atau HTML di luar subset yang dikenali: pakai jalur lama
+            return get_backend("xhtml2pdf").render(source_html)
+        return result_file.getvalue()
+
+
+BACKENDS = {backend.name: backend for backend in (Xhtml2PdfBackend, ReportlabBackend)}
+
+_instances = {}
+_lock = threading.Lock()
+
+
+def get_backend(name):
+    # Satu instance per backend per proses (gaya/CSS-nya disiapkan sekali di __init__)
+    backend = _instances.get(name)
+    if backend is None:
+        with _lock:
+            backend = _instances.get(name)
+            if backend is None:
+                if name not in BACKENDS:
+                    raise ValueError(f"Backend PDF tidak dikenal: {name} (pilihan: {', '.join(BACKENDS)})")
+                backend = _instances[name] = BACKENDS[name]()
+    return backend
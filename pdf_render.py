@@ -0,0 +1,142 @@
+import hashlib
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import metrics
+from pdf_backends import get_backend
+
+# --- FUNGSI GENERATE PDF ---
+# Mesin konversinya bisa diganti (lihat pdf_backends.py): PDF_BACKEND=xhtml2pdf (default) atau reportlab
+PDF_BACKEND = os.getenv("PDF_BACKEND", "xhtml2pdf")
+
+
+def convert_html_to_pdf(source_html, backend=None):
+    return get_backend(backend or PDF_BACKEND).render(source_html)
+
+
+# --- WORKER POOL PDF ---
+# xhtml2pdf/reportlab itu berat di CPU. Konversi dijalankan di pool terpisah (default: proses,
+# biar gak rebutan GIL dengan thread script Streamlit) dan hasilnya di-cache per hash HTML,
+# jadi HTML yang sama cukup dikonversi sekali per proses.
+
+PDF_POOL = os.getenv("PDF_POOL", "process")  # "process" atau "thread"
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(min(4, os.cpu_count() or 1))))
+JOB_CACHE_ITEMS = 32
+
+_lock = threading.Lock()
+_executor = None
+_jobs = OrderedDict()  # hash html -> Future
+_job_meta = {}  # hash html -> (waktu mulai, ukuran KB)
+_seconds_per_kb = 0.05  # perkiraan awal, diperbarui dari job yang sudah selesai
+
+
+def html_hash(source_html):
+    return hashlib.sha256(source_html.encode("utf-8")).hexdigest()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        if PDF_POOL == "process":
+            # "spawn" supaya worker gak mewarisi thread-thread server Streamlit lewat fork
+            _executor = ProcessPoolExecutor(PDF_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        else:
+            _executor = ThreadPoolExecutor(PDF_WORKERS, thread_name_prefix="pdf")
+    return _executor
+
+
+def _fallback_to_threads():
+    global _executor, PDF_POOL
+    PDF_POOL = "thread"
+    _executor = None
+    return _get_executor()
+
+
+def _convert_timed(source_html):
+    # Jalan di worker (bisa proses lain), jadi durasinya dikirim balik bareng hasilnya
+    start = time.perf_counter()
+    pdf = convert_html_to_pdf(source_html)
+    return pdf, time.perf_counter() - start
+
+
+def _on_done(key, future):
+    global _seconds_per_kb
+    with _lock:
+        meta = _job_meta.pop(key, None)
+        if future.cancelled() or future.exception() is not None:
+            # Job gagal jangan di-cache, biar percobaan berikutnya konversi ulang
+            if _jobs.get(key) is future:
+                del _jobs[key]
+            return
+        if meta:
+            started, size_kb = meta
+            rate = (time.time() - started) / max(size_kb, 1.0)
+            _seconds_per_kb = 0.8 * _seconds_per_kb + 0.2 * rate
+            metrics.observe("pdf_job", time.time() - started)
+
+
+def _unwrap(inner):
+    # Future (pdf, detik) dari worker -> Future berisi pdf saja; durasinya dicatat ke metrik
+    job = Future()
+
+    def relay(f):
+        try:
+            pdf, seconds = f.result()
+        except BaseException as e:
+            job.set_exception(e)
+            return
+        metrics.observe("pdf_convert", seconds)
+        job.set_result(pdf)
+
+    inner.add_done_callback(relay)
+    return job
+
+
+def submit_pdf(source_html) -> Future:
+    key = html_hash(source_html)
+    with _lock:
+        job = _jobs.get(key)
+        if job is not None:
+            _jobs.move_to_end(key)
+            return job
+        try:
+            inner = _get_executor().submit(_convert_timed, source_html)
+        except (BrokenProcessPool, OSError, RuntimeError):
+            inner = _fallback_to_threads().submit(_convert_timed, source_html)
+        job = _unwrap(inner)
+        _jobs[key] = job
+        _job_meta[key] = (time.time(), len(source_html) / 1024)
+        while len(_jobs) > JOB_CACHE_ITEMS:
+            old_key, _ = _jobs.popitem(last=False)
+            _job_meta.pop(old_key, None)
+    job.add_done_callback(lambda f: _on_done(key, f))
+    return job
+
+
+def estimate_progress(source_html):
+    # Progress cuma perkiraan (reportlab gak lapor progres): waktu berjalan / waktu yang diharapkan
+    key = html_hash(source_html)
+    with _lock:
+        job = _jobs.get(key)
+        meta = _job_meta.get(key)
+    if job is None or job.done() or meta is None:
+        return 1.0
+    started, size_kb = meta
+    expected = max(_seconds_per_kb * size_kb, 0.5)
+    return min(0.95, (time.time() - started) / expected)
+
+
+def get_pdf(source_html):
+    # Tunggu hasil job (atau mulai job baru). Kalau pool proses rusak, ulang sekali pakai thread.
+    try:
+        return submit_pdf(source_html).result()
+    except BrokenProcessPool:
+        with _lock:
+            _jobs.pop(html_hash(source_html), None)
+            _fallback_to_threads()
+        return submit_pdf(source_html).result()
@@ -0,0 +1,186 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+
+# --- RESILIENSI PANGGILAN EKSTERNAL ---
+# Semua panggilan ke Supabase & Gemini lewat call():
+#   - timeout per panggilan,
+#   - retry dengan exponential backoff + jitter, cuma untuk error yang memang sementara,
+#   - circuit breaker per layanan: kalau gagal beruntun, panggilan berikutnya langsung ditolak
+#     (CircuitOpenError) sampai jeda reset lewat, biar backend yang lagi susah gak makin dibanjiri.
+
+DEFAULT_RETRIES = 2
+BASE_DELAY = 0.5  # detik
+MAX_DELAY = 8.0
+FAILURE_THRESHOLD = 5
+RESET_TIMEOUT = 30.0
+
+try:
+    from google.api_core import exceptions as google_exceptions
+    _GOOGLE_RETRYABLE = (
+        google_exceptions.ResourceExhausted,
+        google_exceptions.ServiceUnavailable,
+        google_exceptions.InternalServerError,
+        google_exceptions.DeadlineExceeded,
+        google_exceptions.TooManyRequests,
+        google_exceptions.BadGateway,
+        google_exceptions.GatewayTimeout,
+    )
+except ImportError:
+    _GOOGLE_RETRYABLE = ()
+
+try:
+    import httpx
+    _HTTPX_RETRYABLE = (httpx.TransportError,)
+except ImportError:
+    _HTTPX_RETRYABLE = ()
+
+try:
+    from postgrest.exceptions import APIError as PostgrestAPIError
+except ImportError:
+    PostgrestAPIError = None
+
+RETRYABLE = (TimeoutError, ConnectionError, FutureTimeout) + _GOOGLE_RETRYABLE + _HTTPX_RETRYABLE
+# Kode PostgREST/Postgres yang artinya server (bukan request-nya) lagi bermasalah:
+# PGRST000-003 = koneksi/pool ke DB gagal (503/504), 08 = koneksi putus, 53 = resource habis, 57P = server dimatikan
+_POSTGREST_RETRYABLE_CODES = ("PGRST000", "PGRST001", "PGRST002", "PGRST003")
+_SQLSTATE_RETRYABLE_PREFIXES = ("08", "53", "57P")
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, name, retry_after):
+        self.name = name
+        self.retry_after = retry_after
+        super().__init__(f"Layanan {name} sedang gangguan, coba lagi dalam {retry_after:.0f} detik.")
+
+
+class CallTimeout(TimeoutError):
+    pass
+
+
+def _postgrest_retryable(error):
+    # APIError Supabase gak membawa status HTTP sendiri: kalau body-nya bukan JSON (misal 503/429 dari gateway),
+    # `code` berisi status HTTP-nya; kalau JSON, `code` berisi kode PostgREST/SQLSTATE
+    code = str(error.code or "").strip()
+    if code.isdigit() and len(code) == 3:
+        return int(code) == 429 or int(code) >= 500
+    return code in _POSTGREST_RETRYABLE_CODES or code.startswith(_SQLSTATE_RETRYABLE_PREFIXES)
+
+
+def is_retryable(error):
+    if PostgrestAPIError is not None and isinstance(error, PostgrestAPIError):
+        return _postgrest_retryable(error)
+    return isinstance(error, RETRYABLE)
+
+
+class CircuitBreaker:
+    # closed -> (gagal >= threshold) -> open -> (lewat reset_timeout) -> half-open -> 1 percobaan
+    def __init__(self, name, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def before_call(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return
+            if state == "half-open" and not self._trial_running:
+                self._trial_running = True
+                return
+            retry_after = max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+            raise CircuitOpenError(self.name, retry_after or 1.0)
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_neutral(self):
+        # Panggilan gagal karena request-nya sendiri (data salah, dsb): bukan bukti layanan sehat atau down,
+        # jadi hitungan gagal gak diubah; cuma jatah percobaan half-open yang dilepas
+        with self._lock:
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_running or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._trial_running = False
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+_timeout_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="timeout")
+
+
+def get_breaker(name):
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name)
+        return _breakers[name]
+
+
+def backoff_delay(attempt, base=BASE_DELAY, cap=MAX_DELAY):
+    # "Full jitter": acak antara 0 dan base * 2^attempt, biar klien yang gagal bareng gak retry barengan
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def _run_with_timeout(fn, args, kwargs, timeout):
+    if timeout is None:
+        return fn(*args, **kwargs)
+    future = _timeout_pool.submit(fn, *args, **kwargs)
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeout:
+        raise CallTimeout(f"Panggilan melebihi batas waktu {timeout:g} detik.")
+
+
+def call(name, fn, *args, timeout=None, retries=DEFAULT_RETRIES, retry_if=None, sleep=time.sleep, **kwargs):
+    # retries=0 untuk operasi yang gak aman diulang (misal INSERT tanpa kunci unik)
+    breaker = get_breaker(name)
+    should_retry = retry_if or is_retryable
+    attempt = 0
+    while True:
+        breaker.before_call()
+        try:
+            result = _run_with_timeout(fn, args, kwargs, timeout)
+        except Exception as e:
+            if not is_retryable(e):
+                # Error dari sisi request (data salah, dsb) bukan tanda layanan down maupun sehat
+                breaker.record_neutral()
+                raise
+            breaker.record_failure()
+            if attempt >= retries or not should_retry(e):
+                raise
+            sleep(backoff_delay(attempt))
+            attempt += 1
+            continue
+        breaker.record_success()
+        return result
+
+
+def friendly_message(error):
+    # Pesan yang ditampilkan ke guru; detail teknis cukup di log
+    if isinstance(error, CircuitOpenError):
+        return (f"⏳ Layanan {error.name} sedang sibuk/gangguan. Permintaan Anda belum dikirim, "
+                f"silakan coba lagi dalam ±{error.retry_after:.0f} detik.")
+    if is_retryable(error):
+        return "⏳ Layanan sedang sibuk dan belum merespons setelah beberapa kali dicoba. Silakan coba lagi sebentar lagi."
+    return str(error)
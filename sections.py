@@ -0,0 +1,390 @@
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from html import escape
+
+import checkpoints
+import cp_catalog
+import metrics
+import resilience
+import token_usage
+from clients import GEMINI_TIMEOUT
+from stream_render import strip_fences
+
+# --- GENERATOR PER BAGIAN ---
+# Bagian yang isinya sudah pasti (identitas, Profil Pancasila, sarana, model pembelajaran, CP dari
+# katalog, daftar pustaka) dirender lokal dari template. Cuma bagian kreatif yang dikirim ke Gemini, masing-masing
+# sebagai request kecil yang jalan paralel, lalu disusun lagi sesuai urutan modul.
+#
+# Hasil plan_sections() = list bagian berurutan:
+#   ("fixed", html)                          -> langsung tampil
+#   ("ai", nama_slot, prompt, (awal, akhir)) -> diisi Gemini; awal/akhir = HTML tetap yang membungkus
+#                                               hasilnya (misal baris tabel di sekitar satu sel)
+
+SECTION_WORKERS = 6
+CANCEL_WAIT = 10  # detik; lama nunggu stream slot berhenti setelah dibatalkan, sebelum antrean dilepas
+
+
+class Cancelled(Exception):
+    # Slot dihentikan karena pemanggil sudah berhenti membaca (error di slot lain, sesi ditutup, dst.)
+    pass
+
+
+def _fields(spec, *names):
+    # Isian form/CSV di-escape dulu sebelum masuk template HTML: nama sekolah "SMA A&B" atau topik
+    # berisi "<" jangan sampai merusak tabel (atau menyisipkan markup) di modul & PDF-nya
+    return [escape(str(spec[name])) for name in names]
+
+
+def _fixed_header(spec):
+    penyusun, instansi, jenjang, kelas = _fields(spec, "penyusun", "instansi", "jenjang", "kelas")
+    fase, alokasi, elemen_pilih = _fields(spec, "fase", "alokasi", "elemen_pilih")
+    return f"""<h2>MODUL AJAR: {escape(spec["topik"].upper())}</h2>
+<hr>
+<h3>I. INFORMASI UMUM</h3>
+<p><strong>A. IDENTITAS MODUL</strong></p>
+<table>
+    <tr><th width="30%">Informasi</th><th>Keterangan</th></tr>
+    <tr><td>Penyusun</td><td>{penyusun}</td></tr>
+    <tr><td>Instansi</td><td>{instansi}</td></tr>
+    <tr><td>Jenjang / Kelas</td><td>{jenjang} / {kelas} (Fase {fase})</td></tr>
+    <tr><td>Alokasi Waktu</td><td>{alokasi}</td></tr>
+    <tr><td>Mata Pelajaran</td><td>Bahasa Inggris</td></tr>
+    <tr><td>Elemen</td><td>{elemen_pilih}</td></tr>
+</table>
+
+<p><strong>B. KOMPETENSI AWAL</strong></p>
+"""
+
+
+def _fixed_profil(spec):
+    topik, metode, ppp_value = _fields(spec, "topik", "metode", "ppp_value")
+    return f"""
+<p><strong>C. PROFIL PELAJAR PANCASILA</strong></p>
+<p>{ppp_value}</p>
+
+<p><strong>D. SARANA DAN PRASARANA</strong></p>
+<ul><li>Laptop/Smartphone</li><li>Jaringan Internet</li><li>Materi {topik}</li></ul>
+
+<p><strong>E. MODEL PEMBELAJARAN</strong></p>
+<p>Tatap Muka dengan metode <strong>{metode}</strong>.</p>
+
+<h3>II. KOMPONEN INTI</h3>
+<p><strong>A. TUJUAN PEMBELAJARAN</strong></p>
+"""
+
+
+def _fixed_cp(cp_content):
+    return f"<p>1. <strong>Capaian Pembelajaran (CP):</strong> {cp_content}</p>\n"
+
+
+FIXED_KEGIATAN = "\n<p><strong>C. KEGIATAN PEMBELAJARAN</strong></p>\n"
+FIXED_LAMPIRAN = "\n<h3>III. LAMPIRAN</h3>\n<p><strong>A. ASESMEN / PENILAIAN</strong></p>\n"
+FIXED_LKPD = "\n<p><strong>B. LEMBAR KERJA PESERTA DIDIK (LKPD)</strong></p>\n"
+
+
+def _fixed_pustaka(spec):
+    fase, topik = _fields(spec, "fase", "topik")
+    return f"""
+<p><strong>D. DAFTAR PUSTAKA</strong></p>
+<ul>
+    <li>Kementerian Pendidikan dan Kebudayaan. (2025). <em>Buku Guru Bahasa Inggris Fase {fase}</em>. Jakarta: Kemendikbud.</li>
+    <li>Sumber internet relevan tentang {topik}.</li>
+</ul>
+"""
+
+
+def _section_prompt(spec, template):
+    # Cuma bagian yang berubah per request; peran & aturan format ada di SYSTEM_INSTRUCTION (modul_ajar.py)
+    return f"""**DATA:**
+Jenjang: {spec["jenjang"]} | Kelas: {spec["kelas"]} | Fase: {spec["fase"]} | Alokasi Waktu: {spec["alokasi"]}
+Topik: {spec["topik"]} | Metode: {spec["metode"]} | Profil Pancasila: {spec["ppp_value"]} | Elemen: {spec["elemen_pilih"]}
+
+**BAGIAN YANG HARUS DITULIS:**
+{template}
+"""
+
+
+def _resume_prompt(prompt, done_html):
+    # Lanjutan dari checkpoint: Gemini cukup menulis sisa bagian setelah teks yang sudah tersimpan
+    return f"""{prompt}
+**SUDAH DITULIS (jangan diulang):**
+{done_html}
+
+Lanjutkan TEPAT setelah teks yang sudah ditulis di atas. Tulis HANYA lanjutannya.
+"""
+
+
+def _slot_kompetensi(spec):
+    return "<p>(1 Paragraf singkat kompetensi awal yang perlu dimiliki peserta didik)</p>"
+
+
+def _slot_cp(spec):
+    # CP yang belum ada di katalog. Hasilnya disimpan cp_catalog, jadi tiap (fase, elemen) cukup sekali.
+    fase, elemen_pilih = _fields(spec, "fase", "elemen_pilih")
+    return (f"<p>1. <strong>Capaian Pembelajaran (CP):</strong> (Tulis CP Kurikulum Merdeka mata pelajaran "
+            f"Bahasa Inggris untuk Fase {fase}, Elemen {elemen_pilih}, dalam satu paragraf yang diawali "
+            f"\"Pada akhir Fase {fase}, peserta didik ...\". Jangan sebut topik atau metode tertentu.)</p>")
+
+
+def _slot_tujuan(spec):
+    return """<p>2. <strong>Tujuan Pembelajaran (TP):</strong> (Poin ABCD)</p>
+
+<p><strong>B. PEMAHAMAN BERMAKNA</strong></p>
+<p>(Manfaat mempelajari topik ini)</p>"""
+
+
+def _kegiatan_frame(spec):
+    # Baris Pendahuluan & Penutup selalu sama, jadi dirender lokal; Gemini cuma mengisi sel Inti
+    topik = escape(spec["topik"])
+    before = f"""<table>
+    <tr><th width="15%">Tahap</th><th width="70%">Deskripsi Kegiatan</th><th width="15%">Waktu</th></tr>
+    <tr>
+        <td><strong>Pendahuluan</strong></td>
+        <td><ul><li>Salam & Doa</li><li>Apersepsi: Guru menampilkan gambar <i>(misal: "{topik}")</i></li><li>Pertanyaan Pemantik</li></ul></td>
+        <td>10'</td>
+    </tr>
+    <tr>
+        <td><strong>Inti</strong></td>
+        <td>"""
+    after = """</td>
+        <td>70'</td>
+    </tr>
+    <tr>
+        <td><strong>Penutup</strong></td>
+        <td><ul><li>Refleksi</li><li>Kesimpulan</li><li>Doa</li></ul></td>
+        <td>10'</td>
+    </tr>
+</table>"""
+    return before, after
+
+
+def _slot_kegiatan(spec):
+    metode = escape(spec["metode"])
+    return (f"Isi sel \"Inti\" tabel kegiatan pembelajaran (70 menit): rincikan langkah {metode} disini. "
+            f"Gunakan tag <i> untuk bahasa inggris. Gunakan <ul><li> untuk poin. Tulis HANYA isi selnya "
+            f"(tanpa <table>, <tr>, atau <td>).")
+
+
+def _slot_asesmen(spec):
+    aspek_sikap = escape(spec["ppp_value"].split('&')[0])
+    return f"""<p><strong>1. Penilaian Sikap</strong></p>
+<table>
+    <tr><th width="20%">Aspek</th><th width="20%">Skor 4 (Sangat Baik)</th><th width="20%">Skor 3 (Baik)</th><th width="20%">Skor 2 (Cukup)</th><th width="20%">Skor 1 (Kurang)</th></tr>
+    <tr>
+        <td>{aspek_sikap}</td>
+        <td>Sangat aktif...</td>
+        <td>Aktif...</td>
+        <td>Cukup aktif...</td>
+        <td>Kurang aktif...</td>
+    </tr>
+</table>
+
+<p><strong>2. Penilaian Keterampilan</strong></p>
+<table>
+    <tr><th width="30%">Aspek</th><th width="70%">Indikator (Skor 4-1)</th></tr>
+    <tr>
+        <td>Konten</td>
+        <td>(Deskripsi indikator penilaian)</td>
+    </tr>
+</table>"""
+
+
+def _slot_lkpd(spec):
+    topik = escape(spec["topik"])
+    return f"""<p><strong>Activity 1: {topik} Exploration</strong></p>
+<table>
+    <tr><th width="10%">No</th><th width="50%">Question / Instruction</th><th width="40%">Answer Space</th></tr>
+    <tr><td>1</td><td>(Buatkan pertanyaan pemahaman terkait {topik})</td><td>...</td></tr>
+    <tr><td>2</td><td>(Buatkan pertanyaan analisis)</td><td>...</td></tr>
+</table>
+
+<p><strong>C. GLOSARIUM</strong></p>
+<ul><li>(Istilah 1)</li><li>(Istilah 2)</li></ul>"""
+
+
+AI_SLOTS = ("kompetensi", "tujuan", "kegiatan", "asesmen", "lkpd")  # slot AI tetap; "cp" cuma kalau CP belum ada
+
+
+def ai_slot_count(spec):
+    # Jumlah request Gemini untuk modul ini, tanpa mengklaim apa-apa (buat biaya antrean sebelum plan_sections).
+    # Bisa lebih satu dari kenyataan kalau CP-nya keburu dibuat sesi lain, gak pernah kurang.
+    return len(AI_SLOTS) + (0 if cp_catalog.get_cp_text(spec["fase"], spec["elemen_pilih"]) else 1)
+
+
+def plan_sections(spec, on_cp_wait=None):
+    # on_cp_wait(detik): dipanggil selama menunggu CP yang sedang dibuat sesi lain (lihat cp_catalog.py).
+    # Waktu tunggunya tercatat sendiri (cp_wait), gak ikut prompt_assembly.
+    cp_content, need_cp = cp_catalog.resolve(spec["fase"], spec["elemen_pilih"], on_wait=on_cp_wait)
+    with metrics.timer("prompt_assembly"):
+        return _plan_sections(spec, cp_content, need_cp)
+
+
+def _plan_sections(spec, cp_content, need_cp):
+    def ai(slot, template, frame=("", "")):
+        return ("ai", slot, _section_prompt(spec, template), frame)
+
+    parts = [
+        ("fixed", _fixed_header(spec)),
+        ai("kompetensi", _slot_kompetensi(spec)),
+        ("fixed", _fixed_profil(spec)),
+    ]
+    if need_cp:
+        parts.append(ai("cp", _slot_cp(spec)))
+    else:
+        parts.append(("fixed", _fixed_cp(cp_content)))
+    parts += [
+        ai("tujuan", _slot_tujuan(spec)),
+        ("fixed", FIXED_KEGIATAN),
+        ai("kegiatan", _slot_kegiatan(spec), _kegiatan_frame(spec)),
+        ("fixed", FIXED_LAMPIRAN),
+        ai("asesmen", _slot_asesmen(spec)),
+        ("fixed", FIXED_LKPD),
+        ai("lkpd", _slot_lkpd(spec)),
+        ("fixed", _fixed_pustaka(spec)),
+    ]
+    return parts
+
+
+def stream_sections(model, parts, workers=SECTION_WORKERS, usage=None, checkpoint_key=None, before_request=None,
+                    on_retry=None):
+    # Semua slot AI dijalankan paralel. Yield (index bagian, potongan teks) sesuai urutan datangnya,
+    # lalu (index, None) kalau slot itu selesai. Error di salah satu slot langsung dilempar ke pemanggil.
+    # Kalau `usage` (dict) diberikan, jumlah token tiap slot diisi ke situ: nama slot -> hitungan token
+    # (termasuk percobaan yang gagal/dibatalkan, jadi tetap diisi walau generator berakhir dengan error).
+    # Kalau `checkpoint_key` (biasanya module_key) diberikan, output tiap slot di-checkpoint per bagian
+    # dan percobaan berikutnya melanjutkan dari situ (lihat checkpoints.py).
+    # before_request() dipanggil tepat sebelum tiap request Gemini (termasuk retry), misal buat rate limiter.
+    # on_retry() cuma dipanggil sebelum percobaan ulang, misal admission.take() biar retry ikut bayar token.
+    # Begitu pemanggil berhenti (selesai, error, atau generator ditutup), slot yang masih jalan dibatalkan
+    # di chunk berikutnya dan ditunggu berhenti dulu: jadi gak ada stream sisa yang masih makan jatah
+    # antrean Gemini atau menimpa checkpoint percobaan berikutnya.
+    events = queue.Queue()
+    cancelled = threading.Event()
+    saved = checkpoints.load(checkpoint_key) if checkpoint_key else {}
+
+    def run(index, prompt):
+        emitted = []
+        slot = parts[index][1]
+        done, complete = saved.get(slot, ("", False))
+        if complete:
+            metrics.incr("checkpoint_reused")
+            events.put((index, done))
+            events.put((index, None))
+            return
+        if done:
+            # Bagian yang sudah utuh langsung tampil; gak dihitung "emitted" karena retry tetap aman
+            metrics.incr("checkpoint_resumed")
+            events.put((index, done))
+            prompt = _resume_prompt(prompt, done)
+        checkpoint = checkpoints.SlotCheckpoint(checkpoint_key, slot, done) if checkpoint_key else None
+
+        attempts = []
+
+        def attempt():
+            if attempts and on_retry:
+                on_retry()
+            attempts.append(True)
+            if before_request:
+                before_request()
+            start = time.perf_counter()
+            usage_metadata = None
+            try:
+                for chunk in model.generate_content(prompt, stream=True, request_options={"timeout": GEMINI_TIMEOUT}):
+                    if cancelled.is_set():
+                        raise Cancelled(slot)
+                    if not emitted:
+                        metrics.observe("gemini_first_chunk", time.perf_counter() - start, slot=slot)
+                    emitted.append(True)
+                    # Hitungan token lengkap ada di chunk terakhir
+                    usage_metadata = getattr(chunk, "usage_metadata", None) or usage_metadata
+                    events.put((index, chunk.text))
+                    if checkpoint:
+                        checkpoint.feed(chunk.text)
+                metrics.observe("gemini_stream", time.perf_counter() - start, slot=slot)
+                if checkpoint:
+                    checkpoint.finish()
+            finally:
+                # Percobaan yang batal, error, atau timeout di tengah stream tetap sudah makan token:
+                # hitungan terakhir yang sempat terbaca ikut dicatat, dan retry slot yang sama dijumlahkan
+                counts = token_usage.from_metadata(usage_metadata)
+                if counts:
+                    token_usage.count(counts)
+                    if usage is not None:
+                        usage[slot] = token_usage.add(usage.get(slot), counts)
+
+        try:
+            # Retry cuma aman selama belum ada potongan yang terkirim ke layar
+            resilience.call("Gemini", attempt, retry_if=lambda e: not emitted and not cancelled.is_set()
+                            and resilience.is_retryable(e))
+            events.put((index, None))
+        except Cancelled:
+            metrics.incr("section_cancelled")
+        except Exception as e:
+            metrics.incr("circuit_open" if isinstance(e, resilience.CircuitOpenError) else "gemini_error")
+            events.put((index, e))
+
+    ai_parts = [(i, part[2]) for i, part in enumerate(parts) if part[0] == "ai"]
+    pool = ThreadPoolExecutor(max_workers=max(1, min(workers, len(ai_parts) or 1)), thread_name_prefix="section")
+    futures = []
+    try:
+        for index, prompt in ai_parts:
+            futures.append(pool.submit(run, index, prompt))
+        remaining = len(ai_parts)
+        while remaining:
+            index, item = events.get()
+            if isinstance(item, Exception):
+                raise item
+            if item is None:
+                remaining -= 1
+            yield index, item
+    finally:
+        cancelled.set()
+        pool.shutdown(wait=False, cancel_futures=True)
+        wait(futures, timeout=CANCEL_WAIT)
+
+
+def framed(part, text):
+    # HTML satu bagian AI lengkap dengan pembungkus tetapnya
+    before, after = part[3]
+    return f"{before}{text}{after}"
+
+
+def assemble(parts, texts):
+    # texts: index bagian AI -> HTML hasil Gemini (sudah bersih dari ```)
+    return "".join(part[1] if part[0] == "fixed" else framed(part, texts.get(i, "")) for i, part in enumerate(parts))
+
+
+def complete(spec, parts, texts):
+    # Susun modul final + simpan CP hasil AI (kalau tadi ada slot "cp") ke katalog
+    for i, part in enumerate(parts):
+        if part[0] == "ai" and part[1] == "cp":
+            cp_catalog.save_generated(spec["fase"], spec["elemen_pilih"], texts.get(i, ""))
+    return assemble(parts, texts)
+
+
+def abort(spec, parts):
+    # Generate gagal: lepas klaim CP supaya sesi lain gak perlu nunggu
+    if any(part[0] == "ai" and part[1] == "cp" for part in parts):
+        cp_catalog.release(spec["fase"], spec["elemen_pilih"])
+
+
+def generate_html(model, spec, workers=SECTION_WORKERS, usage=None, checkpoint_key=None, before_request=None,
+                  on_retry=None):
+    parts = plan_sections(spec)
+    chunks = {}
+    try:
+        for index, text in stream_sections(model, parts, workers, usage, checkpoint_key, before_request, on_retry):
+            if text is not None:
+                chunks.setdefault(index, []).append(text)
+    except BaseException:
+        # Termasuk KeyboardInterrupt dsb.: klaim CP jangan sampai tertahan heartbeat
+        abort(spec, parts)
+        raise
+    with metrics.timer("fence_strip"):
+        texts = {i: strip_fences("".join(c)) for i, c in chunks.items()}
+    html = complete(spec, parts, texts)
+    if checkpoint_key:
+        checkpoints.clear(checkpoint_key)
+    return html
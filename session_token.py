@@ -0,0 +1,103 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import time
+
+from storage import connect_sqlite
+
+# --- TOKEN SESI (STATELESS) ---
+# Status login gak cuma disimpan di st.session_state satu proses. Waktu login dibuat token:
+#   base64url(JSON {"e": email, "g": generasi, "iat": dibuat, "exp": kedaluwarsa}) + "." + base64url(HMAC-SHA256)
+# lalu ditaruh di URL (?sesi=...). Tiap rerun, replika mana pun yang punya SESSION_SECRET yang sama cukup
+# mengecek tanda tangan & masa berlakunya (tanpa query Supabase). Jadi load balancer gak perlu
+# sticky session, dan replika boleh di-restart tanpa semua guru ter-logout.
+#
+# Token di URL = kredensial pembawa, jadi:
+#   - masa berlakunya pendek (default 12 jam, diperpanjang otomatis selama app dipakai),
+#   - tiap guru punya "generasi" di state bersama; logout menaikkan generasinya, dan token dengan
+#     generasi lama langsung ditolak di semua replika (logout di satu tab = logout di mana-mana).
+
+SESSION_TTL = int(os.getenv("SESSION_TTL", str(12 * 60 * 60)))  # detik, default 12 jam
+REFRESH_AFTER = 0.5  # token diperbarui kalau umurnya sudah lewat separuh TTL
+QUERY_PARAM = "sesi"
+DB_NAME = "sessions.sqlite3"
+
+with connect_sqlite(DB_NAME) as _conn:
+    _conn.execute("""
+        CREATE TABLE IF NOT EXISTS session_generations (
+            email TEXT PRIMARY KEY,
+            generation INTEGER NOT NULL
+        )""")
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _sign(payload, secret):
+    return hmac.new(secret, payload.encode("ascii"), hashlib.sha256).digest()
+
+
+def derive_secret(value):
+    # Kunci HMAC dari SESSION_SECRET (harus sama di semua replika)
+    return hashlib.sha256(b"modul-cerdas/sesi/" + value.encode("utf-8")).digest()
+
+
+def _normalize(email):
+    return (email or "").strip().lower()
+
+
+def generation(email):
+    with connect_sqlite(DB_NAME) as conn:
+        row = conn.execute("SELECT generation FROM session_generations WHERE email = ?",
+                           (_normalize(email),)).fetchone()
+    return row[0] if row else 0
+
+
+def revoke(email):
+    # Semua token milik guru ini (di semua tab/replika) jadi gak berlaku
+    with connect_sqlite(DB_NAME) as conn:
+        conn.execute(
+            "INSERT INTO session_generations (email, generation) VALUES (?, 1) "
+            "ON CONFLICT(email) DO UPDATE SET generation = generation + 1",
+            (_normalize(email),),
+        )
+
+
+def issue(email, secret, ttl=SESSION_TTL, now=None):
+    now = int(now if now is not None else time.time())
+    claims = {"e": email, "g": generation(email), "iat": now, "exp": now + ttl}
+    payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode("utf-8"))
+    return f"{payload}.{_b64encode(_sign(payload, secret))}"
+
+
+def verify(token, secret, now=None):
+    # Hasil: dict klaim ({"e", "g", "iat", "exp"}) kalau token sah, belum kedaluwarsa & belum dicabut, selain itu None
+    if not token or token.count(".") != 1:
+        return None
+    payload, signature = token.split(".")
+    try:
+        valid = hmac.compare_digest(_b64decode(signature), _sign(payload, secret))
+        claims = json.loads(_b64decode(payload)) if valid else None
+    except (ValueError, UnicodeError):
+        return None
+    if not isinstance(claims, dict) or not claims.get("e"):
+        return None
+    now = now if now is not None else time.time()
+    if not isinstance(claims.get("exp"), int) or claims["exp"] <= now:
+        return None
+    if claims.get("g") != generation(claims["e"]):
+        return None  # sudah logout / dicabut
+    return claims
+
+
+def needs_refresh(claims, now=None):
+    now = now if now is not None else time.time()
+    lifetime = claims["exp"] - claims.get("iat", claims["exp"])
+    return now - claims.get("iat", now) > lifetime * REFRESH_AFTER
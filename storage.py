@@ -0,0 +1,90 @@
+import importlib
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# --- PENYIMPANAN LOKAL ---
+# Semua cache/data lokal ditaruh di satu folder (default: .cache di samping app.py).
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.getenv("MODUL_CERDAS_CACHE_DIR", os.path.join(BASE_DIR, ".cache"))
+
+
+def cache_path(*parts):
+    path = os.path.join(CACHE_DIR, *parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+
+# --- BACKEND STATE BERSAMA ---
+# State yang harus sama di semua proses/replika (cache modul, katalog CP, antrean Gemini, catatan token)
+# selalu dibuka lewat connect_sqlite(nama), bukan langsung ke sqlite3. Backend-nya dipilih lewat env
+# STATE_BACKEND, jadi bisa diganti tanpa mengubah modul pemakainya:
+#   - "sqlite" (default): satu file SQLite per nama di MODUL_CERDAS_STATE_DIR. Beberapa replika di satu
+#     mesin / volume yang sama cukup diarahkan ke folder yang sama (WAL + BEGIN IMMEDIATE sudah aman
+#     dipakai bareng banyak proses).
+#   - backend lain: isi STATE_BACKEND dengan "paket.modul:Kelas" (di-import otomatis), atau daftarkan
+#     lewat register_backend(nama, kelas) sebelum modul app di-import. Syaratnya: connect(nama) berupa
+#     context manager yang menghasilkan koneksi DB-API berdialek SQLite (misal klien libSQL/rqlite),
+#     commit kalau blok sukses, rollback kalau error.
+STATE_BACKEND = os.getenv("STATE_BACKEND", "sqlite")
+STATE_DIR = os.getenv("MODUL_CERDAS_STATE_DIR", CACHE_DIR)
+
+
+class SqliteState:
+    name = "sqlite"
+
+    def __init__(self, directory=None):
+        self.directory = directory or STATE_DIR
+
+    def path(self, name):
+        os.makedirs(self.directory, exist_ok=True)
+        return os.path.join(self.directory, name)
+
+    @contextmanager
+    def connect(self, name):
+        # Satu koneksi per pemanggilan: murah untuk SQLite dan aman dipakai dari banyak thread/proses.
+        # Commit otomatis kalau blok selesai tanpa error, lalu koneksi langsung ditutup.
+        conn = sqlite3.connect(self.path(name), timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+
+BACKENDS = {SqliteState.name: SqliteState}
+
+_state = None
+_state_lock = threading.Lock()
+
+
+def register_backend(name, factory):
+    BACKENDS[name] = factory
+
+
+def _load_backend(name):
+    if name in BACKENDS:
+        return BACKENDS[name]
+    if ":" in name:
+        module_name, _, attr = name.partition(":")
+        return getattr(importlib.import_module(module_name), attr)
+    raise ValueError(f"Backend state tidak dikenal: {name} (pilihan: {', '.join(BACKENDS)} atau paket.modul:Kelas)")
+
+
+def get_state():
+    global _state
+    if _state is None:
+        with _state_lock:
+            if _state is None:
+                _state = _load_backend(STATE_BACKEND)()
+    return _state
+
+
+@contextmanager
+def connect_sqlite(name):
+    with get_state().connect(name) as conn:
+        yield conn
@@ -0,0 +1,153 @@
+import re
+import time
+
+import metrics
+
+# --- RENDER STREAMING GEMINI ---
+# Dulu tiap chunk: full_text += chunk, replace ``` di seluruh buffer, lalu kirim ulang seluruh dokumen.
+# Itu kuadratik terhadap panjang output. Di sini:
+#   - pagar kode dibuang per chunk (cuma ekor pendek yang ditahan kalau penandanya kepotong),
+#   - tampilan di-update berdasarkan anggaran waktu & byte, bukan tiap chunk,
+#   - bagian yang sudah selesai (dipotong di judul <h3>/<p><strong>) "dibekukan" di elemennya
+#     sendiri, jadi tiap update cuma mengirim ulang bagian yang sedang ditulis.
+
+SECTION_START = re.compile(r"<h3|<p><strong>")
+BALANCED_TAGS = ("table", "ul", "ol")
+
+
+class Replacer:
+    # Versi inkremental dari text.replace(old, new) untuk teks yang datang sepotong-sepotong
+    def __init__(self, old, new=""):
+        self.old = old
+        self.new = new
+        self._pending = ""
+
+    def feed(self, text):
+        buf = self._pending + text
+        out = []
+        start = 0
+        while True:
+            i = buf.find(self.old, start)
+            if i == -1:
+                break
+            out.append(buf[start:i])
+            out.append(self.new)
+            start = i + len(self.old)
+        # Tahan ekor yang masih mungkin jadi awal penanda di chunk berikutnya
+        hold = len(buf)
+        for p in range(max(start, len(buf) - len(self.old) + 1), len(buf)):
+            if self.old.startswith(buf[p:]):
+                hold = p
+                break
+        out.append(buf[start:hold])
+        self._pending = buf[hold:]
+        return "".join(out)
+
+    def flush(self):
+        rest, self._pending = self._pending, ""
+        return rest
+
+
+class FenceStripper:
+    # Sama persis dengan text.replace("```html", "").replace("```", ""), tapi per chunk
+    def __init__(self):
+        self._stages = [Replacer("```html"), Replacer("```")]
+
+    def feed(self, text):
+        for stage in self._stages:
+            text = stage.feed(text)
+        return text
+
+    def flush(self):
+        text = ""
+        for stage in self._stages:
+            text = stage.feed(text) + stage.flush()
+        return text
+
+
+def strip_fences(text):
+    stripper = FenceStripper()
+    return stripper.feed(text) + stripper.flush()
+
+
+def _is_balanced(html):
+    return all(html.count(f"<{tag}") == html.count(f"</{tag}>") for tag in BALANCED_TAGS)
+
+
+def completed_cut(html, start=1):
+    # Awal bagian terakhir yang semua isi sebelumnya sudah utuh (tag tabel/list tertutup semua).
+    # Teks sebelum posisi ini gak akan berubah lagi; 0 kalau belum ada bagian yang selesai.
+    cut = 0
+    for match in SECTION_START.finditer(html, start):
+        if _is_balanced(html[:match.start()]):
+            cut = match.start()
+    return cut
+
+
+class StreamRenderer:
+    # frame=(awal, akhir): HTML tetap yang membungkus teks slot (misal sel tabel). Bagian yang dibungkus
+    # selalu dirender utuh dalam satu elemen, gak dibekukan per bagian, biar tabelnya gak terpotong.
+    def __init__(self, container, interval=0.3, burst_bytes=8192, cursor="▌", clock=time.monotonic, frame=("", "")):
+        self.container = container
+        self.frame = frame
+        self.interval = interval
+        self.burst_bytes = burst_bytes
+        self.cursor = cursor
+        self.clock = clock
+        self.pushes = 0
+        self.bytes_sent = 0
+        self._stripper = FenceStripper()
+        self._frozen = []  # potongan yang sudah final
+        self._active = ""  # bagian yang sedang ditulis (yang dikirim ulang tiap update)
+        self._placeholder = None
+        self._pending_parts = []
+        self._pending_bytes = 0
+        self._last_push = clock()
+        self._strip_seconds = 0.0
+
+    def write(self, chunk_text):
+        start = time.perf_counter()
+        clean = self._stripper.feed(chunk_text)
+        self._strip_seconds += time.perf_counter() - start
+        if not clean:
+            return
+        self._pending_parts.append(clean)
+        self._pending_bytes += len(clean)
+        if self._pending_bytes >= self.burst_bytes or self.clock() - self._last_push >= self.interval:
+            self._push(self.cursor)
+
+    def _render(self, text):
+        if self._placeholder is None:
+            self._placeholder = self.container.empty()
+        self._placeholder.markdown(f"{self.frame[0]}{text}{self.frame[1]}", unsafe_allow_html=True)
+        self.pushes += 1
+        self.bytes_sent += len(text)
+
+    def _freeze_completed(self):
+        if any(self.frame):
+            return
+        cut = completed_cut(self._active)
+        if cut:
+            done, self._active = self._active[:cut], self._active[cut:]
+            self._frozen.append(done)
+            self._render(done)
+            self._placeholder = None
+
+    def _push(self, suffix=""):
+        if self._pending_parts:
+            self._active += "".join(self._pending_parts)
+            self._pending_parts = []
+            self._pending_bytes = 0
+            self._freeze_completed()
+        self._render(self._active + suffix)
+        self._last_push = self.clock()
+
+    def finish(self):
+        tail = self._stripper.flush()
+        metrics.observe("fence_strip", self._strip_seconds)
+        if tail:
+            self._pending_parts.append(tail)
+        self._push()
+        self._frozen.append(self._active)
+        self._active = ""
+        return "".join(self._frozen)
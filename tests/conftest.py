@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+
+# State lokal (SQLite) tiap run test ditaruh di folder sementara, bukan di .cache milik app.
+# Harus di-set sebelum modul app mana pun di-import.
+os.environ["MODUL_CERDAS_CACHE_DIR"] = tempfile.mkdtemp(prefix="modul-cerdas-test-")
+os.environ.pop("MODUL_CERDAS_STATE_DIR", None)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
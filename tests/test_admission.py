@@ -0,0 +1,93 @@
+import pytest
+
+import admission
+from admission import AdmissionTimeout, Limits
+from storage import connect_sqlite
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(admission.time, "time", clock)
+    monkeypatch.setattr(admission.time, "monotonic", clock)
+    return clock
+
+
+@pytest.fixture(autouse=True)
+def empty_queue():
+    with connect_sqlite(admission.DB_NAME) as conn:
+        conn.execute("DELETE FROM tickets")
+        conn.execute("DELETE FROM buckets")
+    yield
+
+
+def tokens_left():
+    with connect_sqlite(admission.DB_NAME) as conn:
+        return conn.execute("SELECT tokens FROM buckets WHERE name = ?", (admission.BUCKET,)).fetchone()[0]
+
+
+# --- TOKEN RETRY (take) ---
+
+def test_take_spends_tokens_from_shared_bucket(clock):
+    limits = Limits(rpm=60, burst=10)
+    admission.take(3, limits=limits, sleep=clock.sleep)
+    assert tokens_left() == 7
+
+
+def test_take_waits_for_refill_when_bucket_empty(clock):
+    limits = Limits(rpm=60, burst=2)  # 1 token per detik
+    admission.take(2, limits=limits, sleep=clock.sleep)
+    start = clock.now
+    admission.take(1, limits=limits, sleep=clock.sleep)
+    assert clock.now - start == pytest.approx(1.0)
+
+
+def test_take_times_out(clock):
+    limits = Limits(rpm=0.6, burst=1)  # 1 token per 100 detik
+    admission.take(1, limits=limits, sleep=clock.sleep)
+    with pytest.raises(AdmissionTimeout):
+        admission.take(1, limits=limits, max_wait=5, sleep=clock.sleep)
+
+
+def test_retry_pays_token_inside_admitted_module(clock):
+    limits = Limits(rpm=60, burst=10)
+    with admission.admitted("guru@sekolah.id", 6, limits=limits, sleep=clock.sleep):
+        admission.take(limits=limits, sleep=clock.sleep)
+    assert tokens_left() == 3
+
+
+# --- BATAS PER GURU DI TIKET ---
+
+def test_ticket_counted_ahead_by_its_own_per_user_cap(clock):
+    # Batch guru A boleh 3 paralel: tiket keduanya masih bersaing walau A sudah jalan 1,
+    # jadi guru B (batas 1) tetap antre di belakangnya.
+    batch = Limits(rpm=60, burst=100, max_active=10, per_user=3)
+    interactive = Limits(rpm=60, burst=100, max_active=10, per_user=1)
+    running = admission._enqueue("a@sekolah.id", 1, batch.per_user)
+    assert admission._try_admit(running, "a@sekolah.id", 1, batch)[0]
+    waiting = admission._enqueue("a@sekolah.id", 1, batch.per_user)
+    other = admission._enqueue("b@sekolah.id", 1, interactive.per_user)
+
+    admitted, position, _ = admission._try_admit(other, "b@sekolah.id", 1, interactive)
+    assert not admitted and position == 2
+    assert admission._try_admit(waiting, "a@sekolah.id", 1, batch)[0]
+
+
+def test_ticket_of_full_user_is_skipped(clock):
+    limits = Limits(rpm=60, burst=100, max_active=10, per_user=1)
+    running = admission._enqueue("a@sekolah.id", 1, limits.per_user)
+    assert admission._try_admit(running, "a@sekolah.id", 1, limits)[0]
+    admission._enqueue("a@sekolah.id", 1, limits.per_user)
+    other = admission._enqueue("b@sekolah.id", 1, limits.per_user)
+    assert admission._try_admit(other, "b@sekolah.id", 1, limits)[0]
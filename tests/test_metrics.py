@@ -0,0 +1,52 @@
+import socket
+
+import pytest
+
+import metrics
+
+
+def test_prometheus_text_exports_observe_labels():
+    metrics.observe("test_history", 0.02, op="save")
+    metrics.observe("test_history", 0.3, op="load")
+    metrics.observe("test_history", 0.04, op="save")
+    text = metrics.prometheus_text()
+    assert 'modul_cerdas_stage_seconds_count{stage="test_history",op="save"} 2' in text
+    assert 'modul_cerdas_stage_seconds_count{stage="test_history",op="load"} 1' in text
+    assert 'modul_cerdas_stage_seconds_bucket{stage="test_history",op="save",le="0.025"} 1' in text
+    assert 'modul_cerdas_stage_seconds_bucket{stage="test_history",op="save",le="+Inf"} 2' in text
+
+
+def test_prometheus_text_escapes_label_values():
+    metrics.observe("test_escape", 0.1, slot='a"b\\c')
+    assert 'stage="test_escape",slot="a\\"b\\\\c"' in metrics.prometheus_text()
+
+
+def test_summary_merges_labels_per_stage():
+    metrics.observe("test_merge", 0.1, client="supabase")
+    metrics.observe("test_merge", 0.3, client="gemini")
+    row = next(row for row in metrics.summary()["stages"] if row["stage"] == "test_merge")
+    assert row["count"] == 2
+    assert row["max_s"] == 0.3
+
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.mark.parametrize("host, expected", [(None, "127.0.0.1"), ("", "127.0.0.1"), ("0.0.0.0", "0.0.0.0")])
+def test_http_server_binds_localhost_unless_configured(monkeypatch, host, expected):
+    monkeypatch.setattr(metrics, "_server", None)
+    server = metrics.start_http_server(free_port(), host)
+    try:
+        assert server.server_address[0] == expected
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_http_server_disabled_without_port(monkeypatch):
+    monkeypatch.setattr(metrics, "_server", None)
+    assert metrics.start_http_server("") is None
@@ -0,0 +1,58 @@
+import pytest
+
+import module_cache
+from module_cache import ModuleCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(module_cache.time, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def cache(request):
+    return ModuleCache(db_name=f"modules-{request.node.name}.sqlite3", max_age=60)
+
+
+# --- UMUR ENTRI ---
+
+def test_memory_hit_within_max_age(clock, cache):
+    cache.put("k", "<p>modul</p>", b"%PDF")
+    clock.now += 60
+    assert cache.get("k") == ("<p>modul</p>", b"%PDF")
+
+
+def test_memory_entry_expires_with_max_age(clock, cache):
+    cache.put("k", "<p>modul</p>")
+    clock.now += 61
+    assert cache.get("k") is None
+    assert "k" not in cache._memory
+
+
+def test_age_counts_from_disk_created_at(clock, cache):
+    # Entri yang baru naik ke memori dari SQLite tetap pakai umur aslinya, bukan waktu dibaca
+    cache.put("k", "<p>modul</p>")
+    cache._memory.clear()
+    clock.now += 50
+    assert cache.get("k") is not None
+    clock.now += 11
+    assert cache.get("k") is None
+
+
+def test_put_pdf_keeps_created_at(clock, cache):
+    cache.put("k", "<p>modul</p>")
+    clock.now += 50
+    cache.put_pdf("k", b"%PDF")
+    assert cache.get("k") == ("<p>modul</p>", b"%PDF")
+    clock.now += 11
+    assert cache.get("k") is None
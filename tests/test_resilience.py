@@ -0,0 +1,198 @@
+import pytest
+from postgrest.exceptions import APIError
+
+import resilience
+from resilience import CircuitBreaker, CircuitOpenError
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(resilience.time, "monotonic", clock)
+    return clock
+
+
+@pytest.fixture(autouse=True)
+def fresh_breakers():
+    resilience._breakers.clear()
+    yield
+    resilience._breakers.clear()
+
+
+# --- CIRCUIT BREAKER ---
+
+def test_breaker_opens_after_threshold(clock):
+    breaker = CircuitBreaker("svc", failure_threshold=3, reset_timeout=30)
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError) as info:
+        breaker.before_call()
+    assert info.value.name == "svc"
+    assert info.value.retry_after == pytest.approx(30)
+
+
+def test_breaker_half_open_allows_one_trial_then_closes(clock):
+    breaker = CircuitBreaker("svc", failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.state == "half-open"
+    breaker.before_call()  # percobaan tunggal
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()  # yang lain tetap ditolak selama percobaan jalan
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.failures == 0
+    breaker.before_call()
+
+
+def test_breaker_failed_trial_reopens(clock):
+    breaker = CircuitBreaker("svc", failure_threshold=5, reset_timeout=30)
+    for _ in range(5):
+        breaker.record_failure()
+    clock.now += 31
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    clock.now += 29
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    clock.now += 1
+    assert breaker.state == "half-open"
+
+
+# --- call() ---
+
+class Flaky:
+    def __init__(self, errors, result="ok"):
+        self.errors = list(errors)
+        self.result = result
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return self.result
+
+
+def test_call_retries_retryable_errors():
+    fn = Flaky([ConnectionError("putus"), TimeoutError("lama")])
+    sleeps = []
+    assert resilience.call("svc", fn, retries=2, sleep=sleeps.append) == "ok"
+    assert fn.calls == 3
+    assert len(sleeps) == 2
+    assert resilience.get_breaker("svc").state == "closed"
+
+
+def test_call_stops_when_retries_run_out():
+    fn = Flaky([ConnectionError("putus")] * 3)
+    with pytest.raises(ConnectionError):
+        resilience.call("svc", fn, retries=1, sleep=lambda _: None)
+    assert fn.calls == 2
+
+
+def test_call_respects_retry_if_predicate():
+    fn = Flaky([ConnectionError("putus"), ConnectionError("putus")])
+    seen = []
+
+    def retry_if(error):
+        seen.append(error)
+        return False
+
+    with pytest.raises(ConnectionError):
+        resilience.call("svc", fn, retries=3, retry_if=retry_if, sleep=lambda _: None)
+    assert fn.calls == 1
+    assert len(seen) == 1
+
+
+def test_call_retry_if_can_allow_some_attempts():
+    fn = Flaky([ConnectionError("1"), ConnectionError("2"), ConnectionError("3")])
+    with pytest.raises(ConnectionError, match="2"):
+        resilience.call("svc", fn, retries=5, retry_if=lambda e: str(e) == "1", sleep=lambda _: None)
+    assert fn.calls == 2
+
+
+def test_call_does_not_retry_request_errors():
+    fn = Flaky([ValueError("data salah")])
+    with pytest.raises(ValueError):
+        resilience.call("svc", fn, retries=3, retry_if=lambda e: True, sleep=lambda _: None)
+    assert fn.calls == 1
+
+
+def test_request_errors_leave_breaker_untouched():
+    fn = Flaky([ConnectionError("putus"), ConnectionError("putus"), ValueError("data salah")])
+    for _ in range(3):
+        with pytest.raises((ConnectionError, ValueError)):
+            resilience.call("svc", fn, retries=0)
+    assert resilience.get_breaker("svc").failures == 2
+
+
+def test_request_error_releases_half_open_trial(clock):
+    breaker = resilience.get_breaker("svc")
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    clock.now += breaker.reset_timeout
+    with pytest.raises(ValueError):
+        resilience.call("svc", Flaky([ValueError("data salah")]), retries=0)
+    assert breaker.state == "half-open"
+    assert resilience.call("svc", Flaky([])) == "ok"
+    assert breaker.state == "closed"
+
+
+@pytest.mark.parametrize("code", [503, "503", 502, 429, "PGRST001", "08006", "53300", "57P01"])
+def test_postgrest_server_errors_are_retryable(code):
+    assert resilience.is_retryable(APIError({"message": "gangguan", "code": code}))
+
+
+@pytest.mark.parametrize("code", [400, "404", "23505", "42501", "PGRST116", None])
+def test_postgrest_request_errors_are_not_retryable(code):
+    assert not resilience.is_retryable(APIError({"message": "ditolak", "code": code}))
+
+
+def test_call_retries_postgrest_503_and_opens_circuit():
+    fn = Flaky([APIError({"message": "Service Unavailable", "code": 503})] * 20)
+    sleeps = []
+    with pytest.raises(APIError):
+        resilience.call("svc", fn, retries=2, sleep=sleeps.append)
+    assert fn.calls == 3
+    assert len(sleeps) == 2
+    breaker = resilience.get_breaker("svc")
+    assert breaker.failures == 3
+    with pytest.raises(CircuitOpenError):
+        # gagal ke-5 membuka circuit di tengah retry, percobaan berikutnya langsung ditolak
+        resilience.call("svc", fn, retries=2, sleep=sleeps.append)
+    assert fn.calls == 5
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        resilience.call("svc", fn)
+
+
+def test_postgrest_request_error_is_not_retried():
+    fn = Flaky([APIError({"message": "duplicate key", "code": "23505"})])
+    with pytest.raises(APIError):
+        resilience.call("svc", fn, retries=3, sleep=lambda _: None)
+    assert fn.calls == 1
+    assert resilience.get_breaker("svc").failures == 0
+
+
+def test_call_rejects_while_circuit_open(clock):
+    fn = Flaky([ConnectionError("putus")] * 10)
+    for _ in range(resilience.FAILURE_THRESHOLD):
+        with pytest.raises(ConnectionError):
+            resilience.call("svc", fn, retries=0)
+    with pytest.raises(CircuitOpenError):
+        resilience.call("svc", fn, retries=0)
+    assert fn.calls == resilience.FAILURE_THRESHOLD
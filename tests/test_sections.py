@@ -0,0 +1,25 @@
+import sections
+
+SPEC = {
+    "penyusun": "Bu <b>Rina</b>", "instansi": "SMA A&B", "jenjang": "SMA", "kelas": "X", "fase": "E",
+    "topik": "Tom & <Jerry>", "alokasi": "2 x 45 Menit", "elemen_pilih": "Menyimak - Berbicara",
+    "metode": "Project Based Learning", "ppp_value": "Mandiri & Bernalar Kritis", "semester": "1",
+}
+
+
+# --- ISIAN PENGGUNA DI-ESCAPE ---
+
+def test_fixed_parts_escape_user_fields():
+    html = sections._fixed_header(SPEC) + sections._fixed_profil(SPEC) + sections._fixed_pustaka(SPEC)
+    assert "<b>" not in html and "<Jerry>" not in html
+    assert "Bu &lt;b&gt;Rina&lt;/b&gt;" in html
+    assert "SMA A&amp;B" in html
+    assert "MODUL AJAR: TOM &amp; &lt;JERRY&gt;" in html
+
+
+def test_ai_templates_escape_user_fields():
+    before, _ = sections._kegiatan_frame(SPEC)
+    html = before + sections._slot_lkpd(SPEC) + sections._slot_asesmen(SPEC)
+    assert "<Jerry>" not in html
+    assert "Tom &amp; &lt;Jerry&gt;" in html
+    assert "<td>Mandiri </td>" in html
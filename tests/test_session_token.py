@@ -0,0 +1,107 @@
+import json
+
+import pytest
+
+import session_token
+from session_token import _b64decode, _b64encode, _sign
+
+SECRET = session_token.derive_secret("rahasia-test")
+OTHER_SECRET = session_token.derive_secret("rahasia-lain")
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_700_000_000
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(session_token.time, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def email(request):
+    # Email beda per test biar generasi dari test lain gak ikut terbawa
+    return f"{request.node.name}@sekolah.id"
+
+
+def resign(payload, secret=SECRET):
+    return f"{payload}.{_b64encode(_sign(payload, secret))}"
+
+
+# --- TOKEN SAH ---
+
+def test_issue_and_verify(clock, email):
+    claims = session_token.verify(session_token.issue(email, SECRET, ttl=60), SECRET)
+    assert claims == {"e": email, "g": 0, "iat": clock.now, "exp": clock.now + 60}
+
+
+def test_needs_refresh_after_half_ttl(clock, email):
+    claims = session_token.verify(session_token.issue(email, SECRET, ttl=60), SECRET)
+    clock.now += 30
+    assert not session_token.needs_refresh(claims)
+    clock.now += 1
+    assert session_token.needs_refresh(claims)
+
+
+# --- TANDA TANGAN & PAYLOAD ---
+
+def test_forged_signature_rejected(clock, email):
+    payload, _ = session_token.issue(email, SECRET).split(".")
+    assert session_token.verify(resign(payload, OTHER_SECRET), SECRET) is None
+    assert session_token.verify(session_token.issue(email, OTHER_SECRET), SECRET) is None
+
+
+def test_tampered_payload_rejected(clock, email):
+    payload, signature = session_token.issue(email, SECRET).split(".")
+    claims = json.loads(_b64decode(payload))
+    claims["e"] = "kepala-sekolah@sekolah.id"
+    forged = _b64encode(json.dumps(claims, separators=(",", ":")).encode("utf-8"))
+    assert session_token.verify(f"{forged}.{signature}", SECRET) is None
+
+
+@pytest.mark.parametrize("token", [
+    None, "", "tanpa-titik", "a.b.c", ".", "!!!.???", "YWJj.%%%", "@@@@.YWJj",
+])
+def test_malformed_token_rejected(clock, token):
+    assert session_token.verify(token, SECRET) is None
+
+
+def test_signed_but_malformed_payload_rejected(clock):
+    # Tanda tangan sah tapi isinya bukan klaim yang benar (kunci bocor / bug lama) tetap ditolak
+    for raw in (b"\xff\xfe", b"bukan json", b"[1, 2]", b'{"g": 0, "exp": 9999999999}',
+                b'{"e": "a@b.id", "g": 0, "exp": "besok"}'):
+        assert session_token.verify(resign(_b64encode(raw)), SECRET) is None
+
+
+# --- KEDALUWARSA & PENCABUTAN ---
+
+def test_expired_token_rejected(clock, email):
+    token = session_token.issue(email, SECRET, ttl=60)
+    clock.now += 59
+    assert session_token.verify(token, SECRET) is not None
+    clock.now += 1
+    assert session_token.verify(token, SECRET) is None
+
+
+def test_revoke_rejects_older_generations(clock, email):
+    old = session_token.issue(email, SECRET)
+    session_token.revoke(email)
+    assert session_token.verify(old, SECRET) is None
+    fresh = session_token.issue(email, SECRET)
+    assert session_token.verify(fresh, SECRET)["g"] == 1
+    # Revoke berlaku untuk email yang sama walau beda huruf besar/spasi
+    session_token.revoke(f"  {email.upper()} ")
+    assert session_token.verify(fresh, SECRET) is None
+
+
+def test_revoke_does_not_touch_other_users(clock, email):
+    other = "guru-lain-" + email
+    token = session_token.issue(other, SECRET)
+    session_token.revoke(email)
+    assert session_token.verify(token, SECRET) is not None
@@ -0,0 +1,99 @@
+import pytest
+
+import metrics
+import resilience
+import sections
+import token_usage
+from benchmarks.fakes import FakeChunk, FakeGenerativeModel, FakeUsageMetadata, estimate_tokens
+from storage import connect_sqlite
+
+
+@pytest.fixture(autouse=True)
+def empty_usage_table():
+    resilience._breakers.clear()
+    with connect_sqlite(token_usage.DB_NAME) as conn:
+        conn.execute("DELETE FROM slot_usage")
+
+
+def stream(model, slots):
+    parts = [("fixed", "<h2>Judul</h2>")] + [("ai", slot, f"Tulis bagian {slot}.", ("", "")) for slot in slots]
+    usage = {}
+    for _ in sections.stream_sections(model, parts, usage=usage):
+        pass
+    return usage
+
+
+def test_from_metadata_maps_gemini_fields():
+    counts = token_usage.from_metadata(FakeUsageMetadata(120, 480, 100))
+    assert counts == {"prompt": 120, "completion": 480, "cached": 100}
+
+
+def test_from_metadata_without_data():
+    assert token_usage.from_metadata(None) is None
+    assert token_usage.from_metadata(FakeUsageMetadata(0, 0)) is None
+
+
+def test_stream_sections_fills_usage_per_slot():
+    model = FakeGenerativeModel(blocks=3, system_instruction="Aturan tetap modul ajar.")
+    before = metrics.summary()["counters"].get("gemini_completion_tokens", 0)
+    usage = stream(model, ["tujuan", "asesmen"])
+    assert set(usage) == {"tujuan", "asesmen"}
+    expected_completion = estimate_tokens(model.body())
+    for slot, counts in usage.items():
+        prompt = estimate_tokens(model.system_instruction) + estimate_tokens(f"Tulis bagian {slot}.")
+        assert counts == {"prompt": prompt, "completion": expected_completion, "cached": 0}
+    after = metrics.summary()["counters"]["gemini_completion_tokens"]
+    assert after - before == 2 * expected_completion
+
+
+class BrokenStreamModel:
+    # Stream yang putus di tengah; tiap chunk sudah membawa hitungan token sementara seperti Gemini
+    def generate_content(self, prompt, stream=False, **kwargs):
+        yield FakeChunk("<p>Bagian", FakeUsageMetadata(100, 5))
+        yield FakeChunk(" yang", FakeUsageMetadata(100, 9))
+        raise ValueError("stream tiruan rusak")
+
+
+def test_failed_slot_still_fills_usage():
+    usage = {}
+    parts = [("ai", "tujuan", "Tulis bagian tujuan.", ("", ""))]
+    with pytest.raises(ValueError):
+        for _ in sections.stream_sections(BrokenStreamModel(), parts, usage=usage):
+            pass
+    assert usage == {"tujuan": {"prompt": 100, "completion": 9, "cached": 0}}
+
+
+def test_add_sums_counts():
+    first = {"prompt": 100, "completion": 9, "cached": 0}
+    assert token_usage.add(None, first) == first
+    assert token_usage.add(first, {"prompt": 120, "completion": 30, "cached": 80}) == \
+        {"prompt": 220, "completion": 39, "cached": 80}
+
+
+def test_record_and_summary():
+    model = FakeGenerativeModel(blocks=2)
+    first = stream(model, ["tujuan", "kegiatan"])
+    second = stream(FakeGenerativeModel(blocks=6), ["tujuan", "kegiatan"])
+    assert token_usage.record("Guru@Sekolah.id ", "modul-1", first)
+    assert token_usage.record("guru@sekolah.id", "modul-2", second)
+    assert token_usage.record("guru@sekolah.id", "modul-3", {}) is None
+
+    result = token_usage.summary()
+    assert result["modul"] == 2
+    per_module = [sum(c["completion"] for c in usage.values()) for usage in (first, second)]
+    assert result["per_modul"]["completion"] == round(sum(per_module) / 2)
+    assert {row["bagian"] for row in result["per_bagian"]} == {"kegiatan", "tujuan"}
+    assert all(row["panggilan"] == 2 for row in result["per_bagian"])
+
+    with connect_sqlite(token_usage.DB_NAME) as conn:
+        emails = {row[0] for row in conn.execute("SELECT user_email FROM slot_usage")}
+    assert emails == {"guru@sekolah.id"}
+
+
+def test_summary_ignores_old_rows():
+    token_usage.record("guru@sekolah.id", "modul-lama", {"tujuan": {"prompt": 10, "completion": 20, "cached": 0}})
+    with connect_sqlite(token_usage.DB_NAME) as conn:
+        conn.execute("UPDATE slot_usage SET created_at = created_at - ?", ((token_usage.SUMMARY_DAYS + 1) * 86400,))
+    result = token_usage.summary()
+    assert result["modul"] == 0
+    assert result["per_bagian"] == []
@@ -0,0 +1,97 @@
+import time
+import uuid
+
+import metrics
+from storage import connect_sqlite
+
+# --- PEMAKAIAN TOKEN GEMINI ---
+# Tiap slot AI membawa usage_metadata dari Gemini: token prompt (input), token jawaban (output),
+# dan berapa token prompt yang kena cache. Angkanya:
+#   - langsung ditambahkan ke counter metrics (gemini_prompt_tokens, gemini_completion_tokens, ...),
+#   - disimpan per modul ke SQLite lokal, jadi dashboard admin bisa lihat rata-rata token per modul
+#     dan per bagian (bagian mana yang paling boros, apakah system instruction memangkas prompt).
+
+DB_NAME = "token_usage.sqlite3"
+FIELDS = ("prompt", "completion", "cached")
+SUMMARY_DAYS = 7
+
+with connect_sqlite(DB_NAME) as _conn:
+    _conn.execute("""
+        CREATE TABLE IF NOT EXISTS slot_usage (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            generation TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            user_email TEXT NOT NULL,
+            module_key TEXT NOT NULL,
+            slot TEXT NOT NULL,
+            prompt_tokens INTEGER NOT NULL,
+            completion_tokens INTEGER NOT NULL,
+            cached_tokens INTEGER NOT NULL
+        )""")
+    _conn.execute("CREATE INDEX IF NOT EXISTS slot_usage_created ON slot_usage (created_at)")
+
+
+def from_metadata(usage_metadata):
+    # usage_metadata respons Gemini -> {"prompt", "completion", "cached"}; None kalau gak ada datanya
+    if not usage_metadata:
+        return None
+    counts = {
+        "prompt": int(getattr(usage_metadata, "prompt_token_count", 0) or 0),
+        "completion": int(getattr(usage_metadata, "candidates_token_count", 0) or 0),
+        "cached": int(getattr(usage_metadata, "cached_content_token_count", 0) or 0),
+    }
+    return counts if counts["prompt"] or counts["completion"] else None
+
+
+def add(total, counts):
+    # Jumlahkan dua hitungan token (total boleh None)
+    if not total:
+        return dict(counts)
+    return {field: total[field] + counts[field] for field in FIELDS}
+
+
+def count(counts):
+    for field in FIELDS:
+        if counts[field]:
+            metrics.incr(f"gemini_{field}_tokens", counts[field])
+    metrics.incr("gemini_calls_metered")
+
+
+def record(user_email, module_key, usage):
+    # usage: nama slot -> hitungan token (hasil sections.stream_sections). Satu panggilan = satu percobaan
+    # generate modul, termasuk yang gagal/dibatalkan di tengah (token yang terpakai tetap terhitung).
+    if not usage:
+        return None
+    generation = uuid.uuid4().hex
+    now = time.time()
+    with connect_sqlite(DB_NAME) as conn:
+        conn.executemany(
+            "INSERT INTO slot_usage (generation, created_at, user_email, module_key, slot, prompt_tokens, "
+            "completion_tokens, cached_tokens) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(generation, now, (user_email or "anonim").strip().lower(), module_key, slot,
+              counts["prompt"], counts["completion"], counts["cached"]) for slot, counts in usage.items()],
+        )
+    return generation
+
+
+def summary(days=SUMMARY_DAYS):
+    # Ringkasan buat dashboard admin: rata-rata token per modul dan per bagian, `days` hari terakhir
+    since = time.time() - days * 24 * 60 * 60
+    with connect_sqlite(DB_NAME) as conn:
+        modules, prompt, completion, cached = conn.execute("""
+            SELECT COUNT(*), AVG(p), AVG(c), AVG(k) FROM (
+                SELECT SUM(prompt_tokens) AS p, SUM(completion_tokens) AS c, SUM(cached_tokens) AS k
+                FROM slot_usage WHERE created_at >= ? GROUP BY generation
+            )""", (since,)).fetchone()
+        slots = conn.execute("""
+            SELECT slot, COUNT(*), AVG(prompt_tokens), AVG(completion_tokens), AVG(cached_tokens)
+            FROM slot_usage WHERE created_at >= ? GROUP BY slot ORDER BY AVG(completion_tokens) DESC
+        """, (since,)).fetchall()
+    return {
+        "modul": modules,
+        "per_modul": {"prompt": round(prompt or 0), "completion": round(completion or 0), "cached": round(cached or 0)},
+        "per_bagian": [
+            {"bagian": slot, "panggilan": n, "prompt": round(p), "completion": round(c), "cached": round(k)}
+            for slot, n, p, c, k in slots
+        ],
+    }